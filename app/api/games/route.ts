@@ -1,6 +1,5 @@
 import { NextResponse } from "next/server";
-import { readFile } from "fs/promises";
-import { join } from "path";
+import { getGameIndex } from "@/lib/gameIndex";
 
 // CORS headers helper
 const corsHeaders = {
@@ -9,12 +8,6 @@ const corsHeaders = {
     'Access-Control-Allow-Headers': 'Content-Type',
 };
 
-// Define types for the game data
-interface GameData {
-    createdAt: string;
-    slug?: string; // slug có thể chứa target word nên chúng ta sẽ không expose
-}
-
 // Handle OPTIONS preflight requests
 export async function OPTIONS() {
     return NextResponse.json({}, {
@@ -24,14 +17,12 @@ export async function OPTIONS() {
 
 export async function GET() {
     try {
-        const filePath = join(process.cwd(), 'lib', 'contexto', 'rankLoader.json');
-        const fileContent = await readFile(filePath, 'utf-8');
-        const games: Record<string, GameData> = JSON.parse(fileContent);
+        const games = await getGameIndex();
 
-        // Tối ưu: chỉ trả về thông tin cần thiết, không lộ slug (có thể chứa target word)
+        // Tối ưu: chỉ trả về thông tin cần thiết, không lộ slug/keyword (chứa target word)
         const optimizedGames: Record<number, { createdAt: string }> = {};
 
-        Object.entries(games).forEach(([id, gameData]: [string, GameData]) => {
+        Object.entries(games).forEach(([id, gameData]) => {
             optimizedGames[Number(id)] = {
                 createdAt: gameData.createdAt
             };
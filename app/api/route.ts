@@ -1,6 +1,7 @@
 import { NextResponse } from "next/server";
-import { readFile } from "fs/promises";
-import { join } from "path";
+import { loadGameData, type GameData } from "@/lib/gameData";
+import { getGameIndex } from "@/lib/gameIndex";
+import { foldVietnamese } from "@/lib/vietnamese";
 
 // CORS headers helper
 const corsHeaders = {
@@ -9,75 +10,16 @@ const corsHeaders = {
     'Access-Control-Allow-Headers': 'Content-Type',
 };
 
-// Hàm chuẩn hóa tiếng Việt: chuyển kiểu mới sang kiểu cũ (khóa -> khoá, hóa -> hoá)
-// Chỉ áp dụng cho oa, oe, uy. KHÔNG áp dụng cho ui (túi, bụi đã đúng)
-const normalizeVietnamese = (text: string): string => {
-    return text
-        // óa -> oá (hóa -> hoá, khóa -> khoá)
-        .replaceAll(/óa/g, 'oá')
-        .replaceAll(/òa/g, 'oà')
-        .replaceAll(/ỏa/g, 'oả')
-        .replaceAll(/õa/g, 'oã')
-        .replaceAll(/ọa/g, 'oạ')
-        // úy -> uý (thúy -> thuý)
-        .replaceAll(/úy/g, 'uý')
-        .replaceAll(/ùy/g, 'uỳ')
-        .replaceAll(/ủy/g, 'uỷ')
-        .replaceAll(/ũy/g, 'uỹ')
-        .replaceAll(/ụy/g, 'uỵ')
-        // i -> y cuối âm tiết (lí -> lý, mĩ -> mỹ, kĩ -> kỹ)
-        .replaceAll(/í(?=\s|$)/g, 'ý')
-        .replaceAll(/ì(?=\s|$)/g, 'ỳ')
-        .replaceAll(/ỉ(?=\s|$)/g, 'ỷ')
-        .replaceAll(/ĩ(?=\s|$)/g, 'ỹ')
-        .replaceAll(/ị(?=\s|$)/g, 'ỵ');
-};
-
-// Hàm chuyển ngược: kiểu cũ sang kiểu mới (khoá -> khóa, hoá -> hóa)
-const denormalizeVietnamese = (text: string): string => {
-    return text
-        // oá -> óa (hoá -> hóa, khoá -> khóa)
-        .replaceAll(/oá/g, 'óa')
-        .replaceAll(/oà/g, 'òa')
-        .replaceAll(/oả/g, 'ỏa')
-        .replaceAll(/oã/g, 'õa')
-        .replaceAll(/oạ/g, 'ọa')
-        // uý -> úy (thuý -> thúy)
-        .replaceAll(/uý/g, 'úy')
-        .replaceAll(/uỳ/g, 'ùy')
-        .replaceAll(/uỷ/g, 'ủy')
-        .replaceAll(/uỹ/g, 'ũy')
-        .replaceAll(/uỵ/g, 'ụy')
-        // y -> i cuối âm tiết (lý -> lí, mỹ -> mĩ, kỹ -> kĩ)
-        .replaceAll(/ý(?=\s|$)/g, 'í')
-        .replaceAll(/ỳ(?=\s|$)/g, 'ì')
-        .replaceAll(/ỷ(?=\s|$)/g, 'ỉ')
-        .replaceAll(/ỹ(?=\s|$)/g, 'ĩ')
-        .replaceAll(/ỵ(?=\s|$)/g, 'ị');
-};
-
 // ✅ In-memory cache cho game data
 // Lưu ý: Cache này chỉ tồn tại trong lifecycle của serverless container (warm state)
 // Vercel giữ container warm ~5-15 phút, sau đó cache sẽ bị clear
-let rankLoader: Record<number, { slug: string; createdAt: string }> | null = null;
-
 // LRU cache với limit để tránh memory overflow khi có quá nhiều games
 const MAX_CACHED_GAMES = 20; // Giới hạn 20 games trong memory (~20-50MB tùy size)
 const gameDataCache = new Map<string, {
-    rank_map: Record<string, number>;
-    hints?: number[];
+    game: GameData;
     lastAccessed: number; // Timestamp để implement LRU
 }>();
 
-async function getRankLoader() {
-    if (!rankLoader) {
-        const filePath = join(process.cwd(), 'lib', 'contexto', 'rankLoader.json');
-        const fileContent = await readFile(filePath, 'utf-8');
-        rankLoader = JSON.parse(fileContent);
-    }
-    return rankLoader;
-}
-
 // Cache game data với LRU eviction để tránh out of memory
 async function getGameData(slug: string) {
     // Check cache
@@ -85,13 +27,11 @@ async function getGameData(slug: string) {
     if (cached) {
         // Update last accessed time
         cached.lastAccessed = Date.now();
-        return cached;
+        return cached.game;
     }
 
-    // Cache miss - load from file
-    const filePath = join(process.cwd(), 'lib', 'contexto', `${slug}.json`);
-    const fileContent = await readFile(filePath, 'utf-8');
-    const gameData = JSON.parse(fileContent);
+    // Cache miss - load from file (.bin nếu có, fallback .json)
+    const gameData = await loadGameData(slug);
 
     // Evict oldest entry if cache is full (LRU)
     if (gameDataCache.size >= MAX_CACHED_GAMES) {
@@ -113,13 +53,13 @@ async function getGameData(slug: string) {
 
     // Add to cache with current timestamp
     gameDataCache.set(slug, {
-        ...gameData,
+        game: gameData,
         lastAccessed: Date.now()
     });
 
     console.log('[CACHE] Loaded:', slug, `(${gameDataCache.size}/${MAX_CACHED_GAMES} cached)`);
 
-    return gameDataCache.get(slug)!;
+    return gameData;
 }
 
 // Handle OPTIONS preflight requests
@@ -132,8 +72,9 @@ export async function OPTIONS() {
 export async function GET(req: Request) {
     const { searchParams } = new URL(req.url);
     const id = Number(searchParams.get("id"));
-    const rawGuess = searchParams.get("guess")?.trim().toLowerCase();
-    const guess = rawGuess ? normalizeVietnamese(rawGuess) : rawGuess;
+    // Khoá fold (khóa/khoá, lí/lý, "_"/dấu cách, hoa/thường -> cùng 1 khoá), tra 1 lần trong game
+    const rawGuess = searchParams.get("guess");
+    const guess = rawGuess ? foldVietnamese(rawGuess) : undefined;
     const getClosest = searchParams.get("closest") === "true";
     const getSecret = searchParams.get("secret") === "true";
     const getHint = searchParams.get("hint") === "true";
@@ -146,8 +87,8 @@ export async function GET(req: Request) {
         });
     }
 
-    const rankLoaderData = await getRankLoader();
-    const game = rankLoaderData![id];
+    const gameIndex = await getGameIndex();
+    const game = gameIndex[id];
     if (!game) {
         return NextResponse.json({ error: "Không tìm thấy game" }, {
             status: 404,
@@ -158,21 +99,17 @@ export async function GET(req: Request) {
     try {
         // ✅ Sử dụng in-memory cache thay vì đọc file mỗi lần
         const gameData = await getGameData(game.slug);
-        const { rank_map } = gameData;
 
         // Nếu yêu cầu lấy từ bí mật
         if (getSecret) {
 
             // Tìm từ có rank = 1 (từ bí mật)
-            const secretWord = Object.entries(rank_map).find(([, data]) => {
-                const rank = data as number;
-                return rank === 1;
-            });
+            const secretWord = (await gameData.wordsInRange(1, 1))[0];
 
             if (secretWord) {
-                console.log('[SECRET] Returning:', secretWord[0]);
+                console.log('[SECRET] Returning:', secretWord.word);
                 return NextResponse.json({
-                    secretWord: secretWord[0]
+                    secretWord: secretWord.word
                     // Bỏ gameId để giảm thông tin không cần thiết
                 }, {
                     headers: {
@@ -194,14 +131,11 @@ export async function GET(req: Request) {
         // Nếu yêu cầu hint
         if (getHint) {
             // Tìm từ bí mật để loại trừ khỏi hints
-            const secretEntry = Object.entries(rank_map).find(([, data]) => {
-                const rank = data as number;
-                return rank === 1;
-            });
-            const secretWord = secretEntry ? secretEntry[0] : null;
+            const secretEntry = (await gameData.wordsInRange(1, 1))[0];
+            const secretWord = secretEntry ? secretEntry.word : null;
 
             // Kiểm tra xem game có predefined hints không
-            const predefinedHints = gameData.hints as number[] | undefined;
+            const predefinedHints = gameData.hints;
 
             // Nếu có predefined hints, ưu tiên sử dụng
             if (predefinedHints && Array.isArray(predefinedHints) && predefinedHints.length > 0) {
@@ -226,15 +160,13 @@ export async function GET(req: Request) {
 
                 if (suitableHint) {
                     // Tìm từ tương ứng với rank hint
-                    const hintEntry = Object.entries(rank_map).find(([word, rank]) => {
-                        const r = rank as number;
-                        return r === suitableHint && word !== secretWord;
-                    });
+                    const hintEntry = (await gameData.wordsInRange(suitableHint, suitableHint))
+                        .find(({ word }) => word !== secretWord);
 
                     if (hintEntry) {
-                        console.log('[HINT] Predefined:', { id, word: hintEntry[0], rank: suitableHint, lowestRank });
+                        console.log('[HINT] Predefined:', { id, word: hintEntry.word, rank: suitableHint, lowestRank });
                         return NextResponse.json({
-                            hint: hintEntry[0],
+                            hint: hintEntry.word,
                             rank: suitableHint
                         }, {
                             headers: {
@@ -318,42 +250,16 @@ export async function GET(req: Request) {
             }
 
             // Tìm các từ trong target rank range
-            const candidateWords = Object.entries(rank_map)
-                .map(([word, data]) => {
-                    const rank = data as number;
-                    return {
-                        word,
-                        rank: rank
-                    };
-                })
-                .filter(item => {
-                    // Loại trừ từ bí mật
-                    if (item.word === secretWord) {
-                        return false;
-                    }
-                    // Chọn từ trong target range (không cần so sánh với lowestRank nữa)
-                    return item.rank >= targetRankRange[0] &&
-                        item.rank <= targetRankRange[1];
-                });
+            // Chọn từ trong target range (không cần so sánh với lowestRank nữa), loại trừ từ bí mật
+            const candidateWords = (await gameData.wordsInRange(targetRankRange[0], targetRankRange[1]))
+                .filter(item => item.word !== secretWord);
 
             // Nếu không có từ nào trong target range, tìm các từ gần target range
             if (candidateWords.length === 0) {
-                const fallbackWords = Object.entries(rank_map)
-                    .map(([word, data]) => {
-                        const rank = data as number;
-                        return {
-                            word,
-                            rank: rank
-                        };
-                    })
-                    .filter(item => {
-                        if (item.word === secretWord) {
-                            return false;
-                        }
-                        // Fallback: tìm từ gần với target range
-                        const targetMid = (targetRankRange[0] + targetRankRange[1]) / 2;
-                        return item.rank >= targetMid && item.rank <= targetRankRange[1] * 1.5;
-                    });
+                // Fallback: tìm từ gần với target range
+                const targetMid = (targetRankRange[0] + targetRankRange[1]) / 2;
+                const fallbackWords = (await gameData.wordsInRange(targetMid, targetRankRange[1] * 1.5))
+                    .filter(item => item.word !== secretWord);
 
                 if (fallbackWords.length === 0) {
                     return NextResponse.json({
@@ -414,7 +320,7 @@ export async function GET(req: Request) {
                 });
             }
 
-            const guessRank = rank_map[guess] as number | undefined;
+            const guessRank = await gameData.rankOf(guess);
             if (!guessRank || guessRank !== 1) {
                 console.log('[CLOSEST] Unauthorized:', { guess, rank: guessRank });
                 return NextResponse.json({ error: "Chưa đoán đúng từ bí mật" }, {
@@ -423,17 +329,8 @@ export async function GET(req: Request) {
                 });
             }
 
-            // Chuyển đổi rank_map thành array và sắp xếp theo rank
-            const sortedWords = Object.entries(rank_map)
-                .map(([word, data]) => {
-                    const rank = data as number; // Type assertion cho rank_map
-                    return {
-                        word,
-                        rank: rank
-                    };
-                })
-                .sort((a, b) => a.rank - b.rank)
-                .slice(0, 200); // Lấy 200 từ đầu tiên (gần nhất)
+            // Lấy 200 từ đầu tiên (gần nhất), sắp xếp theo rank
+            const sortedWords = await gameData.closest(200);
 
             console.log('[CLOSEST] Authorized, returning:', sortedWords.length, 'words for', guess);
 
@@ -451,46 +348,23 @@ export async function GET(req: Request) {
             });
         }
 
-        // Logic cho việc đoán từ - search cả 2 variant: original và normalized
-        if (!rawGuess) {
+        // Logic cho việc đoán từ: 1 lần tra theo khoá fold (game có nhiều dạng dấu -> rank nhỏ nhất)
+        if (!guess) {
             return NextResponse.json({ error: "Thiếu guess" }, {
                 status: 400,
                 headers: corsHeaders
             });
         }
 
-        // Tìm rank cho cả 2 dạng dấu: oá (cũ) và óa (mới)
-        const oldStyleGuess = normalizeVietnamese(rawGuess);    // khóa -> khoá  
-        const newStyleGuess = denormalizeVietnamese(rawGuess);  // khoá -> khóa
-
-        // Tìm rank cho cả 2 dạng (một trong 2 sẽ trùng với rawGuess)
-        const oldStyleEntry = rank_map[oldStyleGuess];
-        const newStyleEntry = oldStyleGuess !== newStyleGuess ? rank_map[newStyleGuess] : undefined;
-
-        const oldStyleRank = oldStyleEntry ? (oldStyleEntry as number) : null;
-        const newStyleRank = newStyleEntry ? (newStyleEntry as number) : null;
-
-        // Nếu cả 2 đều không tìm thấy
-        if (oldStyleRank === null && newStyleRank === null) {
-            console.log('[GUESS] Not found:', { id, oldStyle: oldStyleGuess, newStyle: newStyleGuess });
+        const rank = await gameData.rankOf(guess);
+        if (rank === undefined) {
+            console.log('[GUESS] Not found:', { id, guess });
             return NextResponse.json({ rank: null, score: null }, {
                 status: 404,
                 headers: corsHeaders
             });
         }
-
-        // Chọn rank thấp hơn (tốt hơn)
-        let rank: number;
-        if (oldStyleRank !== null && newStyleRank !== null) {
-            rank = Math.min(oldStyleRank, newStyleRank);
-            console.log('[GUESS] Both found:', { id, oldStyle: `${oldStyleGuess}=${oldStyleRank}`, newStyle: `${newStyleGuess}=${newStyleRank}`, chosen: rank });
-        } else if (oldStyleRank !== null) {
-            rank = oldStyleRank;
-            console.log('[GUESS] Old style found:', { id, word: oldStyleGuess, rank });
-        } else {
-            rank = newStyleRank!;
-            console.log('[GUESS] New style found:', { id, word: newStyleGuess, rank });
-        }
+        console.log('[GUESS] Found:', { id, guess, rank });
 
         return NextResponse.json({
             rank: rank
@@ -1,63 +1,53 @@
 #!/usr/bin/env python3
 """
-Script để tạo lại file rankLoader.json từ các file .json trong thư mục contexto
+Script để tạo lại file rankLoader.json từ các file game (.json / .bin) trong thư mục contexto
+Pipeline thêm game mới trực tiếp qua scripts/rank_loader.py (add_game), script này chỉ cần
+khi thêm/sửa file game bằng tay.
 Cách sử dụng:
-1. Chạy script này trong thư mục lib/data/contexto/
-2. Script sẽ scan tất cả file .json trong thư mục hiện tại
-3. Tự động tạo rankLoader.json với slug từ tên file và createdAt từ ngày hiện tại
+1. Chạy script này (từ thư mục bất kỳ)
+2. Script sẽ scan tất cả file game trong thư mục lib/contexto/ (mỗi slug 1 file: .json nếu có, ngược lại .bin)
+3. Tự động thêm game mới vào rankLoader.json + rankIndex.json với slug từ tên file và createdAt từ ngày tạo file
 """
 
 import os
-import json
-from datetime import datetime, timezone, timedelta
+import sys
 from pathlib import Path
 
-# Vietnam timezone (UTC+7)
-VIETNAM_TZ = timezone(timedelta(hours=7))
+# API rankLoader/index nằm trong scripts/rank_loader.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / "scripts"))
 
-def create_rank_loader():
-    # Đường dẫn đến thư mục contexto (thư mục hiện tại khi chạy từ đây)
-    contexto_dir = Path(".")
+from rank_loader import game_created_at, game_entry, game_files, load_rank_index, save_rank_index
 
-    # Tìm tất cả file .json trong thư mục hiện tại
-    json_files = list(contexto_dir.glob("*.json"))
+def create_rank_loader():
+    # Đường dẫn đến thư mục contexto (thư mục chứa script này)
+    contexto_dir = Path(__file__).resolve().parent
 
-    # Loại bỏ rankLoader.json nếu có
-    json_files = [f for f in json_files if f.name != "rankLoader.json"]
+    # Tìm file chính của tất cả game (.json / .bin, trừ rankLoader.json / rankIndex.json / sidecar)
+    game_paths = game_files(contexto_dir)
 
-    if not json_files:
-        print("❌ Không tìm thấy file .json nào trong thư mục contexto!")
+    if not game_paths:
+        print("❌ Không tìm thấy file game (.json / .bin) nào trong thư mục contexto!")
         return
 
-    print(f"📁 Tìm thấy {len(json_files)} file .json")
+    print(f"📁 Tìm thấy {len(game_paths)} file game")
 
-    # Đọc rankLoader.json hiện có (nếu có)
-    output_file = contexto_dir / "rankLoader.json"
-    existing_rank_loader = {}
-    existing_slugs = set()
-    
-    if output_file.exists():
-        try:
-            with open(output_file, 'r', encoding='utf-8') as f:
-                existing_rank_loader = json.load(f)
-                existing_slugs = {entry["slug"] for entry in existing_rank_loader.values()}
-                print(f"📋 Đã load {len(existing_rank_loader)} game hiện có")
-        except Exception as e:
-            print(f"⚠️  Lỗi khi đọc rankLoader.json: {e}")
+    # Đọc index hiện có (tự dựng lại từ rankLoader.json nếu chưa có rankIndex.json)
+    games = load_rank_index(contexto_dir)
+    print(f"📋 Đã load {len(games)} game hiện có")
 
     # Tạo list các file mới (chưa có trong rankLoader)
     new_files = []
-    for json_file in json_files:
-        slug = json_file.stem
-        if slug not in existing_slugs:
+    for game_path in game_paths:
+        slug = game_path.stem
+        if slug not in games:
             try:
                 # Trên macOS, st_birthtime là creation time
-                creation_time = os.stat(json_file).st_birthtime
+                creation_time = os.stat(game_path).st_birthtime
             except AttributeError:
                 # Fallback cho hệ thống không có st_birthtime
-                creation_time = os.path.getctime(json_file)
+                creation_time = os.path.getctime(game_path)
             
-            new_files.append((creation_time, json_file))
+            new_files.append((creation_time, game_path))
     
     if not new_files:
         print("✅ Không có file mới nào cần thêm vào rankLoader.json")
@@ -67,35 +57,24 @@ def create_rank_loader():
     new_files.sort(key=lambda x: x[0])
 
     # Tìm index lớn nhất hiện có
-    max_index = 0
-    if existing_rank_loader:
-        max_index = max(int(k) for k in existing_rank_loader.keys())
+    max_index = max((entry["id"] for entry in games.values()), default=0)
 
     # Thêm các file mới vào
     print(f"\n🆕 Tìm thấy {len(new_files)} file mới:")
     
-    for creation_time, json_file in new_files:
+    for creation_time, game_path in new_files:
         max_index += 1
-        slug = json_file.stem
-        # Chuyển đổi timestamp sang giờ Việt Nam (UTC+7)
-        # NOTE: pipeline runs at 23:30 (11:30 PM) of the previous day, so add 1 day
-        # so that the displayed createdAt matches the intended game date.
-        created_dt = datetime.fromtimestamp(creation_time, tz=VIETNAM_TZ) + timedelta(days=1)
-        created_date = created_dt.strftime("%Y-%m-%d")
-
-        existing_rank_loader[str(max_index)] = {
-            "slug": slug,
-            "createdAt": created_date
-        }
+        slug = game_path.stem
+        created_date = game_created_at(creation_time)
+        games[slug] = game_entry(game_path, max_index, created_date)
 
         print(f"   ✅ Thêm: #{max_index} - {slug} (tạo: {created_date})")
 
-    # Ghi ra file rankLoader.json (compact format for minimal size)
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(existing_rank_loader, f, ensure_ascii=False, separators=(',', ':'))
+    # Ghi rankLoader.json + rankIndex.json (atomic, compact format)
+    save_rank_index(games, contexto_dir)
 
-    print(f"\n🎉 Đã cập nhật {output_file}")
-    print(f"📊 Tổng cộng {len(existing_rank_loader)} game (thêm mới {len(new_files)} game)")
+    print(f"\n🎉 Đã cập nhật rankLoader.json + rankIndex.json")
+    print(f"📊 Tổng cộng {len(games)} game (thêm mới {len(new_files)} game)")
 
 if __name__ == "__main__":
-    create_rank_loader()
\ No newline at end of file
+    create_rank_loader()
@@ -0,0 +1,542 @@
+import { open, readFile, stat, type FileHandle } from "fs/promises";
+import { join } from "path";
+import { FOLD_TABLE_SHA1, foldVietnamese } from "./vietnamese";
+
+// Đọc dữ liệu game Contexto từ lib/contexto, theo thứ tự ưu tiên:
+//   0. games.pack (mọi game trong 1 file, rank tra bằng 4 byte theo offset, xem scripts/game_pack.py)
+//   1. Định dạng nhị phân <slug>.bin + vocab.txt chung - định dạng chính, pipeline chỉ công bố file này
+//   2. Bản chia tầng <slug>.head.json (rank đầu + hints), <slug>.tail.json chỉ đọc khi cần, cho game
+//      JSON chưa có .bin (hợp đồng head/tail xem scripts/game_format.py)
+//   3. File JSON (<slug>.json với rank_map) cho các game cũ chưa convert
+// <slug>.words.txt (nếu có) là mảng ngược rank -> từ: hint / từ bí mật / top-N tra theo index.
+// Game .bin không cần file này (mảng dựng từ mảng rank, O(số từ)).
+
+const CONTEXTO_DIR = join(process.cwd(), 'lib', 'contexto');
+
+const GAME_MAGIC = 'CXGM';
+const GAME_VERSION = 1;
+const CODEC_UINT32 = 0;
+const CODEC_VARINT = 1;
+const CODEC_PERMUTATION = 2;
+
+export interface RankedWord {
+    word: string;
+    rank: number;
+}
+
+export interface GameData {
+    keyword: string;
+    hints?: number[];
+    // Rank của 1 từ theo khoá fold (foldVietnamese), undefined nếu không có trong game.
+    // Nhiều từ cùng khoá (vd: khóa / khoá) -> rank nhỏ nhất
+    rankOf(foldedWord: string): Promise<number | undefined>;
+    // Các từ có rank trong [minRank, maxRank], sắp theo rank
+    wordsInRange(minRank: number, maxRank: number): Promise<RankedWord[]>;
+    // `limit` từ có rank nhỏ nhất, sắp theo rank tăng dần
+    closest(limit: number): Promise<RankedWord[]>;
+}
+
+// ====================== RANK ORDER (rank -> từ) ======================
+
+// words[rank - 1] = từ có rank đó ("" / undefined = rank trống ở game sửa tay)
+class RankOrder {
+    constructor(private words: string[]) { }
+
+    wordsInRange(minRank: number, maxRank: number) {
+        const result: RankedWord[] = [];
+        const end = Math.min(maxRank, this.words.length);
+        for (let rank = Math.max(1, Math.ceil(minRank)); rank <= end; rank++) {
+            const word = this.words[rank - 1];
+            if (word) result.push({ word, rank });
+        }
+        return result;
+    }
+
+    closest(limit: number) {
+        const result: RankedWord[] = [];
+        for (let rank = 1; rank <= this.words.length && result.length < limit; rank++) {
+            const word = this.words[rank - 1];
+            if (word) result.push({ word, rank });
+        }
+        return result;
+    }
+}
+
+// <slug>.words.txt (scripts/game_format.py), null nếu game chưa có
+async function readRankOrder(slug: string): Promise<RankOrder | null> {
+    try {
+        const words = (await readFile(join(CONTEXTO_DIR, `${slug}.words.txt`), 'utf-8')).split('\n');
+        words.pop(); // Dòng cuối rỗng sau '\n' cuối cùng
+        return new RankOrder(words);
+    } catch {
+        return null;
+    }
+}
+
+// ====================== JSON (rank_map) ======================
+
+class JsonGameData implements GameData {
+    // Khoá fold -> rank, dựng ở lần tra đầu tiên (game JSON không có sidecar)
+    private foldedRanks: Map<string, number> | null = null;
+
+    constructor(
+        public keyword: string,
+        private rankMap: Record<string, number>,
+        public hints?: number[],
+        // Chưa có <slug>.words.txt -> dựng từ rank_map ở lần dùng đầu tiên
+        private order: RankOrder | null = null,
+    ) { }
+
+    private rankOrder() {
+        if (!this.order) {
+            const words: string[] = [];
+            for (const [word, rank] of Object.entries(this.rankMap)) words[rank - 1] = word;
+            this.order = new RankOrder(words);
+        }
+        return this.order;
+    }
+
+    async rankOf(foldedWord: string) {
+        if (!this.foldedRanks) {
+            this.foldedRanks = new Map();
+            for (const [word, rank] of Object.entries(this.rankMap)) {
+                const key = foldVietnamese(word);
+                const current = this.foldedRanks.get(key);
+                if (current === undefined || rank < current) this.foldedRanks.set(key, rank);
+            }
+        }
+        return this.foldedRanks.get(foldedWord);
+    }
+
+    async wordsInRange(minRank: number, maxRank: number) {
+        return this.rankOrder().wordsInRange(minRank, maxRank);
+    }
+
+    async closest(limit: number) {
+        return this.rankOrder().closest(limit);
+    }
+}
+
+// ====================== TIERS (head + tail) ======================
+
+interface GameHead {
+    keyword: string;
+    hints: number[];
+    head_rank: number;
+    word_count: number;
+    rank_map: Record<string, number>;
+}
+
+class TieredGameData implements GameData {
+    private head: JsonGameData;
+    private hasTail: boolean;
+    // Cả game (head + tail), chỉ đọc khi từ đoán / khoảng rank nằm ngoài head
+    private full: Promise<JsonGameData> | null = null;
+
+    constructor(private slug: string, private headData: GameHead) {
+        this.head = new JsonGameData(headData.keyword, headData.rank_map, this.hints);
+        this.hasTail = Object.keys(headData.rank_map).length < headData.word_count;
+    }
+
+    get keyword() {
+        return this.headData.keyword;
+    }
+
+    get hints() {
+        return this.headData.hints.length > 0 ? this.headData.hints : undefined;
+    }
+
+    private loadFull() {
+        if (!this.full) {
+            console.log('[TIER] Loading tail:', this.slug);
+            this.full = readFile(join(CONTEXTO_DIR, `${this.slug}.tail.json`), 'utf-8').then((content) => {
+                const tail = JSON.parse(content);
+                if (tail.head_rank !== this.headData.head_rank) {
+                    throw new Error(`${this.slug}.tail.json không khớp head (head_rank ${tail.head_rank} != ${this.headData.head_rank})`);
+                }
+                const rankMap = { ...this.headData.rank_map, ...tail.rank_map };
+                return new JsonGameData(this.keyword, rankMap, this.hints);
+            });
+            // Lỗi đọc tail -> lần sau thử lại
+            this.full.catch(() => { this.full = null; });
+        }
+        return this.full;
+    }
+
+    // Mọi từ ở tail có rank > head_rank -> có trong head là rank nhỏ nhất của khoá
+    async rankOf(foldedWord: string) {
+        const rank = await this.head.rankOf(foldedWord);
+        if (rank !== undefined || !this.hasTail) return rank;
+        return (await this.loadFull()).rankOf(foldedWord);
+    }
+
+    async wordsInRange(minRank: number, maxRank: number) {
+        if (maxRank <= this.headData.head_rank || !this.hasTail) return this.head.wordsInRange(minRank, maxRank);
+        return (await this.loadFull()).wordsInRange(minRank, maxRank);
+    }
+
+    async closest(limit: number) {
+        const words = await this.head.closest(limit);
+        if (words.length >= limit || !this.hasTail) return words;
+        return (await this.loadFull()).closest(limit);
+    }
+}
+
+// ====================== BINARY (rank array + vocab chung) ======================
+
+interface SharedVocab {
+    words: string[];
+    // Khoá fold -> vocab id (nhiều id nếu nhiều từ cùng khoá)
+    foldedIds: Map<string, number | number[]>;
+}
+
+interface FoldIndex {
+    version: number;
+    table: string;
+    count: number;
+    folded: Record<string, string>;
+}
+
+let sharedVocab: SharedVocab | null = null;
+
+// Sidecar vocab.fold.json (scripts/vietnamese_fold.py): khoá fold của các từ có khoá khác chính nó.
+// Thiếu / tạo bằng bảng fold khác -> null, tự fold toàn bộ vocab
+async function readFoldIndex(): Promise<FoldIndex | null> {
+    try {
+        const index: FoldIndex = JSON.parse(await readFile(join(CONTEXTO_DIR, 'vocab.fold.json'), 'utf-8'));
+        return index.version === 1 && index.table === FOLD_TABLE_SHA1 ? index : null;
+    } catch {
+        return null;
+    }
+}
+
+function buildFoldedIds(words: string[], index: FoldIndex | null): Map<string, number | number[]> {
+    const covered = index ? Math.min(index.count, words.length) : 0;
+    const foldedIds = new Map<string, number | number[]>();
+    for (let id = 0; id < words.length; id++) {
+        const key = id < covered ? (index!.folded[id] ?? words[id]) : foldVietnamese(words[id]);
+        const existing = foldedIds.get(key);
+        if (existing === undefined) {
+            foldedIds.set(key, id);
+        } else if (typeof existing === 'number') {
+            foldedIds.set(key, [existing, id]);
+        } else {
+            existing.push(id);
+        }
+    }
+    return foldedIds;
+}
+
+// Vocab chung chỉ được thêm vào cuối -> chỉ cần đọc lại khi game mới cần nhiều từ hơn
+async function getSharedVocab(minCount: number): Promise<SharedVocab> {
+    if (!sharedVocab || sharedVocab.words.length < minCount) {
+        const [content, foldIndex] = await Promise.all([
+            readFile(join(CONTEXTO_DIR, 'vocab.txt'), 'utf-8'),
+            readFoldIndex(),
+        ]);
+        const words = content.split('\n');
+        words.pop(); // Dòng cuối rỗng sau '\n' cuối cùng
+        sharedVocab = { words, foldedIds: buildFoldedIds(words, foldIndex) };
+    }
+    return sharedVocab;
+}
+
+function decodeVarints(bytes: Uint8Array, count: number): Uint32Array {
+    const values = new Uint32Array(count);
+    let pos = 0;
+    for (let i = 0; i < count; i++) {
+        let value = 0;
+        let shift = 0;
+        let byte: number;
+        do {
+            byte = bytes[pos++];
+            value += (byte & 0x7f) * 2 ** shift;
+            shift += 7;
+        } while (byte & 0x80);
+        values[i] = value;
+    }
+    return values;
+}
+
+// Payload perm (scripts/game_format.py): vocab id theo thứ tự rank, bit-packed, kèm các rank bị thiếu
+function decodePermutation(bytes: Uint8Array, vocabCount: number): Uint32Array {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    const wordCount = view.getUint32(0, true);
+    const missingCount = view.getUint32(4, true);
+    const missing = new Set<number>();
+    for (let i = 0; i < missingCount; i++) missing.add(view.getUint32(8 + 4 * i, true));
+
+    const bits = Math.max(1, 32 - Math.clz32(vocabCount - 1));
+    const mask = 2 ** bits - 1;
+    const packedStart = 8 + 4 * missingCount;
+    const ranks = new Uint32Array(vocabCount);
+    let rank = 0;
+    for (let i = 0, bitPos = 0; i < wordCount; i++, bitPos += bits) {
+        // bits <= 25 -> id nằm gọn trong 4 byte bắt đầu từ byte chứa bit đầu tiên
+        const p = packedStart + (bitPos >>> 3);
+        const window = (bytes[p] | (bytes[p + 1] << 8) | (bytes[p + 2] << 16) | (bytes[p + 3] << 24)) >>> 0;
+        do rank++; while (missing.has(rank));
+        ranks[(window >>> (bitPos & 7)) & mask] = rank;
+    }
+    return ranks;
+}
+
+interface GameBinaryHeader {
+    keyword: string;
+    hints: number[];
+    codec: number;
+    vocabCount: number;
+    payloadOffset: number;
+    payloadLength: number;
+}
+
+function parseGameHeader(buffer: Buffer): GameBinaryHeader {
+    const view = new DataView(buffer.buffer, buffer.byteOffset, buffer.byteLength);
+    if (buffer.toString('latin1', 0, 4) !== GAME_MAGIC) {
+        throw new Error('Không phải file game Contexto (sai magic)');
+    }
+    const version = view.getUint16(4, true);
+    if (version !== GAME_VERSION) {
+        throw new Error(`Phiên bản file game không hỗ trợ: ${version}`);
+    }
+
+    const codec = view.getUint8(6);
+    const vocabCount = view.getUint32(8, true);
+    const keywordLength = view.getUint16(12, true);
+    const hintsCount = view.getUint16(14, true);
+
+    let offset = 16;
+    const keyword = buffer.toString('utf8', offset, offset + keywordLength);
+    offset += keywordLength + ((4 - (keywordLength % 4)) % 4);
+
+    const hints: number[] = [];
+    for (let i = 0; i < hintsCount; i++, offset += 4) {
+        hints.push(view.getUint32(offset, true));
+    }
+    const payloadLength = view.getUint32(offset, true);
+
+    return { keyword, hints, codec, vocabCount, payloadOffset: offset + 4, payloadLength };
+}
+
+function decodeRanks(buffer: Buffer, header: GameBinaryHeader): Uint32Array {
+    const start = buffer.byteOffset + header.payloadOffset;
+    if (header.codec === CODEC_UINT32) {
+        // Uint32Array dùng endianness của máy (little-endian trên x86/ARM), cần offset chia hết cho 4
+        if (start % 4 === 0) {
+            return new Uint32Array(buffer.buffer, start, header.vocabCount);
+        }
+        return new Uint32Array(buffer.buffer.slice(start, start + 4 * header.vocabCount));
+    }
+    if (header.codec === CODEC_VARINT) {
+        return decodeVarints(new Uint8Array(buffer.buffer, start, header.payloadLength), header.vocabCount);
+    }
+    if (header.codec === CODEC_PERMUTATION) {
+        return decodePermutation(new Uint8Array(buffer.buffer, start, header.payloadLength), header.vocabCount);
+    }
+    throw new Error(`Codec không hợp lệ: ${header.codec}`);
+}
+
+class BinaryGameData implements GameData {
+    constructor(
+        public keyword: string,
+        private ranks: Uint32Array,
+        private vocab: SharedVocab,
+        public hints?: number[],
+        // Chưa có <slug>.words.txt -> dựng từ mảng rank ở lần dùng đầu tiên
+        private order: RankOrder | null = null,
+    ) { }
+
+    private rankOrder() {
+        if (!this.order) {
+            // Mảng đặc cỡ rank lớn nhất (gán lộn thứ tự vào mảng rỗng -> mảng thưa, chậm ~10x)
+            let maxRank = 0;
+            for (let id = 0; id < this.ranks.length; id++) {
+                if (this.ranks[id] > maxRank) maxRank = this.ranks[id];
+            }
+            const words: string[] = new Array(maxRank).fill('');
+            for (let id = 0; id < this.ranks.length; id++) {
+                if (this.ranks[id] !== 0) words[this.ranks[id] - 1] = this.vocab.words[id];
+            }
+            this.order = new RankOrder(words);
+        }
+        return this.order;
+    }
+
+    async rankOf(foldedWord: string) {
+        const ids = this.vocab.foldedIds.get(foldedWord);
+        if (ids === undefined) return undefined;
+        if (typeof ids === 'number') {
+            return ids < this.ranks.length ? this.ranks[ids] || undefined : undefined;
+        }
+        let best: number | undefined;
+        for (const id of ids) {
+            const rank = id < this.ranks.length ? this.ranks[id] : 0;
+            if (rank !== 0 && (best === undefined || rank < best)) best = rank;
+        }
+        return best;
+    }
+
+    async wordsInRange(minRank: number, maxRank: number) {
+        return this.rankOrder().wordsInRange(minRank, maxRank);
+    }
+
+    async closest(limit: number) {
+        return this.rankOrder().closest(limit);
+    }
+}
+
+// ====================== PACK (games.pack) ======================
+
+const PACK_MAGIC = 'CXPK';
+const PACK_VERSION = 1;
+const PACK_HEADER_SIZE = 24;
+
+interface PackEntry {
+    id: number;
+    keyword: string;
+    hints: number[];
+    offset: number;
+    count: number;
+}
+
+interface GamePack {
+    file: FileHandle;
+    vocab: SharedVocab;
+    games: Record<string, PackEntry>;
+}
+
+// Mở 1 lần cho cả container: chỉ đọc header, vocab và bảng offset, rank đọc theo từng lần tra
+let gamePack: Promise<GamePack | null> | null = null;
+
+async function openGamePack(): Promise<GamePack | null> {
+    let file: FileHandle;
+    try {
+        file = await open(join(CONTEXTO_DIR, 'games.pack'), 'r');
+    } catch {
+        return null;
+    }
+
+    const header = Buffer.alloc(PACK_HEADER_SIZE);
+    await file.read(header, 0, PACK_HEADER_SIZE, 0);
+    if (header.toString('latin1', 0, 4) !== PACK_MAGIC || header.readUInt16LE(4) !== PACK_VERSION) {
+        await file.close();
+        throw new Error('games.pack không hợp lệ (sai magic / phiên bản)');
+    }
+    const vocabCount = header.readUInt32LE(8);
+    const vocabLength = header.readUInt32LE(12);
+    const tableOffset = header.readUInt32LE(16);
+    const tableLength = header.readUInt32LE(20);
+
+    const vocabBytes = Buffer.alloc(vocabLength);
+    const tableBytes = Buffer.alloc(tableLength);
+    const [, , foldIndex] = await Promise.all([
+        file.read(vocabBytes, 0, vocabLength, PACK_HEADER_SIZE),
+        file.read(tableBytes, 0, tableLength, tableOffset),
+        readFoldIndex(),
+    ]);
+
+    const words = vocabBytes.toString('utf-8').split('\n', vocabCount);
+    return {
+        file,
+        vocab: { words, foldedIds: buildFoldedIds(words, foldIndex) },
+        games: JSON.parse(tableBytes.toString('utf-8')).games,
+    };
+}
+
+function getGamePack() {
+    if (!gamePack) {
+        gamePack = openGamePack();
+        // Lỗi mở pack -> lần sau thử lại, loadGameData đọc game từ file riêng
+        gamePack.catch(() => { gamePack = null; });
+    }
+    return gamePack;
+}
+
+class PackedGameData implements GameData {
+    // Cả mảng rank của game, chỉ đọc khi cần khoảng rank / top-N
+    private full: Promise<BinaryGameData> | null = null;
+
+    constructor(private pack: GamePack, private entry: PackEntry) { }
+
+    get keyword() {
+        return this.entry.keyword;
+    }
+
+    get hints() {
+        return this.entry.hints.length > 0 ? this.entry.hints : undefined;
+    }
+
+    // 4 byte ở offset + 4 * vocab id, 0 = không có trong game
+    private async readRank(id: number) {
+        if (id >= this.entry.count) return 0;
+        const bytes = Buffer.alloc(4);
+        await this.pack.file.read(bytes, 0, 4, this.entry.offset + 4 * id);
+        return bytes.readUInt32LE(0);
+    }
+
+    async rankOf(foldedWord: string) {
+        const ids = this.pack.vocab.foldedIds.get(foldedWord);
+        if (ids === undefined) return undefined;
+        const ranks = await Promise.all((typeof ids === 'number' ? [ids] : ids).map((id) => this.readRank(id)));
+        const found = ranks.filter((rank) => rank !== 0);
+        return found.length > 0 ? Math.min(...found) : undefined;
+    }
+
+    private loadFull() {
+        if (!this.full) {
+            this.full = (async () => {
+                const ranks = new Uint32Array(this.entry.count);
+                await this.pack.file.read(Buffer.from(ranks.buffer), 0, 4 * this.entry.count, this.entry.offset);
+                return new BinaryGameData(this.keyword, ranks, this.pack.vocab, this.hints);
+            })();
+            this.full.catch(() => { this.full = null; });
+        }
+        return this.full;
+    }
+
+    async wordsInRange(minRank: number, maxRank: number) {
+        return (await this.loadFull()).wordsInRange(minRank, maxRank);
+    }
+
+    async closest(limit: number) {
+        return (await this.loadFull()).closest(limit);
+    }
+}
+
+async function fileExists(filePath: string) {
+    try {
+        await stat(filePath);
+        return true;
+    } catch {
+        return false;
+    }
+}
+
+export async function loadGameData(slug: string): Promise<GameData> {
+    // Game chưa có trong pack (pack cũ hơn game) hoặc pack lỗi -> đọc file riêng
+    const pack = await getGamePack().catch(() => null);
+    if (pack && pack.games[slug]) {
+        return new PackedGameData(pack, pack.games[slug]);
+    }
+
+    const binaryPath = join(CONTEXTO_DIR, `${slug}.bin`);
+    if (await fileExists(binaryPath)) {
+        const [buffer, order] = await Promise.all([readFile(binaryPath), readRankOrder(slug)]);
+        const header = parseGameHeader(buffer);
+        const vocab = await getSharedVocab(header.vocabCount);
+        const hints = header.hints.length > 0 ? header.hints : undefined;
+        return new BinaryGameData(header.keyword, decodeRanks(buffer, header), vocab, hints, order);
+    }
+
+    const headPath = join(CONTEXTO_DIR, `${slug}.head.json`);
+    if (await fileExists(headPath)) {
+        return new TieredGameData(slug, JSON.parse(await readFile(headPath, 'utf-8')));
+    }
+
+    const [fileContent, order] = await Promise.all([
+        readFile(join(CONTEXTO_DIR, `${slug}.json`), 'utf-8'),
+        readRankOrder(slug),
+    ]);
+    const gameData = JSON.parse(fileContent);
+    return new JsonGameData(gameData.keyword, gameData.rank_map, gameData.hints, order);
+}
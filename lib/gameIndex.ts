@@ -0,0 +1,45 @@
+import { readFile } from "fs/promises";
+import { join } from "path";
+
+// Danh sách game từ index phụ lib/contexto/rankIndex.json (ghi bởi scripts/rank_loader.py),
+// fallback sang rankLoader.json nếu chưa có index. Không quét thư mục.
+
+const CONTEXTO_DIR = join(process.cwd(), 'lib', 'contexto');
+
+export interface GameIndexEntry {
+    slug: string;
+    createdAt: string;
+    keyword?: string;
+    size?: number;
+    sha1?: string;
+}
+
+interface RankIndexFile {
+    version: number;
+    games: Record<string, { id: number; createdAt: string; keyword: string; size: number; sha1: string }>;
+}
+
+let gameIndex: Record<number, GameIndexEntry> | null = null;
+
+async function readRankIndex(): Promise<Record<number, GameIndexEntry>> {
+    try {
+        const content = await readFile(join(CONTEXTO_DIR, 'rankIndex.json'), 'utf-8');
+        const index: RankIndexFile = JSON.parse(content);
+        const games: Record<number, GameIndexEntry> = {};
+        for (const [slug, { id, ...entry }] of Object.entries(index.games)) {
+            games[id] = { slug, ...entry };
+        }
+        return games;
+    } catch {
+        const content = await readFile(join(CONTEXTO_DIR, 'rankLoader.json'), 'utf-8');
+        return JSON.parse(content);
+    }
+}
+
+// id -> game, cache trong lifecycle của serverless container
+export async function getGameIndex() {
+    if (!gameIndex) {
+        gameIndex = await readRankIndex();
+    }
+    return gameIndex;
+}
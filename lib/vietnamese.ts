@@ -0,0 +1,39 @@
+import { createHash } from "crypto";
+import { readFileSync } from "fs";
+import { join } from "path";
+
+// Chuẩn hoá từ tiếng Việt về khoá so khớp (fold), theo bảng dùng chung lib/vietnameseFold.json
+// với pipeline Python (scripts/vietnamese_fold.py). Các bước:
+//   1. NFC + chữ thường
+//   2. Ký tự trong "separators" (khoảng trắng, "_") -> 1 dấu cách, bỏ ở 2 đầu
+//   3. "tone_placement": dấu kiểu mới -> kiểu cũ (khóa -> khoá, thúy -> thuý, hòe -> hoè)
+//   4. "syllable_final": i có dấu ở cuối âm tiết -> y (lí -> lý, kĩ -> kỹ)
+// Hai bản phải cho kết quả giống hệt trên toàn vocab: python scripts/check_vietnamese_fold.py
+
+interface FoldTable {
+    separators: string;
+    tone_placement: [string, string][];
+    syllable_final: [string, string][];
+}
+
+const tableContent = readFileSync(join(process.cwd(), 'lib', 'vietnameseFold.json'));
+const table: FoldTable = JSON.parse(tableContent.toString('utf-8'));
+
+// sha1 của file bảng - sidecar vocab.fold.json tạo bằng bảng khác thì bỏ qua
+export const FOLD_TABLE_SHA1 = createHash('sha1').update(tableContent).digest('hex');
+
+const escapeClassChar = (char: string) => char.replace(/[\\\]^-]/g, '\\$&');
+
+const separatorsRe = new RegExp(`[${[...table.separators].map(escapeClassChar).join('')}]+`, 'g');
+const syllableFinal = new Map(table.syllable_final);
+const syllableFinalRe = new RegExp(`[${[...syllableFinal.keys()].join('')}](?= |$)`, 'g');
+
+export function foldVietnamese(text: string): string {
+    let result = text.normalize('NFC').toLowerCase().replace(separatorsRe, ' ');
+    if (result.startsWith(' ')) result = result.slice(1);
+    if (result.endsWith(' ')) result = result.slice(0, -1);
+    for (const [from, to] of table.tone_placement) {
+        result = result.replaceAll(from, to);
+    }
+    return result.replace(syllableFinalRe, (char) => syllableFinal.get(char)!);
+}
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+So sánh các cách lưu trữ game (kích thước + thời gian giải mã) trên toàn bộ game trong lib/contexto,
+và kiểm tra round-trip từng game với file JSON.
+
+Mỗi game là 1 hoán vị gần như của cùng 1 vocab ~87k từ: nén từng file riêng (gzip, brotli) phải
+lưu lại toàn bộ chuỗi từ trong mỗi game. Các codec dùng chung dữ liệu giữa các game:
+
+    zstd+dict   zstd với dictionary train trên các game (cần `zstandard`, bỏ qua nếu chưa cài)
+    bin uint32  mảng rank theo vocab id của vocab chung (đọc theo offset, xem game_format.py)
+    bin varint  như trên, LEB128
+    bin perm    vocab id theo thứ tự rank, bit-packed ~log2(vocab) bit / từ (bản lưu trữ)
+
+Kích thước các codec bin không tính vocab.txt (dùng chung, in riêng 1 lần). Vocab dựng trong bộ nhớ
+theo thứ tự rankLoader.json, không ghi gì vào lib/contexto.
+
+Cách sử dụng:
+    cd scripts
+    python benchmark_game_codecs.py                    # mọi game trong lib/contexto
+    python benchmark_game_codecs.py --limit 20         # 20 game đầu, chạy nhanh
+    python benchmark_game_codecs.py --dir /path/to/contexto --brotli-quality 11
+"""
+
+import argparse
+import gzip
+import json
+import time
+from pathlib import Path
+
+from convert_games_to_binary import ordered_game_files
+from game_format import CODECS, decode_game, decode_game_ranks, encode_game, permutation_bits, rank_array
+
+ZSTD_LEVEL = 19
+ZSTD_DICT_SIZE = 1 << 20  # 1 MB, lớn hơn không nhỏ thêm đáng kể
+
+
+# =========================== CODEC ===========================
+
+def text_codecs(samples, brotli_quality):
+    """(tên, nén, giải nén) cho các codec trên JSON compact, bỏ qua codec thiếu package"""
+    codecs = [
+        ("json", lambda data: data, lambda data: data),
+        ("json.gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0), gzip.decompress),
+    ]
+
+    try:
+        import brotli
+        codecs.append(("json.br", lambda data: brotli.compress(data, quality=brotli_quality), brotli.decompress))
+    except ImportError:
+        print("   ⚠️  Chưa cài brotli, bỏ qua json.br")
+
+    try:
+        import zstandard
+    except ImportError:
+        print("   ⚠️  Chưa cài zstandard, bỏ qua zstd+dict")
+        return codecs
+
+    start = time.perf_counter()
+    dictionary = zstandard.train_dictionary(ZSTD_DICT_SIZE, samples)
+    print(f"   📖 Dictionary zstd {len(dictionary.as_bytes()) / 1024:.0f} KB, train trên {len(samples)} game "
+          f"trong {time.perf_counter() - start:.1f}s")
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+    decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+    codecs.append(("json.zst+dict", compressor.compress, decompressor.decompress))
+    return codecs
+
+
+def build_vocab(games):
+    """Vocab chung dựng trong bộ nhớ (từ mới thêm vào cuối theo thứ tự game, giống vocab.txt)"""
+    word_ids = {}
+    for game in games:
+        for word in game["rank_map"]:
+            word_ids.setdefault(word, len(word_ids))
+    return list(word_ids), word_ids
+
+
+def same_game(decoded, game):
+    return (decoded["keyword"] == game["keyword"] and decoded["rank_map"] == game["rank_map"]
+            and decoded.get("hints", []) == game.get("hints", []))
+
+
+# =========================== MAIN ===========================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", type=Path, default=Path(__file__).parent.parent / "lib" / "contexto",
+                        help="Thư mục game (mặc định: lib/contexto)")
+    parser.add_argument("--limit", type=int, default=None, help="Chỉ lấy N game đầu")
+    parser.add_argument("--brotli-quality", type=int, default=9)
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("🗜️  CODEC LƯU TRỮ GAME")
+    print("=" * 70)
+
+    game_paths = ordered_game_files(args.dir)[:args.limit]
+    if not game_paths:
+        print(f"❌ Không có game nào trong {args.dir}")
+        raise SystemExit(1)
+
+    games = []
+    compacts = []
+    for path in game_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            game = json.load(f)
+        games.append(game)
+        compacts.append(json.dumps(game, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    vocab, word_ids = build_vocab(games)
+    vocab_bytes = len("".join(f"{word}\n" for word in vocab).encode("utf-8"))
+    print(f"\n📚 {len(games)} game, vocab chung {len(vocab):,} từ ({vocab_bytes / 1024 / 1024:.2f} MB, "
+          f"perm {permutation_bits(len(vocab))} bit / id)\n")
+
+    # ===== ĐO =====
+    # (tên, tổng byte, tổng giây giải mã -> rank_map, tổng giây giải mã -> mảng rank hoặc None)
+    results = []
+    failed = []
+
+    for name, compress, decompress in text_codecs(compacts, args.brotli_quality):
+        total_size = decode_seconds = 0.0
+        for game, compact in zip(games, compacts):
+            data = compress(compact)
+            total_size += len(data)
+            start = time.perf_counter()
+            decoded = json.loads(decompress(data))
+            decode_seconds += time.perf_counter() - start
+            if not same_game(decoded, game):
+                failed.append((name, game["keyword"]))
+        results.append((name, total_size, decode_seconds, None))
+
+    for codec_name, codec in sorted(CODECS.items(), key=lambda item: item[1]):
+        name = f"bin {codec_name}"
+        total_size = decode_seconds = ranks_seconds = 0.0
+        for game in games:
+            ranks = rank_array(game["rank_map"], word_ids, len(vocab))
+            data = encode_game(game["keyword"], ranks, game.get("hints"), codec)
+            total_size += len(data)
+            start = time.perf_counter()
+            decode_game_ranks(data)
+            ranks_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            decoded = decode_game(data, vocab)
+            decode_seconds += time.perf_counter() - start
+            if not same_game(decoded, game):
+                failed.append((name, game["keyword"]))
+        results.append((name, total_size, decode_seconds, ranks_seconds))
+
+    # ===== KẾT QUẢ =====
+    base_size = results[0][1]
+    print(f"\n   {'codec':16s} {'tổng':>10s} {'/ game':>10s} {'tỉ lệ':>7s} {'-> rank_map':>12s} {'-> ranks':>10s}")
+    for name, total_size, decode_seconds, ranks_seconds in results:
+        ranks_ms = f"{ranks_seconds / len(games) * 1000:7.2f} ms" if ranks_seconds is not None else f"{'-':>10s}"
+        print(f"   {name:16s} {total_size / 1024 / 1024:7.2f} MB {total_size / len(games) / 1024:7.0f} KB "
+              f"{base_size / total_size:6.1f}x {decode_seconds / len(games) * 1000:9.2f} ms {ranks_ms}")
+    print(f"\n   (bin: + vocab.txt {vocab_bytes / 1024 / 1024:.2f} MB dùng chung; thời gian giải mã là trung bình / game)")
+
+    # ===== ROUND-TRIP =====
+    if failed:
+        for name, keyword in failed[:20]:
+            print(f"   ❌ {name}: game '{keyword}' giải mã khác file JSON")
+        print(f"\n❌ {len(failed)} lần giải mã lệch")
+        raise SystemExit(1)
+    print(f"\n✅ Round-trip khớp JSON: {len(games)} game x {len(results)} codec")
+
+
+if __name__ == "__main__":
+    main()
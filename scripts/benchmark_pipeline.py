@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Benchmark các đường nóng của pipeline, chạy offline (không cần model, API key hay mạng).
+
+Dữ liệu giả lập cỡ thật: vocab tổng hợp kích thước như clean_dict.pkl (có cả từ rác dạng
+"người_<target>", "<target>_này"...), embeddings ngẫu nhiên đã normalize, encoder giả thay
+SentenceTransformer (vector theo hash của từ), điểm LLM giả cho bước merge.
+
+Các nhóm benchmark (lọc bằng -k, giống pytest):
+    rank.*       run_model_ranking (float32/float16/int8), batch nhiều query, load cache embeddings
+    rrf.*        generate_rrf_ranking (3 model), fuse_target_ranking
+    filter.*     is_valid_candidate trên cả vocab, noise-filter index (build + tra cứu)
+    merge.*      merge_llm_ranking (bước merge của process_file)
+    game.*       ghi/đọc game JSON và nhị phân (uint32, varint, perm)
+
+Mỗi benchmark chạy --warmup lần bỏ qua rồi --rounds lần đo, báo min/median/mean/stddev.
+--save lưu kết quả JSON; --compare so với 1 file đã lưu (theo --stat, mặc định min - ít nhiễu
+nhất trên máy dùng chung), chậm hơn quá --max-regression thì exit 1 (chặn regression khi tối ưu).
+
+Cách sử dụng:
+    cd scripts
+    python benchmark_pipeline.py                                  # vocab cỡ clean_dict.pkl
+    python benchmark_pipeline.py --quick -k rank filter           # nhanh, chỉ 2 nhóm
+    python benchmark_pipeline.py --save bench_baseline.json
+    python benchmark_pipeline.py --compare bench_baseline.json --max-regression 0.15
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import ranking_pipeline as rp
+from game_format import CODECS, load_shared_vocab, read_game_binary, write_game_binary
+
+DEFAULT_VOCAB_SIZE = 200_000   # Khi không có clean_dict.pkl
+
+SYLLABLES = (
+    "anh bà bác bàn bánh bão bếp biển bình bóng bút cá cà cái cam cây chảo chân chị chó chợ "
+    "chuối cơm của cửa đá đèn đen đỏ đồ đông đường gà gạo ghế giày giường hát hoa học hồng "
+    "kem kẹo khăn khoai lá làm lạnh lúa máy mắt mẹ mèo mì mũ muối mưa nấu nhà nón nước ốc "
+    "phê phở quần quả rau rượu sách sáng sân sĩ sông sữa tay tàu thịt thuốc tiền tóc trà trăng "
+    "trường tủ vải vàng vịt viện vở vui xanh xe xoài y tá bệnh chạy bộ màn hình lái"
+).split()
+
+TARGETS = ["bác_sĩ", "xe_máy", "cà_phê", "nấu_ăn", "màu_đỏ", "trường_học", "cái_chảo", "chạy_bộ"]
+
+
+# =========================== DỮ LIỆU GIẢ LẬP ===========================
+
+def synthetic_vocab(size, seed=0):
+    """
+    Vocab tổng hợp `size` từ không trùng: từ 1-3 âm tiết, các target mẫu
+    và ~2% từ rác bọc quanh target (bị noise filter loại).
+    """
+    rng = np.random.default_rng(seed)
+    noise_prefixes = sorted(rp.NOISE_TOKENS)
+    noise_suffixes = sorted(rp.NOISE_SUFFIXES)
+
+    words = dict.fromkeys(TARGETS)
+    for target in TARGETS:
+        for prefix in noise_prefixes[:size // (50 * len(TARGETS)) or 1]:
+            words[f"{prefix}_{target}"] = None
+        for suffix in noise_suffixes:
+            words[f"{target}_{suffix}"] = None
+
+    while len(words) < size:
+        lengths = rng.integers(1, 4, size=size)
+        picks = rng.integers(0, len(SYLLABLES), size=(size, 3))
+        for length, row in zip(lengths.tolist(), picks.tolist()):
+            words["_".join(SYLLABLES[i] for i in row[:length])] = None
+            if len(words) >= size:
+                break
+    return list(words)[:size]
+
+
+def synthetic_embeddings(n, dim, seed):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n, dim), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings
+
+
+class StubEncoder:
+    """Thay SentenceTransformer: embedding cố định theo hash của câu, đã normalize"""
+
+    def __init__(self, dim):
+        self.dim = dim
+
+    def encode(self, sentences, convert_to_numpy=True, normalize_embeddings=True, **kwargs):
+        vectors = np.stack([
+            np.random.default_rng(int.from_bytes(hashlib.sha1(s.encode("utf-8")).digest()[:8], "little"))
+            .standard_normal(self.dim, dtype=np.float32)
+            for s in sentences
+        ])
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+def synthetic_llm_scores(candidates, seed=0):
+    """Điểm LLM giả: 0-500, có cả từ ngoài danh sách ứng viên và từ trùng (như output thật)"""
+    rng = np.random.default_rng(seed)
+    scores = rng.integers(0, 501, size=len(candidates)).tolist()
+    items = [rp.CalibratedScore(word, float(score)) for word, score in zip(candidates, scores)]
+    items += [rp.CalibratedScore(f"bịa_{i}", 300.0) for i in range(20)] + items[:20]
+    return items
+
+
+# =========================== ĐO ===========================
+
+def measure(fn, rounds, warmup):
+    """Chạy fn warmup + rounds lần, trả về stats (giây) của các lần đo"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {
+        "rounds": rounds,
+        "min": min(timings),
+        "max": max(timings),
+        "mean": statistics.fmean(timings),
+        "median": statistics.median(timings),
+        "stddev": statistics.stdev(timings) if rounds > 1 else 0.0,
+    }
+
+
+def build_benchmarks(vocab, dim, work_dir):
+    """
+    Dựng dữ liệu + danh sách benchmark.
+
+    Returns:
+        list: (tên, fn) theo thứ tự chạy
+    """
+    n = len(vocab)
+    rp.CACHE_DIR = str(work_dir)
+    encoder = StubEncoder(dim)
+    models = {name: encoder for name in rp.EMBEDDING_MODELS}
+
+    # Embeddings vocab nạp sẵn vào registry (ranking không đọc đĩa). Các model dùng chung 1 ma trận:
+    # thời gian không phụ thuộc giá trị, còn 3 ma trận cỡ thật (~600 MB mỗi cái) thì quá nặng cho CI
+    corpus = synthetic_embeddings(n, dim, seed=0)
+    for name in rp.EMBEDDING_MODELS:
+        rp._VOCAB_EMBEDDINGS_REGISTRY[name] = corpus
+    first_model = next(iter(rp.EMBEDDING_MODELS))
+    quantized = {storage: rp.quantize_embeddings(corpus, storage) for storage in ("float16", "int8")}
+    query = encoder.encode([TARGETS[0]])
+
+    # Cache embeddings trên đĩa cho benchmark load (manifest khớp vocab -> không encode lại)
+    rp.save_embeddings(first_model, corpus, "float32")
+    rp.write_embedding_manifest(first_model, "float32", vocab)
+
+    target = TARGETS[0]
+    rp.get_noise_filter_index(vocab)
+    weights = [config["weight"] for config in rp.EMBEDDING_MODELS.values()]
+    rank_arrays = [rp.run_model_ranking(name, models[name], vocab, target) for name in rp.EMBEDDING_MODELS]
+
+    # Merge: 1000 ứng viên đầu + 80 từ brainstorm, phần đuôi là cả vocab
+    rrf_words = rp.fuse_target_ranking(target, vocab, rank_arrays, weights)
+    sorted_items = [(word.replace("_", " "), rank) for rank, word in enumerate(rrf_words, start=2)]
+    candidates = [word for word, _ in sorted_items[:rp.TOP_K_RERANK]] + [f"brainstorm {i}" for i in range(80)]
+    llm_results = synthetic_llm_scores(candidates)
+    keyword = target.replace("_", " ")
+    rank_map = rp.merge_llm_ranking(keyword, sorted_items, candidates, llm_results)
+    hints = list(range(2, 2000, 150))
+
+    json_path = work_dir / "game.json"
+    vocab_path = work_dir / "vocab.txt"
+    binary_paths = {codec: work_dir / f"game.{codec}.bin" for codec in CODECS}
+
+    def write_json():
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"keyword": keyword, "rank_map": rank_map, "hints": hints}, f,
+                      ensure_ascii=False, separators=(",", ":"))
+
+    def read_json():
+        with open(json_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    write_json()
+    for codec, path in binary_paths.items():
+        write_game_binary(path, keyword, rank_map, hints, vocab_path, CODECS[codec])
+    shared_vocab = load_shared_vocab(vocab_path)
+
+    benchmarks = [
+        ("rank.run_model_ranking.float32", lambda: rp.run_model_ranking(first_model, encoder, vocab, target)),
+        ("rank.compute_rank_array.float16", lambda: rp.compute_rank_array(quantized["float16"], query)),
+        ("rank.compute_rank_array.int8", lambda: rp.compute_rank_array(quantized["int8"], query)),
+        ("rank.run_model_ranking_batch.8q",
+         lambda: rp.run_model_ranking_batch(first_model, encoder, vocab, TARGETS)),
+        ("rank.load_vocab_embeddings",
+         lambda: rp.load_vocab_embeddings(first_model, encoder, vocab, "float32")),
+        ("rrf.generate_rrf_ranking", lambda: rp.generate_rrf_ranking(target, vocab, models, workers=1)),
+        ("rrf.fuse_target_ranking", lambda: rp.fuse_target_ranking(target, vocab, rank_arrays, weights)),
+        ("filter.is_valid_candidate", lambda: [rp.is_valid_candidate(word, target) for word in vocab]),
+        ("filter.build_noise_filter_index", lambda: rp.build_noise_filter_index(vocab)),
+        ("filter.invalid_candidate_ids",
+         lambda: rp.invalid_candidate_ids(rp.get_noise_filter_index(vocab), vocab, target)),
+        ("merge.merge_llm_ranking",
+         lambda: rp.merge_llm_ranking(keyword, sorted_items, candidates, llm_results)),
+        ("game.write_json", write_json),
+        ("game.read_json", read_json),
+    ]
+    for codec, path in binary_paths.items():
+        benchmarks += [
+            (f"game.write_binary.{codec}",
+             lambda path=path, codec=codec: write_game_binary(path, keyword, rank_map, hints, vocab_path, CODECS[codec])),
+            (f"game.read_binary.{codec}", lambda path=path: read_game_binary(path, shared_vocab)),
+        ]
+    return benchmarks
+
+
+# =========================== SO SÁNH ===========================
+
+def compare_results(results, baseline, max_regression, stat="min"):
+    """
+    In tỉ lệ thời gian (theo stat) so với baseline.
+
+    Returns:
+        list: tên các benchmark chậm hơn baseline quá max_regression
+    """
+    if baseline.get("params") != results["params"]:
+        print(f"   ⚠️  Tham số khác baseline: {baseline.get('params')} vs {results['params']}")
+
+    regressions = []
+    print(f"\n📐 So với baseline ({stat}, ngưỡng +{max_regression:.0%}):")
+    for name, stats in results["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if base is None:
+            print(f"   {name:40s} (mới)")
+            continue
+        ratio = stats[stat] / base[stat]
+        regressed = ratio > 1 + max_regression
+        regressions += [name] if regressed else []
+        print(f"   {'❌' if regressed else '✅'} {name:38s} {base[stat] * 1000:9.2f} -> "
+              f"{stats[stat] * 1000:9.2f} ms  ({ratio:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vocab-size", type=int, default=None,
+                        help=f"Số từ (mặc định: như clean_dict.pkl, không có thì {DEFAULT_VOCAB_SIZE:,})")
+    parser.add_argument("--dim", type=int, default=768, help="Số chiều embedding")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--quick", action="store_true", help="Vocab 20k, 3 round (chạy thử nhanh)")
+    parser.add_argument("-k", nargs="+", default=None, help="Chỉ chạy benchmark có tên chứa 1 trong các chuỗi")
+    parser.add_argument("--save", default=None, help="Lưu kết quả JSON")
+    parser.add_argument("--compare", default=None, help="File JSON baseline (từ --save) để so sánh")
+    parser.add_argument("--stat", default="min", choices=["min", "median", "mean"], help="Số đo dùng khi so sánh")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Chậm hơn baseline quá tỉ lệ này -> exit 1")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.vocab_size, args.rounds = args.vocab_size or 20_000, min(args.rounds, 3)
+    vocab_size = args.vocab_size
+    if vocab_size is None:
+        clean_dict = Path(__file__).parent / "clean_dict.pkl"
+        vocab_size = len(rp.load_vocab()) if clean_dict.exists() else DEFAULT_VOCAB_SIZE
+
+    vocab = synthetic_vocab(vocab_size)
+    print(f"📊 Vocab giả lập {len(vocab):,} từ x {args.dim} chiều, {args.rounds} round (+{args.warmup} warmup)\n")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        benchmarks = build_benchmarks(vocab, args.dim, Path(work_dir))
+        if args.k:
+            benchmarks = [(name, fn) for name, fn in benchmarks if any(key in name for key in args.k)]
+
+        # Log của pipeline (print trong từng hàm) không lẫn vào bảng kết quả
+        results = {}
+        for name, fn in benchmarks:
+            with open(os.devnull, "w") as devnull:
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    stats = measure(fn, args.rounds, args.warmup)
+                finally:
+                    sys.stdout = stdout
+            results[name] = stats
+            print(f"   {name:40s} min {stats['min'] * 1000:9.2f} ms   median {stats['median'] * 1000:9.2f} ms"
+                  f"   ± {stats['stddev'] * 1000:7.2f} ms")
+
+    report = {
+        "machine": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "params": {"vocab_size": len(vocab), "dim": args.dim},
+        "benchmarks": results,
+    }
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        print(f"\n💾 Đã lưu: {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare_results(report, json.load(f), args.max_regression, args.stat)
+        if regressions:
+            print(f"\n❌ {len(regressions)} benchmark chậm hơn baseline: {', '.join(regressions)}")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: FAISS full-vocab search (cách cũ) vs NumPy matvec + argsort (compute_rank_array).
+
+Dùng kích thước vocab thật từ clean_dict.pkl và embeddings giả lập (hoặc cache
+embeddings thật trong model_cache/ nếu có), kiểm tra 2 cách cho cùng ranking.
+Pipeline không còn dùng FAISS: cần `pip install faiss-cpu` để so sánh, chưa cài thì chỉ đo NumPy.
+
+Cách sử dụng:
+    cd scripts
+    python benchmark_ranking.py                  # vocab từ clean_dict.pkl
+    python benchmark_ranking.py --vocab-size 300000 --dim 768 --repeat 5
+    python benchmark_ranking.py --model dangvantuan   # dùng cache .npy thật
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from ranking_pipeline import CACHE_DIR, compute_rank_array, load_vocab
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+def faiss_rank_map(corpus_embeddings, query_embedding, dictionary):
+    """Ranking theo cách cũ: IndexFlatIP + search k = len(vocab) + dict word -> rank"""
+    index = faiss.IndexFlatIP(corpus_embeddings.shape[1])
+    index.add(corpus_embeddings)
+    _, I = index.search(query_embedding, len(dictionary))
+    return {dictionary[idx]: rank + 1 for rank, idx in enumerate(I[0])}, I[0]
+
+
+def time_it(fn, repeat):
+    """Chạy fn `repeat` lần, trả về (kết quả lần cuối, thời gian tốt nhất)"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vocab-size", type=int, default=None, help="Số từ (mặc định: theo clean_dict.pkl)")
+    parser.add_argument("--dim", type=int, default=768, help="Số chiều embedding giả lập")
+    parser.add_argument("--model", default=None, help="Dùng <model>_vocab_embeddings.npy trong model_cache")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=1e-6, help="Sai số score cho phép khi so thứ tự")
+    args = parser.parse_args()
+
+    if args.model:
+        emb_path = os.path.join(CACHE_DIR, f"{args.model}_vocab_embeddings.npy")
+        corpus_embeddings = np.load(emb_path)
+        n, dim = corpus_embeddings.shape
+    else:
+        n = args.vocab_size or len(set(load_vocab()))
+        dim = args.dim
+        rng = np.random.default_rng(0)
+        corpus_embeddings = rng.standard_normal((n, dim), dtype=np.float32)
+        corpus_embeddings /= np.linalg.norm(corpus_embeddings, axis=1, keepdims=True)
+
+    dictionary = [f"w{i}" for i in range(n)]
+    query_embedding = corpus_embeddings[:1] + 0.01
+    query_embedding /= np.linalg.norm(query_embedding)
+
+    print(f"📊 Vocab: {n:,} từ x {dim} chiều ({corpus_embeddings.nbytes / 1024 / 1024:.1f} MB)")
+
+    ranks, t_numpy = time_it(lambda: compute_rank_array(corpus_embeddings, query_embedding), args.repeat)
+    if faiss is None:
+        print(f"   NumPy (matvec + argsort)         : {t_numpy * 1000:>9.1f} ms")
+        print("   ⚠️  Chưa cài faiss-cpu, bỏ qua so sánh với FAISS")
+        return
+
+    (rank_map, faiss_order), t_faiss = time_it(
+        lambda: faiss_rank_map(corpus_embeddings, query_embedding, dictionary), args.repeat
+    )
+
+    # Kiểm tra kết quả: rank khác nhau chỉ được phép giữa các từ có score bằng nhau
+    # trong sai số làm tròn float32 (FAISS và BLAS cộng dồn tích vô hướng theo thứ tự khác nhau)
+    faiss_ranks = np.empty(n, dtype=np.int32)
+    faiss_ranks[faiss_order] = np.arange(1, n + 1, dtype=np.int32)
+    mismatched = np.flatnonzero(faiss_ranks != ranks)
+    scores = corpus_embeddings @ query_embedding.reshape(-1)
+    score_gap = np.abs(scores[faiss_order[ranks[mismatched] - 1]] - scores[mismatched])
+    tie_only = bool(np.all(score_gap <= args.tolerance))
+    assert len(rank_map) == n
+
+    print(f"   FAISS (build + search k=N + dict): {t_faiss * 1000:>9.1f} ms")
+    print(f"   NumPy (matvec + argsort)         : {t_numpy * 1000:>9.1f} ms  ({t_faiss / t_numpy:.1f}x)")
+    if len(mismatched) == 0:
+        print("   ✅ Ranking giống hệt nhau")
+    elif tie_only:
+        print(f"   ✅ Ranking giống nhau ({len(mismatched):,} vị trí chỉ đổi chỗ giữa các score bằng nhau, "
+              f"lệch tối đa {score_gap.max():.1e})")
+    else:
+        print(f"   ❌ Ranking khác nhau ở {len(mismatched)} vị trí")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Dựng lib/contexto/games.pack từ các game trong lib/contexto (xem game_pack.py).
+
+Game được ghi theo thứ tự rankLoader.json (từ mới vào cuối vocab.txt theo đúng thứ tự đó), lấy rank từ
+<slug>.bin nếu có, ngược lại từ <slug>.json (game mới chỉ có .bin). Sau khi đã có pack, pipeline tự thêm game mới vào pack
+(save_to_contexto_and_update_loader), không cần chạy lại script này.
+
+Cách sử dụng:
+    cd scripts
+    python build_game_pack.py                 # dựng pack
+    python build_game_pack.py --verify        # + so từng game trong pack với file JSON / .bin
+    python build_game_pack.py --verify-only   # chỉ kiểm tra pack hiện có
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from game_format import SHARED_VOCAB_FILE, decode_game, load_shared_vocab
+from game_pack import PACK_FILE, build_pack, open_pack, pack_game_ranks, pack_rank, pack_vocab
+from rank_loader import game_file, load_rank_loader
+
+
+def game_order(contexto_dir):
+    """(slug, id) các game có file JSON hoặc .bin, theo thứ tự id trong rankLoader.json"""
+    return [
+        (entry["slug"], int(game_id))
+        for game_id, entry in sorted(load_rank_loader(contexto_dir).items(), key=lambda item: int(item[0]))
+        if game_file(entry["slug"], contexto_dir) is not None
+    ]
+
+
+def load_game(path, vocab):
+    """Game ở dạng giống file JSON, từ <slug>.json hoặc <slug>.bin"""
+    if path.suffix == ".bin":
+        return decode_game(path.read_bytes(), vocab)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def verify_pack(pack_path, contexto_dir):
+    """So rank_map của từng game trong pack với file JSON (hoặc .bin). Returns: số game lệch"""
+    pack = open_pack(pack_path)
+    vocab = pack_vocab(pack)
+    shared_vocab = load_shared_vocab(contexto_dir / SHARED_VOCAB_FILE)
+    if vocab != shared_vocab[:len(vocab)]:
+        print("   ❌ Vocab trong pack khác vocab.txt")
+        return len(pack["games"])
+
+    failed = 0
+    for slug, entry in pack["games"].items():
+        path = game_file(slug, contexto_dir)
+        if path is None:
+            failed += 1
+            print(f"   ❌ {slug}: không có {slug}.json / {slug}.bin")
+            continue
+        game = load_game(path, shared_vocab)
+        ranks = pack_game_ranks(pack, slug)
+        ids = np.flatnonzero(ranks)
+        rank_map = {vocab[idx]: int(ranks[idx]) for idx in ids.tolist()}
+        if (rank_map != game["rank_map"] or entry["keyword"] != game["keyword"]
+                or entry["hints"] != game.get("hints", [])):
+            failed += 1
+            print(f"   ❌ {slug}: pack khác {path.name}")
+    return failed
+
+
+def benchmark_lookups(pack_path, contexto_dir, samples=100_000):
+    """Thời gian tra rank 1 từ trong pack (4 byte theo offset) so với đọc + parse cả file JSON"""
+    start = time.perf_counter()
+    pack = open_pack(pack_path)
+    open_ms = (time.perf_counter() - start) * 1000
+
+    slugs = list(pack["games"])
+    rng = np.random.default_rng(0)
+    picks = [(slugs[i], int(word_id)) for i, word_id in zip(
+        rng.integers(len(slugs), size=samples), rng.integers(pack["vocab_count"], size=samples)
+    )]
+    start = time.perf_counter()
+    for slug, word_id in picks:
+        pack_rank(pack, slug, word_id)
+    lookup_us = (time.perf_counter() - start) / samples * 1e6
+
+    json_paths = [contexto_dir / f"{slug}.json" for slug in slugs]
+    json_paths = [path for path in json_paths if path.exists()][:10]
+    start = time.perf_counter()
+    for path in json_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            json.load(f)
+    json_ms = (time.perf_counter() - start) / max(1, len(json_paths)) * 1000
+
+    print(f"   Mở pack (header + bảng offset): {open_ms:.2f} ms")
+    print(f"   Tra 1 rank bất kỳ game nào:     {lookup_us:.2f} µs ({samples:,} lần)")
+    print(f"   So với đọc + parse 1 game JSON: {json_ms:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verify", action="store_true", help="So từng game trong pack với file JSON")
+    parser.add_argument("--verify-only", action="store_true", help="Chỉ kiểm tra pack hiện có, không dựng lại")
+    parser.add_argument("--dir", type=Path, default=Path(__file__).parent.parent / "lib" / "contexto",
+                        help="Thư mục game (mặc định: lib/contexto)")
+    args = parser.parse_args()
+
+    contexto_dir = args.dir
+    pack_path = contexto_dir / PACK_FILE
+
+    print("=" * 70)
+    print("📦 GAME PACK")
+    print("=" * 70)
+
+    if not args.verify_only:
+        order = game_order(contexto_dir)
+        if not order:
+            print(f"❌ Không có game nào trong {contexto_dir}/rankLoader.json")
+            return
+        start = time.perf_counter()
+        size = build_pack(pack_path, contexto_dir, order)
+        print(f"\n✅ {len(order)} game -> {pack_path} ({size / 1024 / 1024:.2f} MB) "
+              f"trong {time.perf_counter() - start:.1f}s")
+
+    if args.verify or args.verify_only:
+        print("\n🔍 So với các file JSON...")
+        failed = verify_pack(pack_path, contexto_dir)
+        if failed:
+            print(f"\n❌ {failed} game lệch")
+            raise SystemExit(1)
+        print("   ✅ Mọi game khớp")
+
+    print("\n⏱️  Tra cứu:")
+    benchmark_lookups(pack_path, contexto_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Kiểm tra chất lượng các định dạng lưu embeddings (float16 / int8) so với float32.
+
+Với mỗi model có cache float32 trong model_cache/, script đọc file embeddings ở định dạng
+cần kiểm tra (chưa có file thì quantize bản float32 trong bộ nhớ), rồi so sánh trên các target mẫu:
+- overlap top-1000 ranking của từng model
+- overlap top-1000 của kết quả RRF cuối cùng (sau lọc từ rác)
+
+Chỉ đọc cache embeddings, không ghi file embeddings / manifest nào. Cache float32 phải có
+manifest khớp vocab hiện tại (chạy pipeline 1 lần để cập nhật nếu vocab đã đổi); cache
+float16/int8 được căn theo manifest của nó và chỉ so trên các dòng có từ khớp vocab.
+
+Query của mỗi target là embedding float32 của chính target trong vocab,
+nên không cần load SentenceTransformer.
+
+Cách sử dụng:
+    cd scripts
+    python check_embedding_storage.py                          # float16 + int8, target = các game đã có
+    python check_embedding_storage.py --storage int8 --targets "bác sĩ" "xe máy"
+"""
+
+import argparse
+
+import numpy as np
+
+from ranking_pipeline import (
+    EMBEDDING_MODELS,
+    QuantizedEmbeddings,
+    compute_rank_matrix,
+    fuse_target_ranking,
+    get_existing_keywords,
+    load_vocab,
+    open_embeddings,
+    quantize_embeddings,
+    read_embedding_manifest,
+    read_manifest_words,
+    vocab_fingerprint,
+)
+
+
+def top_overlap(ranks_a, ranks_b, k):
+    """Tỉ lệ từ chung trong top-k của 2 rank array"""
+    return len(np.intersect1d(np.flatnonzero(ranks_a <= k), np.flatnonzero(ranks_b <= k))) / k
+
+
+def row_nbytes(embeddings):
+    """Dung lượng trung bình 1 dòng embeddings (bytes, kể cả scale của int8)"""
+    if isinstance(embeddings, QuantizedEmbeddings):
+        return (embeddings.data.nbytes + embeddings.scales.nbytes) / embeddings.shape[0]
+    return embeddings.nbytes / embeddings.shape[0]
+
+
+def take_rows(embeddings, rows):
+    """Các dòng rows của embeddings (giữ nguyên định dạng)"""
+    if isinstance(embeddings, QuantizedEmbeddings):
+        return QuantizedEmbeddings(embeddings.data[rows], embeddings.scales[rows])
+    return embeddings[rows]
+
+
+def open_float32(name, vocab):
+    """Cache float32 (mmap) của 1 model, thoát nếu manifest không khớp vocab hiện tại"""
+    embeddings = open_embeddings(name, "float32")
+    if embeddings is None:
+        return None
+    manifest = read_embedding_manifest(name, "float32")
+    if (manifest is None or manifest.get("count") != embeddings.shape[0]
+            or manifest.get("vocab_fingerprint") != vocab_fingerprint(vocab)):
+        print(f"❌ Cache float32 {name} không khớp vocab hiện tại (thiếu manifest hoặc vocab đã đổi). "
+              f"Chạy pipeline 1 lần để cập nhật cache rồi kiểm tra lại.")
+        raise SystemExit(1)
+    return embeddings
+
+
+def open_storage(name, storage, float_embeddings, vocab, word_ids):
+    """
+    Embeddings ở định dạng storage (chỉ đọc) + dòng ứng với từng vocab id (-1 nếu không có).
+    Chưa có file, hoặc file không có manifest dùng được -> quantize bản float32 trong bộ nhớ.
+    """
+    embeddings = open_embeddings(name, storage)
+    manifest = read_embedding_manifest(name, storage) if embeddings is not None else None
+    if (manifest is None or manifest.get("model") != EMBEDDING_MODELS[name]["path"]
+            or manifest.get("count") != embeddings.shape[0]):
+        if embeddings is not None:
+            print(f"   ⚠️  Cache {storage} {name} không có manifest dùng được, quantize lại trong bộ nhớ")
+        return quantize_embeddings(float_embeddings, storage), np.arange(len(vocab))
+
+    rows = np.full(len(vocab), -1, dtype=np.int64)
+    for row, word in enumerate(read_manifest_words(name, storage)):
+        idx = word_ids.get(word)
+        if idx is not None and rows[idx] < 0:
+            rows[idx] = row
+    return embeddings, rows
+
+
+def rank_rows(embeddings, queries, rows, ids, n):
+    """
+    Rank matrix (Q, n) theo vocab id, chỉ xếp hạng các vocab id ids (dòng rows của embeddings).
+    Vocab id không nằm trong ids cùng nhận rank n (cuối bảng, ngoài top-k).
+    """
+    if len(ids) == n and np.array_equal(rows, ids):
+        return compute_rank_matrix(embeddings, queries)
+    ranks = np.full((len(queries), n), n, dtype=np.int32)
+    ranks[:, ids] = compute_rank_matrix(take_rows(embeddings, rows), queries)
+    return ranks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage", nargs="+", default=["float16", "int8"], choices=["float16", "int8"])
+    parser.add_argument("--targets", nargs="+", default=None, help="Mặc định: keyword các game trong lib/contexto")
+    parser.add_argument("--max-targets", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=1000)
+    parser.add_argument("--min-overlap", type=float, default=0.95, help="Ngưỡng overlap RRF tối thiểu")
+    args = parser.parse_args()
+
+    vocab = load_vocab()
+    word_ids = {word: idx for idx, word in enumerate(vocab)}
+
+    targets = args.targets or get_existing_keywords()
+    targets = [t.replace(" ", "_") for t in targets if t.replace(" ", "_") in word_ids][:args.max_targets]
+    if not targets:
+        print("❌ Không có target nào nằm trong vocab")
+        raise SystemExit(1)
+
+    float_embeddings = {}
+    for name in EMBEDDING_MODELS:
+        embeddings = open_float32(name, vocab)
+        if embeddings is not None:
+            float_embeddings[name] = embeddings
+    models = list(float_embeddings)
+    if not models:
+        print("❌ Không có cache float32 nào trong model_cache/")
+        raise SystemExit(1)
+
+    print(f"📊 {len(vocab):,} từ, {len(models)} models, {len(targets)} targets, top-{args.top_k}\n")
+
+    # Query = embedding float32 của chính target
+    queries = {name: np.stack([float_embeddings[name][word_ids[t]] for t in targets]) for name in models}
+    weights = [EMBEDDING_MODELS[name]["weight"] for name in models]
+    failed = False
+
+    for storage in args.storage:
+        print(f"{'=' * 70}\n🔬 {storage}")
+        opened = {name: open_storage(name, storage, float_embeddings[name], vocab, word_ids) for name in models}
+
+        # Chỉ so các vocab id mà cache storage của mọi model đều có dòng khớp từ
+        ids = np.flatnonzero(np.all([rows >= 0 for _, rows in opened.values()], axis=0))
+        if len(ids) < len(vocab):
+            print(f"   ⚠️  Chỉ so {len(ids):,}/{len(vocab):,} từ có trong cache {storage}")
+
+        baseline = {}
+        rank_matrices = {}
+        for name in models:
+            embeddings, rows = opened[name]
+            baseline[name] = rank_rows(float_embeddings[name], queries[name], ids, ids, len(vocab))
+            rank_matrices[name] = rank_rows(embeddings, queries[name], rows[ids], ids, len(vocab))
+
+            overlaps = [top_overlap(baseline[name][q], rank_matrices[name][q], args.top_k) for q in range(len(targets))]
+            size_ratio = row_nbytes(embeddings) / row_nbytes(float_embeddings[name])
+            print(f"   {name:12s} top-{args.top_k} overlap: min {min(overlaps):.3f}, "
+                  f"trung bình {np.mean(overlaps):.3f} | dung lượng {size_ratio:.0%} so với float32")
+
+        rrf_overlaps = []
+        for q, target in enumerate(targets):
+            base_words = fuse_target_ranking(target, vocab, [baseline[name][q] for name in models], weights)
+            words = fuse_target_ranking(target, vocab, [rank_matrices[name][q] for name in models], weights)
+            rrf_overlaps.append(len(set(base_words[:args.top_k]) & set(words[:args.top_k])) / args.top_k)
+
+        worst = min(rrf_overlaps)
+        status = "✅" if worst >= args.min_overlap else "❌"
+        failed |= worst < args.min_overlap
+        print(f"   {status} RRF top-{args.top_k} overlap: min {worst:.3f}, trung bình {np.mean(rrf_overlaps):.3f}\n")
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
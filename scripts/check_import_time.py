@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Đo thời gian import / khởi động của ranking_pipeline và các subcommand
+
+Mỗi case chạy trong 1 process Python mới với -X importtime, lấy tổng thời gian import
+(cumulative của các module top-level) và wall time của cả process, báo module nặng nào bị load.
+So với chi phí import sẵn các thư viện nặng (sentence_transformers/torch, google.genai, pydantic) - cái mà
+mọi tool import ranking_pipeline phải trả trước khi tách lazy import.
+
+Exit code 1 nếu 1 case nhẹ (import module / subcommand không cần model hay Gemini) load module nặng.
+
+Cách sử dụng:
+    cd scripts
+    python check_import_time.py
+    python check_import_time.py --repeat 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).parent
+
+HEAVY_MODULES = ("sentence_transformers", "torch", "google.genai", "pydantic")
+
+# (tên, tham số cho python) - đều không được load module nặng nào
+LIGHT_CASES = [
+    ("import pipeline_core", ["-c", "import pipeline_core"]),
+    ("import llm_client", ["-c", "import llm_client"]),
+    ("import ranking_pipeline", ["-c", "import ranking_pipeline"]),
+    ("ranking_pipeline.py --help", ["ranking_pipeline.py", "--help"]),
+    ("ranking_pipeline.py keywords", ["ranking_pipeline.py", "keywords"]),
+    ("ranking_pipeline.py check-word", ["ranking_pipeline.py", "check-word", "bác sĩ", "người_bác_sĩ"]),
+    ("ranking_pipeline.py dedup", ["ranking_pipeline.py", "dedup", "bác sĩ"]),
+]
+
+
+def run_importtime(python_args):
+    """
+    Chạy python -X importtime <python_args> trong scripts/.
+
+    Returns:
+        tuple: (thời gian import ms, wall time ms, set module đã import) - None nếu process lỗi
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *python_args],
+        cwd=SCRIPTS_DIR, capture_output=True, text=True, env=os.environ.copy(),
+    )
+    wall = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        return None
+
+    total_us = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # dòng tiêu đề
+        modules.add(name.strip())
+        if not name[1:].startswith(" "):  # module top-level (không thụt lề)
+            total_us += int(cumulative)
+    return total_us / 1000, wall, modules
+
+
+def measure(python_args, repeat):
+    """Lần nhanh nhất trong repeat lần chạy (ít nhiễu nhất)"""
+    best = None
+    for _ in range(repeat):
+        result = run_importtime(python_args)
+        if result is None:
+            return None
+        if best is None or result[1] < best[1]:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian import của ranking_pipeline")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần chạy mỗi case, lấy lần nhanh nhất")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("⏱️  THỜI GIAN IMPORT / KHỞI ĐỘNG")
+    print("=" * 70)
+
+    # ===== CHI PHÍ CÁC THƯ VIỆN NẶNG =====
+    print("\n📦 Thư viện nặng (import riêng lẻ):")
+    installed = []
+    for module in HEAVY_MODULES:
+        result = measure(["-c", f"import {module}"], args.repeat)
+        if result is None:
+            print(f"   {module:<40} (chưa cài)")
+            continue
+        installed.append(module)
+        print(f"   {module:<40} import {result[0]:>8.1f} ms")
+
+    # Phần thêm so với numpy (entrypoint nhẹ vẫn import numpy), dependency dùng chung chỉ tính 1 lần
+    eager_ms = None
+    if installed:
+        numpy_only = measure(["-c", "import numpy"], args.repeat)
+        eager = measure(["-c", "import numpy, " + ", ".join(installed)], args.repeat)
+        if numpy_only is not None and eager is not None:
+            eager_ms = eager[0] - numpy_only[0]
+            print(f"   {'tất cả (ngoài numpy)':<40} import {eager_ms:>8.1f} ms")
+
+    # ===== CÁC ENTRYPOINT NHẸ =====
+    print("\n🚀 Module / subcommand không cần model hay Gemini:")
+    failed = []
+    for name, python_args in LIGHT_CASES:
+        result = measure(python_args, args.repeat)
+        if result is None:
+            print(f"   ❌ {name:<37} process lỗi")
+            failed.append(name)
+            continue
+        import_ms, wall_ms, modules = result
+        loaded = [module for module in HEAVY_MODULES if module in modules]
+        status = "❌" if loaded else "✅"
+        print(f"   {status} {name:<37} import {import_ms:>8.1f} ms   wall {wall_ms:>8.1f} ms"
+              + (f"   load: {', '.join(loaded)}" if loaded else ""))
+        if loaded:
+            failed.append(name)
+
+    if eager_ms is not None:
+        print(f"\n   Trước khi tách lazy import, mọi case trên phải import thêm ~{eager_ms:.0f} ms thư viện nặng "
+              f"(chưa tính sentence_transformers/torch nếu chưa cài ở máy này).")
+
+    if failed:
+        print(f"\n❌ {len(failed)} case load module nặng hoặc lỗi: {', '.join(failed)}")
+        sys.exit(1)
+    print("\n✅ Không case nhẹ nào load module nặng")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Kiểm tra llm_client với server Gemini giả lập (fake_gemini_server.py), không cần API key.
+
+Gửi nhiều request song song qua thread pool của llm_client, server trả lỗi 429 ngẫu nhiên
+(kèm Retry-After). Kiểm tra:
+- mọi call đều thành công sau khi retry
+- tổng thời gian tôn trọng rate limit (token bucket)
+- metrics đếm đủ số call / lỗi
+- cache: gọi lại cùng prompt không gửi request, offline mode chỉ đọc cache
+
+Cách sử dụng:
+    cd scripts
+    python check_llm_client.py
+    python check_llm_client.py --calls 40 --rpm 120 --error-rate 0.3
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from pydantic import BaseModel
+
+import llm_client
+from fake_gemini_server import start_server
+
+
+class FakeResponse(BaseModel):
+    words: List[str]
+
+
+def check_cache(stats):
+    """Cache trong thư mục tạm: lần 2 không gửi request, offline đọc được cache và báo lỗi khi thiếu"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        llm_client.LLM_CACHE_DIR = Path(cache_dir)
+        llm_client.LLM_CACHE_ENABLED = True
+        llm_client.LLM_RATE_LIMIT_RPM = 0
+
+        prompts = [f"cache prompt {i}" for i in range(5)]
+        first = [llm_client.generate_json("gemini-2.5-flash", p, FakeResponse, "cache") for p in prompts]
+        requests_before = stats["requests"]
+        second = [llm_client.generate_json("gemini-2.5-flash", p, FakeResponse, "cache") for p in prompts]
+        no_request = stats["requests"] == requests_before
+
+        llm_client.LLM_OFFLINE = True
+        offline = [llm_client.generate_json("gemini-2.5-flash", p, FakeResponse, "cache") for p in prompts]
+        try:
+            llm_client.generate_json("gemini-2.5-flash", "chưa cache", FakeResponse, "cache")
+            miss_raises = False
+        except llm_client.LLMCacheMiss:
+            miss_raises = True
+        llm_client.LLM_OFFLINE = False
+
+        hits = llm_client.llm_metrics_summary()["cache"]["cache_hits"]
+        evicted = llm_client.evict_llm_cache(max_mb=0)
+
+    return [
+        ("Cache: gọi lại không gửi request", no_request and first == second),
+        ("Cache: offline đọc lại được", offline == first),
+        ("Cache: offline thiếu cache -> LLMCacheMiss", miss_raises),
+        ("Cache: metrics đếm cache hit", hits == 2 * len(prompts)),
+        ("Cache: evict theo dung lượng", evicted == len(prompts)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--rpm", type=float, default=240, help="Rate limit (request/phút)")
+    parser.add_argument("--burst", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    server, base_url, stats = start_server(latency=args.latency, error_rate=args.error_rate,
+                                           retry_after=args.retry_after)
+    llm_client.GEMINI_BASE_URL = base_url
+    llm_client.LLM_RATE_LIMIT_RPM = args.rpm
+    llm_client.LLM_RATE_LIMIT_BURST = args.burst
+    llm_client.LLM_MAX_ATTEMPTS = 8
+    # Phần rate limit / retry phải đi qua mạng thật
+    llm_client.LLM_CACHE_ENABLED = False
+
+    print(f"🧪 {args.calls} call, rate limit {args.rpm:.0f}/phút (burst {args.burst}), "
+          f"lỗi 429 {args.error_rate:.0%} qua {base_url}\n")
+
+    start = time.perf_counter()
+    futures = [
+        llm_client.submit(llm_client.generate_json, "gemini-2.5-flash", f"prompt {i}", FakeResponse, "check")
+        for i in range(args.calls)
+    ]
+    results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    metrics = llm_client.llm_metrics()
+    summary = llm_client.llm_metrics_summary(metrics)["check"]
+    min_elapsed = max(0, stats["requests"] - args.burst) / (args.rpm / 60)
+
+    checks = [
+        ("Mọi call thành công", len(results) == args.calls and all(r.words for r in results)),
+        ("Metrics đếm đủ request", summary["calls"] == stats["requests"]),
+        ("Metrics đếm đủ lỗi 429", summary["errors"] == stats["errors"]),
+        (f"Tôn trọng rate limit (>= {min_elapsed:.1f}s)", elapsed >= min_elapsed * 0.95),
+    ]
+    checks += check_cache(stats)
+    server.shutdown()
+    llm_client.print_llm_metrics()
+    print(f"\n   ⏱️  {elapsed:.1f}s, {stats['requests']} request ({stats['errors']} lỗi 429)")
+    for name, ok in checks:
+        print(f"   {'✅' if ok else '❌'} {name}")
+
+    if not all(ok for _, ok in checks):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Kiểm tra bản Python (vietnamese_fold.py) và bản TypeScript (lib/vietnamese.ts) của fold_vietnamese
+cho kết quả giống hệt nhau trên toàn bộ vocab, và sidecar lib/contexto/vocab.fold.json còn khớp.
+
+Vocab kiểm tra: vocab.txt chung + mọi từ trong rank_map của các game JSON + clean_dict.pkl (nếu có),
+kèm các dạng người chơi hay gõ của mỗi từ (chữ hoa, "_", dấu kiểu mới óa/úy/óe, i thay y cuối âm tiết)
+- các dạng này phải fold về đúng khoá của từ gốc.
+
+Bản TS chạy trực tiếp bằng Node >= 22.6 (type stripping), không cần build.
+
+Cách sử dụng:
+    cd scripts
+    python check_vietnamese_fold.py
+    python check_vietnamese_fold.py --write        # ghi lại vocab.fold.json nếu chưa khớp
+    python check_vietnamese_fold.py --node ~/node-v22/bin/node
+"""
+
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from game_format import SHARED_VOCAB_FILE, load_shared_vocab, update_fold_index
+from pipeline_core import CONTEXTO_DIR
+from rank_loader import game_files
+from vietnamese_fold import FOLD_TABLE, build_fold_index, fold_vietnamese, read_fold_index
+
+REPO_ROOT = Path(__file__).parent.parent
+TS_MODULE = REPO_ROOT / "lib" / "vietnamese.ts"
+MIN_NODE_VERSION = (22, 6)
+
+# Chạy trong Node: đọc JSON list từ stdin, trả JSON list khoá fold
+TS_HARNESS = """
+import { readFileSync } from "node:fs";
+import { foldVietnamese } from %s;
+const words = JSON.parse(readFileSync(0, "utf-8"));
+process.stdout.write(JSON.stringify(words.map(foldVietnamese)));
+"""
+
+
+def collect_vocab(contexto_dir):
+    """Từ cần kiểm tra (bỏ trùng, giữ thứ tự): vocab chung, rank_map các game JSON, clean_dict.pkl"""
+    words = dict.fromkeys(load_shared_vocab(contexto_dir / SHARED_VOCAB_FILE))
+    # Game .bin chỉ chứa vocab id (từ đã nằm trong vocab.txt)
+    for game_file in (f for f in game_files(contexto_dir) if f.suffix == ".json"):
+        with open(game_file, "r", encoding="utf-8") as f:
+            words.update(dict.fromkeys(json.load(f).get("rank_map", {})))
+
+    clean_dict = Path(__file__).parent / "clean_dict.pkl"
+    if clean_dict.exists():
+        with open(clean_dict, "rb") as f:
+            words.update(dict.fromkeys(pickle.load(f)))
+    return list(words)
+
+
+def typed_variants(word):
+    """Các dạng người chơi có thể gõ cho word (khác word), đều phải fold về cùng khoá"""
+    variants = {word.upper(), word.replace(" ", "_"), f"  {word} "}
+    new_style = word
+    for old, new in FOLD_TABLE["tone_placement"]:
+        new_style = new_style.replace(new, old)
+    variants.add(new_style)
+    variants.add(" ".join(
+        syllable[:-1] + {y: i for i, y in FOLD_TABLE["syllable_final"]}.get(syllable[-1:], syllable[-1:])
+        for syllable in word.split(" ")
+    ))
+    variants.discard(word)
+    return sorted(variants)
+
+
+def node_version(node):
+    try:
+        output = subprocess.run([node, "--version"], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return tuple(int(part) for part in output.strip().lstrip("v").split(".")[:2])
+
+
+def fold_with_typescript(node, words):
+    """Khoá fold của words tính bằng lib/vietnamese.ts"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        harness = Path(tmp_dir) / "fold_harness.mts"
+        harness.write_text(TS_HARNESS % json.dumps(TS_MODULE.resolve().as_uri()), encoding="utf-8")
+        result = subprocess.run(
+            [node, "--experimental-strip-types", "--no-warnings", str(harness)],
+            input=json.dumps(words), capture_output=True, text=True, encoding="utf-8", cwd=REPO_ROOT,
+        )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra fold tiếng Việt Python == TypeScript")
+    parser.add_argument("--node", default=os.environ.get("NODE", "node"), help="Node >= 22.6 (mặc định: $NODE hoặc node)")
+    parser.add_argument("--write", action="store_true", help="Ghi lại lib/contexto/vocab.fold.json nếu chưa khớp")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("🔤 KIỂM TRA FOLD TIẾNG VIỆT (Python vs TypeScript)")
+    print("=" * 70)
+
+    vocab = collect_vocab(CONTEXTO_DIR)
+    keys = [fold_vietnamese(word) for word in vocab]
+    print(f"\n📚 {len(vocab):,} từ, {sum(key != word for word, key in zip(vocab, keys)):,} từ có khoá khác chính nó")
+
+    # ===== NHIỀU TỪ CÙNG KHOÁ =====
+    by_key = {}
+    for word, key in zip(vocab, keys):
+        by_key.setdefault(key, []).append(word)
+    shared = [words for words in by_key.values() if len(words) > 1]
+    print(f"   {len(shared):,} khoá có nhiều từ (server lấy rank nhỏ nhất), vd: {shared[:5]}")
+
+    # ===== DẠNG NGƯỜI CHƠI GÕ =====
+    variants = [(word, key, variant) for word, key in zip(vocab, keys) for variant in typed_variants(word)]
+    variant_errors = [(word, variant) for word, key, variant in variants if fold_vietnamese(variant) != key]
+    print(f"\n⌨️  {len(variants):,} dạng gõ khác: {len(variant_errors):,} không fold về khoá của từ gốc")
+    for word, variant in variant_errors[:10]:
+        print(f"   ❌ {variant!r} -> {fold_vietnamese(variant)!r}, từ gốc {word!r} -> {fold_vietnamese(word)!r}")
+
+    # ===== PYTHON vs TYPESCRIPT =====
+    failed = bool(variant_errors)
+    version = node_version(args.node)
+    if version is None or version < MIN_NODE_VERSION:
+        print(f"\n❌ Cần Node >= {'.'.join(map(str, MIN_NODE_VERSION))} để chạy {TS_MODULE.name} "
+              f"(tìm thấy: {'.'.join(map(str, version)) if version else 'không có'}), dùng --node")
+        failed = True
+    else:
+        inputs = vocab + [variant for _, _, variant in variants]
+        ts_keys = fold_with_typescript(args.node, inputs)
+        py_keys = keys + [fold_vietnamese(variant) for _, _, variant in variants]
+        mismatches = [(text, py, ts) for text, py, ts in zip(inputs, py_keys, ts_keys) if py != ts]
+        print(f"\n🟦 TypeScript (Node {'.'.join(map(str, version))}): {len(inputs):,} chuỗi, {len(mismatches):,} khác Python")
+        for text, py, ts in mismatches[:20]:
+            print(f"   ❌ {text!r}: Python {py!r} / TS {ts!r}")
+        failed = failed or bool(mismatches) or len(ts_keys) != len(inputs)
+
+    # ===== SIDECAR =====
+    vocab_path = CONTEXTO_DIR / SHARED_VOCAB_FILE
+    shared_vocab = load_shared_vocab(vocab_path)
+    if shared_vocab:
+        index = read_fold_index(vocab_path)
+        fresh = index is not None and index == build_fold_index(shared_vocab)
+        if not fresh and args.write:
+            update_fold_index(vocab_path, shared_vocab)
+            print(f"\n📝 Đã ghi lại {vocab_path.parent / 'vocab.fold.json'}")
+        elif not fresh:
+            print("\n⚠️  vocab.fold.json thiếu hoặc chưa khớp vocab.txt / bảng fold (server tự fold lại, chậm hơn)"
+                  " - chạy lại với --write")
+            failed = True
+        else:
+            print(f"\n✅ vocab.fold.json khớp vocab.txt ({len(shared_vocab):,} từ)")
+
+    if failed:
+        sys.exit(1)
+    print("\n✅ Python và TypeScript fold giống hệt nhau")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoint từng stage của ranking_pipeline trên đĩa để chạy lại từ stage bị lỗi (--resume)
+
+    scripts/checkpoints/<run>/          # run = "daily" hoặc slug của target (batch mode)
+        meta.json                       # {"vocab": fingerprint vocab lúc tạo ranks}
+        target.json                     # "bác sĩ"
+        ranks.<model>.npy               # rank array int32 theo vocab id, mỗi embedding model 1 file
+        fused.npy                       # vocab id (int32) theo thứ tự RRF
+        brainstorm.json                 # ["từ", ...]
+        scores.json                     # [["từ", điểm], ...]
+        final.json                      # ["từ", ...] theo rank cuối (rank = vị trí + 1)
+        hints.json                      # [rank, ...]
+        published.json                  # đã copy vào lib/contexto + cập nhật rankLoader
+
+Mỗi stage là 1 file ghi atomic: có file = stage đã xong. Giá trị numpy lưu .npy,
+còn lại lưu JSON compact.
+"""
+
+import json
+import os
+import shutil
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+
+import run_report
+from game_format import atomic_write_bytes
+
+CHECKPOINT_DIR = Path(os.environ.get('CHECKPOINT_DIR', Path(__file__).parent / "checkpoints"))
+
+# Stage phụ thuộc vocab: vocab đổi thì phải tính lại (kèm mọi stage phía sau)
+VOCAB_STAGES = ("ranks.", "fused", "scores", "final", "hints", "published")
+
+
+def open_run(run, resume=False):
+    """
+    Thư mục checkpoint của 1 run. resume=False -> xoá checkpoint cũ, chạy lại từ đầu.
+
+    Returns:
+        Path: thư mục run
+    """
+    run_path = CHECKPOINT_DIR / run
+    if not resume and run_path.exists():
+        shutil.rmtree(run_path)
+    run_path.mkdir(parents=True, exist_ok=True)
+    return run_path
+
+
+def _stage_files(run_path, stage):
+    return run_path / f"{stage}.npy", run_path / f"{stage}.json"
+
+
+def has(run_path, stage):
+    return any(path.exists() for path in _stage_files(run_path, stage))
+
+
+def load(run_path, stage):
+    """Giá trị đã lưu của stage (np.ndarray hoặc giá trị JSON)"""
+    npy_path, json_path = _stage_files(run_path, stage)
+    if npy_path.exists():
+        return np.load(npy_path)
+    with open(json_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save(run_path, stage, value):
+    npy_path, json_path = _stage_files(run_path, stage)
+    if isinstance(value, np.ndarray):
+        buffer = BytesIO()
+        np.save(buffer, value)
+        path, data = npy_path, buffer.getvalue()
+    else:
+        path, data = json_path, json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    with run_report.span("checkpoint_write", stage=stage, bytes=len(data)):
+        atomic_write_bytes(path, data)
+    return value
+
+
+def run_stage(run_path, stage, compute):
+    """
+    Kết quả của stage: đọc từ checkpoint nếu đã xong, nếu không thì chạy compute() và lưu lại.
+    run_path=None -> không checkpoint, luôn chạy compute().
+    """
+    if run_path is None:
+        return compute()
+    if has(run_path, stage):
+        print(f"   ⏭️  [{run_path.name}] Dùng checkpoint: {stage}")
+        return load(run_path, stage)
+    return save(run_path, stage, compute())
+
+
+def check_vocab(run_path, fingerprint):
+    """Vocab khác lúc tạo checkpoint -> xoá các stage phụ thuộc vocab"""
+    meta_path = run_path / "meta.json"
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        meta = {}
+
+    if meta.get("vocab") not in (None, fingerprint):
+        stale = [path for path in run_path.iterdir() if path.name.startswith(VOCAB_STAGES)]
+        print(f"   ⚠️  [{run_path.name}] Vocab đã đổi, bỏ {len(stale)} checkpoint phụ thuộc vocab")
+        for path in stale:
+            path.unlink()
+
+    meta["vocab"] = fingerprint
+    save(run_path, "meta", meta)
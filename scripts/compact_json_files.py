@@ -1,83 +1,332 @@
 #!/usr/bin/env python3
 """
-Script to convert all existing JSON files in lib/contexto/ to compact format.
-This reduces file sizes by removing unnecessary whitespace and indentation.
+Script to convert the JSON games in lib/contexto/ to compact and pre-encoded formats.
+
+Each game is processed in a worker process and every output is written atomically
+(temp file + rename), so the script is safe to interrupt and re-run. A manifest
+(lib/contexto/.convert_manifest) records the content hash of each game and the
+outputs produced from it; unchanged games are skipped on the next run.
+
+Codecs (--codecs, any combination):
+    json     rewrite <slug>.json in compact form (no whitespace)
+    gzip     pre-compressed sibling <slug>.json.gz
+    brotli   pre-compressed sibling <slug>.json.br (needs the `brotli` package)
+    bin      binary rank array <slug>.bin + shared vocab.txt (see game_format.py)
+    words    rank-ordered word list <slug>.words.txt (hint / top-N lookups by index)
+    tiers    split layout <slug>.head.json (top ranks + hints) + <slug>.tail.json (see game_format.py)
+
+Usage:
+    python scripts/compact_json_files.py                          # compact JSON only
+    python scripts/compact_json_files.py --codecs json gzip bin words   # several outputs
+    python scripts/compact_json_files.py --force --workers 8      # ignore the manifest
 """
 
+import argparse
+import gzip
+import hashlib
 import json
-from pathlib import Path
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from convert_games_to_binary import ordered_game_files
+from game_format import (
+    CODECS,
+    HEAD_RANKS,
+    SHARED_VOCAB_FILE,
+    atomic_write_bytes,
+    encode_game,
+    load_shared_vocab,
+    rank_array,
+    rank_order_path,
+    tier_paths,
+    update_shared_vocab,
+    write_game_tiers,
+    write_rank_order,
+)
+
+MANIFEST_FILE = ".convert_manifest"
+MANIFEST_SAVE_EVERY = 16
+
+
+# ===== CODECS =====
+
+def encode_compact_json(json_path, game, compact, options):
+    if json_path.read_bytes() != compact:
+        atomic_write_bytes(json_path, compact)
+    return json_path
+
+
+def encode_gzip(json_path, game, compact, options):
+    path = Path(f"{json_path}.gz")
+    # mtime=0 -> same input gives byte-identical output
+    atomic_write_bytes(path, gzip.compress(compact, compresslevel=9, mtime=0))
+    return path
+
+
+def encode_brotli(json_path, game, compact, options):
+    import brotli
+
+    path = Path(f"{json_path}.br")
+    atomic_write_bytes(path, brotli.compress(compact, quality=options["brotli_quality"]))
+    return path
+
+
+def encode_binary(json_path, game, compact, options):
+    word_ids = _worker_word_ids(options["vocab_path"], options["vocab_count"])
+    path = json_path.with_suffix(".bin")
+    ranks = rank_array(game["rank_map"], word_ids, options["vocab_count"])
+    atomic_write_bytes(path, encode_game(game["keyword"], ranks, game.get("hints"), CODECS[options["bin_codec"]]))
+    return path
+
+
+def encode_word_list(json_path, game, compact, options):
+    path = Path(rank_order_path(json_path))
+    write_rank_order(path, game["rank_map"])
+    return path
+
+
+def encode_tiers(json_path, game, compact, options):
+    write_game_tiers(json_path, game["keyword"], game["rank_map"], game.get("hints"), options["head_ranks"])
+    return Path(tier_paths(json_path)[0])
+
+
+OUTPUT_CODECS = {
+    "json": encode_compact_json,
+    "gzip": encode_gzip,
+    "brotli": encode_brotli,
+    "bin": encode_binary,
+    "words": encode_word_list,
+    "tiers": encode_tiers,
+}
+
+
+def output_path(json_path, codec):
+    """Path of the file a codec produces for one game"""
+    if codec == "json":
+        return json_path
+    if codec == "bin":
+        return json_path.with_suffix(".bin")
+    if codec == "words":
+        return Path(rank_order_path(json_path))
+    if codec == "tiers":
+        return Path(tier_paths(json_path)[0])
+    return Path(f"{json_path}.{'gz' if codec == 'gzip' else 'br'}")
+
+
+# ===== MANIFEST =====
+
+def load_manifest(contexto_dir):
+    try:
+        with open(contexto_dir / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(contexto_dir, manifest):
+    data = json.dumps(manifest, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    atomic_write_bytes(contexto_dir / MANIFEST_FILE, data.encode("utf-8"))
+
 
+def is_up_to_date(json_path, entry, codecs, vocab_count):
+    """True if the game and all requested outputs match what the manifest recorded"""
+    if not entry or not all(output_path(json_path, codec).exists() for codec in codecs):
+        return False
+    if not set(codecs) <= set(entry["codecs"]):
+        return False
+    if "bin" in codecs and entry.get("vocab_count", 0) > vocab_count:
+        return False  # vocab.txt was replaced by an older/shorter one
 
-def compact_json_file(file_path):
+    stat = json_path.stat()
+    if stat.st_size != entry["size"]:
+        return False
+    if stat.st_mtime_ns == entry["mtime_ns"]:
+        return True
+    return hashlib.sha1(json_path.read_bytes()).hexdigest() == entry["sha1"]
+
+
+# ===== WORKER =====
+
+_WORKER_VOCAB = {"path": None, "word_ids": {}}
+
+
+def _worker_word_ids(vocab_path, min_count):
+    """Shared vocab of this worker process, reloaded only when it has grown"""
+    if _WORKER_VOCAB["path"] != vocab_path or len(_WORKER_VOCAB["word_ids"]) < min_count:
+        vocab = load_shared_vocab(vocab_path)
+        _WORKER_VOCAB["path"] = vocab_path
+        _WORKER_VOCAB["word_ids"] = {word: idx for idx, word in enumerate(vocab)}
+    return _WORKER_VOCAB["word_ids"]
+
+
+def convert_game(json_path, codecs, options):
     """
-    Read a JSON file and rewrite it in compact format.
-    Returns: (old_size, new_size) in bytes
+    Produce all requested outputs for one game.
+
+    The binary codec needs every word of the game in the shared vocab. vocab.txt is
+    append-only and must be written by a single process, so a game with new words is
+    returned with `missing_words` and without its .bin; the caller extends the vocab
+    and converts it again.
     """
-    # Read the original file
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # Get original size
-    old_size = os.path.getsize(file_path)
-    
-    # Write back in compact format
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
-    
-    # Get new size
-    new_size = os.path.getsize(file_path)
-    
-    return old_size, new_size
+    raw = json_path.read_bytes()
+    game = json.loads(raw)
+    compact = json.dumps(game, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    missing_words = []
+    if "bin" in codecs:
+        word_ids = _worker_word_ids(options["vocab_path"], options["vocab_count"])
+        missing_words = [word for word in game["rank_map"] if word not in word_ids]
+        if missing_words:
+            codecs = [codec for codec in codecs if codec != "bin"]
+
+    sizes = {}
+    for codec in codecs:
+        sizes[codec] = os.path.getsize(OUTPUT_CODECS[codec](json_path, game, compact, options))
+
+    final = compact if "json" in codecs else raw
+    stat = json_path.stat()
+    return {
+        "name": json_path.name,
+        "codecs": codecs,
+        "sizes": sizes,
+        "old_size": len(raw),
+        "missing_words": missing_words,
+        "entry": {
+            "sha1": hashlib.sha1(final).hexdigest(),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "codecs": codecs,
+            "vocab_count": options["vocab_count"] if "bin" in codecs else 0,
+        },
+    }
+
+
+# ===== MAIN =====
+
+def print_result(result):
+    old_size = result["old_size"]
+    outputs = ", ".join(f"{codec} {size:,}" for codec, size in result["sizes"].items())
+    print(f"✅ {result['name']:30s} {old_size:>10,} → {outputs}")
 
 
 def main():
-    # Path to contexto directory
-    contexto_dir = Path(__file__).parent.parent / "lib" / "contexto"
-    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--codecs", nargs="+", choices=list(OUTPUT_CODECS), default=["json"])
+    parser.add_argument("--bin-codec", choices=sorted(CODECS), default="uint32", help="Rank encoding of .bin files")
+    parser.add_argument("--brotli-quality", type=int, default=9,
+                        help="0-11; 11 is ~10%% smaller but ~20x slower")
+    parser.add_argument("--head-ranks", type=int, default=HEAD_RANKS, help="Ranks kept in <slug>.head.json")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--force", action="store_true", help="Convert every game, ignoring the manifest")
+    parser.add_argument("--dir", type=Path, default=Path(__file__).parent.parent / "lib" / "contexto",
+                        help="Games directory (default: lib/contexto)")
+    args = parser.parse_args()
+
+    contexto_dir = args.dir
+    codecs = list(dict.fromkeys(args.codecs))
+
     if not contexto_dir.exists():
         print(f"❌ Directory not found: {contexto_dir}")
         return
-    
-    # Find all JSON files
-    json_files = list(contexto_dir.glob("*.json"))
-    
-    if not json_files:
+
+    if "brotli" in codecs:
+        try:
+            import brotli  # noqa: F401
+        except ImportError:
+            print("❌ The brotli codec needs the `brotli` package (pip install brotli)")
+            return
+
+    game_files = ordered_game_files(contexto_dir)
+    if not game_files:
         print(f"❌ No JSON files found in {contexto_dir}")
         return
-    
-    print(f"📁 Found {len(json_files)} JSON files in {contexto_dir}")
-    print(f"🔄 Converting to compact format...\n")
-    
-    total_old_size = 0
-    total_new_size = 0
-    
-    for json_file in sorted(json_files):
-        try:
-            old_size, new_size = compact_json_file(json_file)
-            total_old_size += old_size
-            total_new_size += new_size
-            
-            reduction = ((old_size - new_size) / old_size * 100) if old_size > 0 else 0
-            
-            print(f"✅ {json_file.name:30s} {old_size:>10,} → {new_size:>10,} bytes ({reduction:>5.1f}% reduction)")
-        
-        except Exception as e:
-            print(f"❌ Error processing {json_file.name}: {e}")
-    
-    # Summary
-    total_reduction = ((total_old_size - total_new_size) / total_old_size * 100) if total_old_size > 0 else 0
-    saved_bytes = total_old_size - total_new_size
-    
+
+    vocab_path = str(contexto_dir / SHARED_VOCAB_FILE)
+    options = {
+        "vocab_path": vocab_path,
+        "vocab_count": len(load_shared_vocab(vocab_path)) if "bin" in codecs else 0,
+        "bin_codec": args.bin_codec,
+        "brotli_quality": args.brotli_quality,
+        "head_ranks": args.head_ranks,
+    }
+
+    manifest = {} if args.force else load_manifest(contexto_dir)
+    pending = [f for f in game_files if not is_up_to_date(f, manifest.get(f.name), codecs, options["vocab_count"])]
+
+    print(f"📁 Found {len(game_files)} JSON games in {contexto_dir}")
+    print(f"⏭️  {len(game_files) - len(pending)} unchanged, 🔄 converting {len(pending)} ({', '.join(codecs)}) "
+          f"with {args.workers} workers...\n")
+
+    start = time.perf_counter()
+    converted = []
+    failed = 0
+
+    def record(result):
+        manifest[result["name"]] = result["entry"]
+        converted.append(result)
+        print_result(result)
+        # Also keep progress if the process is killed without KeyboardInterrupt
+        if len(converted) % MANIFEST_SAVE_EVERY == 0:
+            save_manifest(contexto_dir, manifest)
+
+    executor = ProcessPoolExecutor(max_workers=args.workers)
+    try:
+        # Results are consumed in game order, so new words reach vocab.txt in rankLoader order
+        futures = [executor.submit(convert_game, f, codecs, options) for f in pending]
+        needs_vocab = []
+        for json_file, future in zip(pending, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ Error processing {json_file.name}: {e}")
+                continue
+            if result["missing_words"]:
+                needs_vocab.append((json_file, result))
+            else:
+                record(result)
+
+        if needs_vocab:
+            new_words = [word for _, result in needs_vocab for word in result["missing_words"]]
+            vocab, _ = update_shared_vocab(vocab_path, new_words)
+            print(f"📚 Added {len(vocab) - options['vocab_count']:,} words to {SHARED_VOCAB_FILE}")
+            options["vocab_count"] = len(vocab)
+
+            # Other outputs are already written, only the .bin is left
+            futures = [executor.submit(convert_game, f, ["bin"], options) for f, _ in needs_vocab]
+            for (json_file, first), future in zip(needs_vocab, futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"❌ Error processing {json_file.name}: {e}")
+                    continue
+                result["codecs"] = result["entry"]["codecs"] = first["codecs"] + ["bin"]
+                result["sizes"] = {**first["sizes"], **result["sizes"]}
+                result["old_size"] = first["old_size"]
+                record(result)
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        print("\n⚠️  Interrupted - finished games are kept, re-run to continue")
+    finally:
+        executor.shutdown()
+        save_manifest(contexto_dir, manifest)
+
+    elapsed = time.perf_counter() - start
+    total_old_size = sum(result["old_size"] for result in converted)
+
     print(f"\n{'='*80}")
     print(f"📊 Summary:")
-    print(f"   Total files processed: {len(json_files)}")
-    print(f"   Total size before:     {total_old_size:,} bytes ({total_old_size / 1024 / 1024:.2f} MB)")
-    print(f"   Total size after:      {total_new_size:,} bytes ({total_new_size / 1024 / 1024:.2f} MB)")
-    print(f"   Total space saved:     {saved_bytes:,} bytes ({saved_bytes / 1024 / 1024:.2f} MB)")
-    print(f"   Average reduction:     {total_reduction:.1f}%")
+    print(f"   Games converted:       {len(converted)}/{len(pending)} ({failed} failed) in {elapsed:.2f}s")
+    print(f"   Games skipped:         {len(game_files) - len(pending)} (unchanged)")
+    print(f"   Input size:            {total_old_size / 1024 / 1024:.2f} MB")
+    for codec in codecs:
+        total = sum(result["sizes"].get(codec, 0) for result in converted)
+        ratio = total / total_old_size if total_old_size else 0
+        print(f"   {codec + ' output:':22s} {total / 1024 / 1024:.2f} MB ({ratio:.1%})")
     print(f"{'='*80}")
-    print(f"\n🎉 All JSON files have been compacted successfully!")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Script to convert existing JSON games in lib/contexto/ to the compact binary format
+(shared vocab.txt + one <slug>.bin rank array per game, see game_format.py), and backfill
+the rank-ordered word list <slug>.words.txt the API uses for hint / top-N lookups.
+
+Games are converted in rankLoader.json order so vocab ids stay stable between runs;
+words are only ever appended to vocab.txt.
+
+Usage:
+    python scripts/convert_games_to_binary.py                 # uint32 rank arrays
+    python scripts/convert_games_to_binary.py --codec varint  # smaller, must be decoded
+    python scripts/convert_games_to_binary.py --verify        # decode and compare with the JSON
+    python scripts/convert_games_to_binary.py --words-only    # only (re)write <slug>.words.txt
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+from game_format import (
+    CODECS,
+    SHARED_VOCAB_FILE,
+    load_shared_vocab,
+    rank_order_path,
+    read_game_binary,
+    read_rank_order,
+    write_game_binary,
+    write_rank_order,
+)
+from rank_loader import is_game_file, load_rank_loader
+
+
+def ordered_game_files(contexto_dir):
+    """JSON game files, in rankLoader.json order first, then any remaining files by name"""
+    json_files = {f.stem: f for f in contexto_dir.glob("*.json") if is_game_file(f)}
+
+    ordered = []
+    for _, entry in sorted(load_rank_loader(contexto_dir).items(), key=lambda item: int(item[0])):
+        game_file = json_files.pop(entry["slug"], None)
+        if game_file:
+            ordered.append(game_file)
+
+    return ordered + [json_files[slug] for slug in sorted(json_files)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--codec", choices=sorted(CODECS), default="uint32")
+    parser.add_argument("--verify", action="store_true", help="Decode each .bin and compare with its JSON")
+    parser.add_argument("--words-only", action="store_true", help="Only backfill <slug>.words.txt, keep .bin as is")
+    parser.add_argument("--dir", type=Path, default=Path(__file__).parent.parent / "lib" / "contexto",
+                        help="Games directory (default: lib/contexto)")
+    args = parser.parse_args()
+
+    contexto_dir = args.dir
+    vocab_path = contexto_dir / SHARED_VOCAB_FILE
+
+    if not contexto_dir.exists():
+        print(f"❌ Directory not found: {contexto_dir}")
+        return
+
+    game_files = ordered_game_files(contexto_dir)
+    if not game_files:
+        print(f"❌ No JSON files found in {contexto_dir}")
+        return
+
+    print(f"📁 Found {len(game_files)} JSON games in {contexto_dir}")
+    print("🔄 Writing rank-ordered word lists...\n" if args.words_only else f"🔄 Converting to binary ({args.codec})...\n")
+
+    total_json_size = 0
+    total_bin_size = 0
+    total_words_size = 0
+    json_parse_time = 0.0
+    failed = 0
+
+    for json_file in game_files:
+        try:
+            start = time.perf_counter()
+            with open(json_file, "r", encoding="utf-8") as f:
+                game = json.load(f)
+            json_parse_time += time.perf_counter() - start
+
+            words_file = rank_order_path(json_file)
+            words_size = write_rank_order(words_file, game["rank_map"])
+            total_words_size += words_size
+
+            if args.verify and read_rank_order(words_file) != game["rank_map"]:
+                raise ValueError("rank-ordered word list does not match the JSON")
+
+            json_size = os.path.getsize(json_file)
+            total_json_size += json_size
+            if args.words_only:
+                print(f"✅ {json_file.name:30s} {json_size:>10,} → {words_size:>10,} bytes words")
+                continue
+
+            bin_file = json_file.with_suffix(".bin")
+            bin_size = write_game_binary(
+                bin_file, game["keyword"], game["rank_map"], game.get("hints"), vocab_path, CODECS[args.codec]
+            )
+
+            if args.verify:
+                decoded = read_game_binary(bin_file, load_shared_vocab(vocab_path))
+                if decoded["rank_map"] != game["rank_map"] or decoded.get("hints") != game.get("hints"):
+                    raise ValueError("decoded game does not match the JSON")
+
+            total_bin_size += bin_size
+            print(f"✅ {json_file.name:30s} {json_size:>10,} → {bin_size:>10,} bytes ({bin_size / json_size:>5.1%})")
+
+        except Exception as e:
+            failed += 1
+            print(f"❌ Error processing {json_file.name}: {e}")
+
+    vocab_size = os.path.getsize(vocab_path) if vocab_path.exists() else 0
+
+    print(f"\n{'='*80}")
+    print(f"📊 Summary:")
+    print(f"   Games converted:       {len(game_files) - failed}/{len(game_files)}")
+    print(f"   Shared vocab:          {len(load_shared_vocab(vocab_path)):,} words ({vocab_size / 1024 / 1024:.2f} MB)")
+    print(f"   JSON total:            {total_json_size / 1024 / 1024:.2f} MB (parse: {json_parse_time:.2f}s)")
+    if not args.words_only:
+        print(f"   Binary total:          {(total_bin_size + vocab_size) / 1024 / 1024:.2f} MB (incl. vocab)")
+    print(f"   Word lists total:      {total_words_size / 1024 / 1024:.2f} MB (<slug>.words.txt)")
+    print(f"{'='*80}")
+
+
+if __name__ == "__main__":
+    main()
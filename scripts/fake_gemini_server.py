@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Server Gemini giả lập để chạy thử llm_client / pipeline không cần API key và không tốn quota.
+
+Trả lời POST .../models/<model>:generateContent bằng JSON sinh ngẫu nhiên theo
+responseJsonSchema của request, kèm usageMetadata. Có thể giả lập độ trễ và lỗi 429
+(có RetryInfo + header Retry-After) để kiểm tra rate limit / backoff.
+
+Cách sử dụng:
+    cd scripts
+    python fake_gemini_server.py --port 8765 --latency 0.5 --error-rate 0.2
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GOOGLE_API_KEY=fake python ranking_pipeline.py --targets "bác sĩ"
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_WORDS = ["bệnh viện", "y tá", "thuốc", "xe máy", "cà phê", "bóng đá", "trường học", "màu đỏ", "cái chảo"]
+
+
+def fake_value(schema, defs):
+    """Sinh giá trị ngẫu nhiên hợp lệ với JSON schema (đủ cho các model pydantic của pipeline)"""
+    if "$ref" in schema:
+        return fake_value(defs[schema["$ref"].split("/")[-1]], defs)
+    if "anyOf" in schema:
+        return fake_value(schema["anyOf"][0], defs)
+
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: fake_value(prop, defs) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [fake_value(schema.get("items", {}), defs) for _ in range(random.randint(3, 8))]
+    if kind == "integer":
+        return random.randint(schema.get("minimum", 0), schema.get("maximum", 500))
+    if kind == "number":
+        return random.uniform(schema.get("minimum", 0), schema.get("maximum", 1))
+    if kind == "boolean":
+        return random.random() < 0.5
+    return random.choice(FAKE_WORDS)
+
+
+def make_handler(args, stats):
+    class FakeGeminiHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *log_args):
+            if args.verbose:
+                super().log_message(format, *log_args)
+
+        def send_json(self, status, body, headers=None):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with stats["lock"]:
+                stats["requests"] += 1
+
+            if not re.search(r"/models/[^/]+:generateContent$", self.path):
+                self.send_json(404, {"error": {"code": 404, "message": f"Unknown path {self.path}", "status": "NOT_FOUND"}})
+                return
+
+            time.sleep(args.latency * random.uniform(0.5, 1.5))
+
+            if random.random() < args.error_rate:
+                with stats["lock"]:
+                    stats["errors"] += 1
+                self.send_json(429, {"error": {
+                    "code": 429,
+                    "message": "Resource has been exhausted (fake)",
+                    "status": "RESOURCE_EXHAUSTED",
+                    "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{args.retry_after}s"}],
+                }}, headers={"Retry-After": str(args.retry_after)})
+                return
+
+            schema = request.get("generationConfig", {}).get("responseJsonSchema") or {"type": "string"}
+            text = json.dumps(fake_value(schema, schema.get("$defs", {})), ensure_ascii=False)
+            prompt_tokens = sum(len(part.get("text", "")) for content in request.get("contents", [])
+                                for part in content.get("parts", [])) // 4
+            output_tokens = len(text) // 4
+            self.send_json(200, {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+                "usageMetadata": {
+                    "promptTokenCount": prompt_tokens,
+                    "candidatesTokenCount": output_tokens,
+                    "totalTokenCount": prompt_tokens + output_tokens,
+                },
+            })
+
+    return FakeGeminiHandler
+
+
+def start_server(port=0, latency=0.0, error_rate=0.0, retry_after=1, verbose=False):
+    """Chạy server trong thread nền, trả về (server, base_url, stats) - dùng cho script kiểm tra"""
+    args = argparse.Namespace(latency=latency, error_rate=error_rate, retry_after=retry_after, verbose=verbose)
+    stats = {"requests": 0, "errors": 0, "lock": threading.Lock()}
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(args, stats))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Độ trễ trung bình mỗi request (giây)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Tỉ lệ request trả về 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After (giây) của lỗi 429")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    stats = {"requests": 0, "errors": 0, "lock": threading.Lock()}
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args, stats))
+    print(f"🧪 Fake Gemini server: http://127.0.0.1:{args.port} (latency {args.latency}s, 429 rate {args.error_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {stats['requests']} request, {stats['errors']} lỗi 429")
+
+
+if __name__ == "__main__":
+    main()
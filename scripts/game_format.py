@@ -0,0 +1,482 @@
+# -*- coding: utf-8 -*-
+"""
+Định dạng game nhị phân cho Contexto
+
+Thay vì lưu rank_map (word -> rank) dạng JSON trong mỗi game (~1.7 MB), các game
+dùng chung 1 file vocab và mỗi game chỉ lưu mảng rank theo vocab id:
+
+    lib/contexto/vocab.txt      # vocab chung, mỗi dòng 1 từ, chỉ thêm vào cuối (id không đổi)
+    lib/contexto/vocab.fold.json  # khoá fold của vocab cho server tra từ đoán (xem vietnamese_fold.py)
+    lib/contexto/<slug>.bin     # keyword + hints + ranks[vocab_id] (0 = từ không có trong game)
+
+Định dạng chính: game mới chỉ được công bố dạng <slug>.bin (GAME_OUTPUTS mặc định của
+ranking_pipeline.py), server đọc .bin trước mọi file riêng khác của game (lib/gameData.ts).
+Các định dạng dưới đây chỉ dành cho game JSON (game cũ chưa convert, hoặc GAME_OUTPUTS=json,...),
+server không đọc chúng khi game đã có .bin:
+
+    lib/contexto/<slug>.words.txt  # mảng ngược rank -> từ: dòng thứ r là từ có rank r (rỗng nếu thiếu)
+
+<slug>.words.txt để server lấy hint / từ bí mật / N từ gần nhất của game JSON bằng index trực tiếp
+thay vì quét cả rank_map (game .bin dựng mảng này từ mảng rank, không cần file).
+
+Bản chia tầng (head/tail) của game JSON, để cold start chỉ đọc vài nghìn rank đầu:
+
+    lib/contexto/<slug>.head.json  # {"keyword", "hints", "head_rank", "word_count", "rank_map": rank <= head_rank}
+    lib/contexto/<slug>.tail.json  # {"keyword", "head_rank", "rank_map": rank > head_rank}
+
+Hợp đồng giữa writer (write_game_tiers) và reader (read_game_tiers, lib/gameData.ts):
+    - head chứa ĐỦ mọi từ có rank <= head_rank, tail chứa mọi từ còn lại; head_rank >= mọi hint.
+    - Từ đoán có trong head -> rank đúng, không cần tail (mọi từ trong tail có rank lớn hơn, nên cả
+      khi nhiều từ cùng khoá fold thì rank nhỏ nhất vẫn nằm ở head). Không có trong head -> đọc tail.
+    - Khoảng rank [a, b] với b <= head_rank, top-N với N <= số từ trong head: chỉ cần head.
+    - len(head.rank_map) == word_count -> game không có từ nào ở tail.
+    - head_rank của tail phải bằng của head (2 file ghi cùng lúc; khác nhau -> cặp file lệch, lỗi).
+
+Layout file .bin (little-endian, mọi section bắt đầu ở offset chia hết cho 4):
+
+    0   magic        4s   b"CXGM"
+    4   version      u16  = 1
+    6   codec        u8   0 = uint32 (mảng rank thô, đọc trực tiếp theo offset)
+                          1 = varint (LEB128 từng rank, nhỏ hơn ~25%)
+                          2 = perm (vocab id theo thứ tự rank, bit-packed, ~1/2 uint32 - bản lưu trữ)
+    7   reserved     u8
+    8   vocab_count  u32  số từ của vocab chung lúc ghi (id >= vocab_count -> không có trong game)
+    12  keyword_len  u16  số byte UTF-8 của keyword
+    14  hints_count  u16
+    16  keyword      keyword_len byte, pad 0 tới bội số của 4
+        hints        u32 * hints_count
+        payload_len  u32
+        payload      uint32[vocab_count] hoặc varint hoặc perm
+
+Payload perm: các game gần như là hoán vị của cùng 1 vocab, phần lặp lại giữa các game (chuỗi từ)
+đã nằm trong vocab chung, mỗi game chỉ còn thứ tự các vocab id (~log2(vocab_count) bit / từ):
+
+    word_count     u32  số từ có trong game
+    missing_count  u32
+    missing        u32 * missing_count  các rank bị thiếu trong 1..(word_count + missing_count)
+                                        (game sửa tay), rank còn lại gán lần lượt theo thứ tự ids
+    ids            word_count số, mỗi số `bits` bit (bits = số bit của vocab_count - 1),
+                   nối liên tục, bit thấp trước (np.packbits bitorder="little")
+"""
+
+import json
+import os
+import struct
+import threading
+
+import numpy as np
+
+from vietnamese_fold import build_fold_index, fold_index_path, read_fold_index
+
+GAME_MAGIC = b"CXGM"
+GAME_VERSION = 1
+
+CODEC_UINT32 = 0
+CODEC_VARINT = 1
+CODEC_PERMUTATION = 2
+CODECS = {"uint32": CODEC_UINT32, "varint": CODEC_VARINT, "perm": CODEC_PERMUTATION}
+
+SHARED_VOCAB_FILE = "vocab.txt"
+RANK_ORDER_SUFFIX = ".words.txt"
+HEAD_SUFFIX = ".head.json"
+TAIL_SUFFIX = ".tail.json"
+HEAD_RANKS = 3000  # Hint random xa nhất lấy tới rank 3000 (fallback của khoảng 1000-2000)
+
+_HEADER = struct.Struct("<4sHBBIHH")
+
+# vocab.txt chỉ được 1 thread ghi tại 1 thời điểm (pipeline re-rank nhiều target song song)
+_SHARED_VOCAB_LOCK = threading.Lock()
+
+
+def _pad4(length):
+    return (4 - length % 4) % 4
+
+
+def atomic_write_bytes(path, data):
+    """Ghi file qua file tạm + rename: bị ngắt giữa chừng không làm hỏng file cũ"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# =========================== SHARED VOCAB ===========================
+
+def load_shared_vocab(vocab_path):
+    """Đọc vocab chung (list từ theo id). File chưa tồn tại -> vocab rỗng"""
+    try:
+        with open(vocab_path, "r", encoding="utf-8") as f:
+            return f.read().split("\n")[:-1]
+    except FileNotFoundError:
+        return []
+
+
+def update_shared_vocab(vocab_path, words):
+    """
+    Thêm các từ chưa có vào cuối vocab chung (ghi atomic qua file tạm, 1 thread tại 1 thời điểm).
+
+    Returns:
+        tuple: (vocab, word_ids) sau khi cập nhật
+    """
+    with _SHARED_VOCAB_LOCK:
+        return _update_shared_vocab(vocab_path, words)
+
+
+def _update_shared_vocab(vocab_path, words):
+    vocab = load_shared_vocab(vocab_path)
+    word_ids = {word: idx for idx, word in enumerate(vocab)}
+
+    added = 0
+    for word in words:
+        if word not in word_ids:
+            if "\n" in word:
+                raise ValueError(f"Từ không hợp lệ cho vocab chung: {word!r}")
+            word_ids[word] = len(vocab)
+            vocab.append(word)
+            added += 1
+
+    if added:
+        atomic_write_bytes(vocab_path, "".join(f"{word}\n" for word in vocab).encode("utf-8"))
+    if vocab:
+        update_fold_index(vocab_path, vocab)
+
+    return vocab, word_ids
+
+
+def update_fold_index(vocab_path, vocab):
+    """
+    Ghi lại sidecar vocab.fold.json nếu chưa khớp vocab (thiếu, bảng fold đổi, vocab có từ mới).
+
+    Returns:
+        bool: True nếu đã ghi
+    """
+    previous = read_fold_index(vocab_path)
+    if previous is not None and previous["count"] == len(vocab):
+        return False
+    index = build_fold_index(vocab, previous)
+    atomic_write_bytes(fold_index_path(vocab_path), json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    return True
+
+
+# =========================== VARINT ===========================
+
+def encode_varint(values):
+    """LEB128 cho mảng số nguyên không âm (vectorized theo từng byte)"""
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    remaining = values >> np.uint64(7)
+    while remaining.any():
+        n_bytes += remaining > 0
+        remaining >>= np.uint64(7)
+
+    out = np.empty(int(n_bytes.sum()), dtype=np.uint8)
+    starts = np.concatenate(([0], np.cumsum(n_bytes)[:-1]))
+    for k in range(int(n_bytes.max()) if len(values) else 0):
+        has_byte = n_bytes > k
+        byte = (values[has_byte] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = n_bytes[has_byte] > k + 1
+        out[starts[has_byte] + k] = byte.astype(np.uint8) | (more.astype(np.uint8) << 7)
+    return out.tobytes()
+
+
+def decode_varint(data, count):
+    """Giải mã `count` số LEB128 từ bytes"""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(raw < 0x80)[:count]
+    if len(ends) < count:
+        raise ValueError("Payload varint bị cắt cụt")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    values = np.zeros(count, dtype=np.uint64)
+    lengths = ends - starts + 1
+    for k in range(int(lengths.max()) if count else 0):
+        has_byte = lengths > k
+        values[has_byte] |= (raw[starts[has_byte] + k] & np.uint64(0x7F)).astype(np.uint64) << np.uint64(7 * k)
+    return values
+
+
+# =========================== PERMUTATION ===========================
+
+def permutation_bits(vocab_count):
+    """Số bit mỗi vocab id trong payload perm (tối đa 25 để reader TS đọc 1 cửa sổ 32 bit)"""
+    bits = max(1, int(vocab_count - 1).bit_length())
+    if bits > 25:
+        raise ValueError(f"Vocab quá lớn cho codec perm: {vocab_count:,} từ")
+    return bits
+
+
+def encode_permutation(ranks):
+    """Mảng rank theo vocab id -> payload perm (layout ở đầu module)"""
+    ranks = np.asarray(ranks, dtype=np.uint32)
+    ids = np.flatnonzero(ranks)
+    ids = ids[np.argsort(ranks[ids], kind="stable")]
+    present = ranks[ids].astype(np.int64)
+    if len(present) and np.any(np.diff(present) == 0):
+        raise ValueError("Codec perm không lưu được game có 2 từ cùng rank")
+    missing = np.setdiff1d(np.arange(1, int(present[-1]) + 1 if len(present) else 1), present)
+
+    bits = permutation_bits(len(ranks))
+    id_bits = ((ids[:, None] >> np.arange(bits)) & 1).astype(np.uint8)
+    return b"".join([
+        struct.pack("<II", len(ids), len(missing)),
+        missing.astype("<u4").tobytes(),
+        np.packbits(id_bits.ravel(), bitorder="little").tobytes(),
+    ])
+
+
+def decode_permutation(data, vocab_count):
+    """Payload perm -> mảng rank uint32 theo vocab id"""
+    word_count, missing_count = struct.unpack_from("<II", data, 0)
+    missing = np.frombuffer(data, dtype="<u4", count=missing_count, offset=8)
+    bits = permutation_bits(vocab_count)
+
+    # Như lib/gameData.ts: bits <= 25 -> mỗi id nằm gọn trong 4 byte bắt đầu từ byte chứa bit đầu tiên
+    packed = np.frombuffer(data, dtype=np.uint8, offset=8 + 4 * missing_count)
+    packed = np.concatenate([packed, np.zeros(3, dtype=np.uint8)]).astype(np.uint32)
+    bit_pos = np.arange(word_count, dtype=np.int64) * bits
+    start = bit_pos >> 3
+    window = packed[start] | (packed[start + 1] << 8) | (packed[start + 2] << 16) | (packed[start + 3] << 24)
+    ids = (window >> (bit_pos & 7).astype(np.uint32)) & np.uint32((1 << bits) - 1)
+
+    present = np.ones(word_count + missing_count + 1, dtype=bool)
+    present[0] = False
+    present[missing] = False
+    ranks = np.zeros(vocab_count, dtype=np.uint32)
+    ranks[ids] = np.flatnonzero(present)
+    return ranks
+
+
+# =========================== GAME FILE ===========================
+
+def rank_array(rank_map, word_ids, vocab_count):
+    """rank_map (word -> rank) -> mảng uint32 theo vocab id (0 = không có)"""
+    ranks = np.zeros(vocab_count, dtype="<u4")
+    ids = np.fromiter((word_ids[word] for word in rank_map), dtype=np.int64, count=len(rank_map))
+    ranks[ids] = np.fromiter(rank_map.values(), dtype=np.int64, count=len(rank_map))
+    return ranks
+
+
+def encode_game(keyword, ranks, hints=None, codec=CODEC_UINT32):
+    """Đóng gói 1 game thành bytes theo layout ở đầu module"""
+    ranks = np.asarray(ranks, dtype="<u4")
+    hints = list(hints or [])
+    keyword_bytes = keyword.encode("utf-8")
+
+    if codec == CODEC_UINT32:
+        payload = ranks.tobytes()
+    elif codec == CODEC_VARINT:
+        payload = encode_varint(ranks)
+    elif codec == CODEC_PERMUTATION:
+        payload = encode_permutation(ranks)
+    else:
+        raise ValueError(f"Codec không hợp lệ: {codec}")
+
+    parts = [
+        _HEADER.pack(GAME_MAGIC, GAME_VERSION, codec, 0, len(ranks), len(keyword_bytes), len(hints)),
+        keyword_bytes,
+        b"\0" * _pad4(len(keyword_bytes)),
+        np.asarray(hints, dtype="<u4").tobytes(),
+        struct.pack("<I", len(payload)),
+        payload,
+    ]
+    return b"".join(parts)
+
+
+def parse_game_header(data):
+    """
+    Đọc header + keyword + hints (không giải mã payload).
+
+    Returns:
+        dict: keyword, hints, codec, vocab_count, payload_offset, payload_len
+    """
+    magic, version, codec, _, vocab_count, keyword_len, hints_count = _HEADER.unpack_from(data, 0)
+    if magic != GAME_MAGIC:
+        raise ValueError("Không phải file game Contexto (sai magic)")
+    if version != GAME_VERSION:
+        raise ValueError(f"Phiên bản file game không hỗ trợ: {version}")
+
+    offset = _HEADER.size
+    keyword = bytes(data[offset:offset + keyword_len]).decode("utf-8")
+    offset += keyword_len + _pad4(keyword_len)
+    hints = np.frombuffer(data, dtype="<u4", count=hints_count, offset=offset).tolist()
+    offset += 4 * hints_count
+    (payload_len,) = struct.unpack_from("<I", data, offset)
+
+    return {
+        "keyword": keyword,
+        "hints": hints,
+        "codec": codec,
+        "vocab_count": vocab_count,
+        "payload_offset": offset + 4,
+        "payload_len": payload_len,
+    }
+
+
+def decode_game_ranks(data, header=None):
+    """Mảng rank uint32 theo vocab id của 1 game"""
+    header = header or parse_game_header(data)
+    start = header["payload_offset"]
+    if header["codec"] == CODEC_UINT32:
+        return np.frombuffer(data, dtype="<u4", count=header["vocab_count"], offset=start)
+    if header["codec"] == CODEC_VARINT:
+        payload = bytes(data[start:start + header["payload_len"]])
+        return decode_varint(payload, header["vocab_count"]).astype(np.uint32)
+    if header["codec"] == CODEC_PERMUTATION:
+        payload = bytes(data[start:start + header["payload_len"]])
+        return decode_permutation(payload, header["vocab_count"])
+    raise ValueError(f"Codec không hợp lệ: {header['codec']}")
+
+
+def decode_game(data, vocab):
+    """
+    Giải mã 1 game về dạng giống file JSON.
+
+    Returns:
+        dict: {"keyword", "rank_map" (sắp theo rank), "hints" (nếu có)}
+    """
+    header = parse_game_header(data)
+    ranks = decode_game_ranks(data, header)
+    ids = np.flatnonzero(ranks)
+    ids = ids[np.argsort(ranks[ids], kind="stable")]
+
+    game = {
+        "keyword": header["keyword"],
+        "rank_map": {vocab[idx]: int(ranks[idx]) for idx in ids.tolist()},
+    }
+    if header["hints"]:
+        game["hints"] = header["hints"]
+    return game
+
+
+def write_game_binary(path, keyword, rank_map, hints, vocab_path, codec=CODEC_UINT32):
+    """
+    Ghi 1 game ra file .bin (ghi atomic), thêm từ mới vào vocab chung nếu cần.
+
+    Returns:
+        int: kích thước file (bytes)
+    """
+    vocab, word_ids = update_shared_vocab(vocab_path, rank_map.keys())
+    data = encode_game(keyword, rank_array(rank_map, word_ids, len(vocab)), hints, codec)
+    atomic_write_bytes(path, data)
+    return len(data)
+
+
+def read_game_binary(path, vocab):
+    """Đọc file .bin về dạng {"keyword", "rank_map", "hints"}"""
+    with open(path, "rb") as f:
+        return decode_game(f.read(), vocab)
+
+
+# =========================== RANK ORDER ===========================
+
+def rank_order_path(game_path):
+    """<slug>.json / <slug>.bin -> <slug>.words.txt"""
+    return os.path.splitext(game_path)[0] + RANK_ORDER_SUFFIX
+
+
+def encode_rank_order(rank_map):
+    """
+    Mảng ngược của rank_map: dòng thứ r (đếm từ 1) là từ có rank r, dòng rỗng nếu không có từ nào.
+    Rank do pipeline tạo liên tục 1..N; game sửa tay có thể thiếu vài rank nhưng không được trùng.
+    """
+    order = [""] * max(rank_map.values(), default=0)
+    for word, rank in rank_map.items():
+        if rank < 1 or order[rank - 1]:
+            raise ValueError(f"Rank không hợp lệ hoặc bị trùng: {word!r} -> {rank}")
+        if not word or "\n" in word:
+            raise ValueError(f"Từ không hợp lệ cho danh sách theo rank: {word!r}")
+        order[rank - 1] = word
+    return "".join(f"{word}\n" for word in order).encode("utf-8")
+
+
+def write_rank_order(path, rank_map):
+    """
+    Ghi <slug>.words.txt (ghi atomic).
+
+    Returns:
+        int: kích thước file (bytes)
+    """
+    data = encode_rank_order(rank_map)
+    atomic_write_bytes(path, data)
+    return len(data)
+
+
+def read_rank_order(path):
+    """Đọc <slug>.words.txt về rank_map (bỏ các rank trống)"""
+    with open(path, "r", encoding="utf-8") as f:
+        order = f.read().split("\n")[:-1]
+    return {word: rank for rank, word in enumerate(order, start=1) if word}
+
+
+# =========================== TIERS (HEAD / TAIL) ===========================
+
+def tier_paths(game_path):
+    """<slug>.json / <slug>.bin -> (<slug>.head.json, <slug>.tail.json)"""
+    base = os.path.splitext(game_path)[0]
+    return base + HEAD_SUFFIX, base + TAIL_SUFFIX
+
+
+def split_game(keyword, rank_map, hints=None, head_ranks=HEAD_RANKS):
+    """
+    Chia 1 game thành head + tail theo hợp đồng ở đầu module.
+    head_rank = max(head_ranks, hint lớn nhất) để mọi hint đều nằm trong head.
+
+    Returns:
+        tuple: (head, tail) dạng dict sẵn sàng ghi JSON
+    """
+    head_rank = max([head_ranks, *(hints or [])])
+    ordered = sorted(rank_map.items(), key=lambda item: item[1])
+    head = {
+        "keyword": keyword,
+        "hints": list(hints or []),
+        "head_rank": head_rank,
+        "word_count": len(rank_map),
+        "rank_map": {word: rank for word, rank in ordered if rank <= head_rank},
+    }
+    tail = {
+        "keyword": keyword,
+        "head_rank": head_rank,
+        "rank_map": {word: rank for word, rank in ordered if rank > head_rank},
+    }
+    return head, tail
+
+
+def write_game_tiers(game_path, keyword, rank_map, hints=None, head_ranks=HEAD_RANKS):
+    """
+    Ghi <slug>.head.json + <slug>.tail.json cạnh game_path (ghi atomic, tail trước head
+    để reader không bao giờ thấy head mới đi với tail cũ thiếu từ).
+
+    Returns:
+        tuple: (kích thước head, kích thước tail) (bytes)
+    """
+    head, tail = split_game(keyword, rank_map, hints, head_ranks)
+    head_path, tail_path = tier_paths(game_path)
+    sizes = {}
+    for path, part in ((tail_path, tail), (head_path, head)):
+        data = json.dumps(part, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        atomic_write_bytes(path, data)
+        sizes[path] = len(data)
+    return sizes[head_path], sizes[tail_path]
+
+
+def read_game_tiers(head_path, load_tail=True):
+    """
+    Đọc bản chia tầng về dạng {"keyword", "rank_map", "hints"} như file JSON.
+    load_tail=False -> chỉ rank_map của head (rank <= head_rank).
+    """
+    with open(head_path, "r", encoding="utf-8") as f:
+        head = json.load(f)
+    rank_map = dict(head["rank_map"])
+
+    if load_tail and len(rank_map) < head["word_count"]:
+        tail_path = str(head_path)[:-len(HEAD_SUFFIX)] + TAIL_SUFFIX
+        with open(tail_path, "r", encoding="utf-8") as f:
+            tail = json.load(f)
+        if tail["head_rank"] != head["head_rank"]:
+            raise ValueError(f"{tail_path} không khớp head (head_rank {tail['head_rank']} != {head['head_rank']})")
+        rank_map.update(tail["rank_map"])
+
+    game = {"keyword": head["keyword"], "rank_map": rank_map}
+    if head["hints"]:
+        game["hints"] = head["hints"]
+    return game
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Game store đóng gói: mọi game trong 1 file lib/contexto/games.pack, đọc trực tiếp theo offset
+
+Với 1 file / game, mỗi game mới là thêm 1 file phải mở, parse và giữ trong cache của server.
+games.pack chứa 1 vocab chung + mảng rank uint32 theo vocab id của từng game (giống payload
+uint32 của <slug>.bin, xem game_format.py) + bảng offset theo slug: rank của 1 từ = 4 byte ở
+offset + 4 * vocab_id, không cần parse cả game.
+
+Layout (little-endian, mọi section bắt đầu ở offset chia hết cho 4):
+
+    0   magic         4s   b"CXPK"
+    4   version       u16  = 1
+    6   reserved      u16
+    8   vocab_count   u32  số từ trong section vocab
+    12  vocab_len     u32  số byte của section vocab
+    16  table_offset  u32
+    20  table_len     u32
+    24  vocab         UTF-8, mỗi từ 1 dòng (= vocab.txt lúc ghi, id giống hệt), pad 0 tới bội số của 4
+        ranks         uint32[count] của từng game, nối tiếp nhau
+        table         JSON {"version": 1, "games": {slug: {"id", "keyword", "hints", "offset", "count"}}}
+
+count = số từ của vocab chung lúc game được ghi: vocab_id >= count -> từ không có trong game (rank 0
+cũng vậy). File < 4 GB (offset u32).
+
+Thêm game (append_game) ghi lại cả file qua file tạm + rename: các section cũ được chép nguyên byte
+(không giải mã lại), vocab mới thay vocab cũ, bảng offset ghi lại ở cuối. Reader đang mở file cũ
+không bị ảnh hưởng, bị ngắt giữa chừng không làm hỏng pack.
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from game_format import (
+    SHARED_VOCAB_FILE,
+    decode_game_ranks,
+    load_shared_vocab,
+    parse_game_header,
+    rank_array,
+    update_shared_vocab,
+)
+
+PACK_FILE = "games.pack"
+PACK_MAGIC = b"CXPK"
+PACK_VERSION = 1
+
+_PACK_HEADER = struct.Struct("<4sHHIIII")
+
+
+def _pad4(length):
+    return (4 - length % 4) % 4
+
+
+# =========================== ĐỌC ===========================
+
+def open_pack(path):
+    """
+    Mở pack bằng np.memmap (không đọc cả file).
+
+    Returns:
+        dict: {"data": memmap uint8, "vocab_count", "games": bảng offset}
+    """
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    magic, version, _, vocab_count, vocab_len, table_offset, table_len = _PACK_HEADER.unpack_from(data, 0)
+    if magic != PACK_MAGIC:
+        raise ValueError("Không phải game pack Contexto (sai magic)")
+    if version != PACK_VERSION:
+        raise ValueError(f"Phiên bản game pack không hỗ trợ: {version}")
+
+    table = json.loads(bytes(data[table_offset:table_offset + table_len]).decode("utf-8"))
+    return {
+        "data": data,
+        "vocab_count": vocab_count,
+        "vocab_offset": _PACK_HEADER.size,
+        "vocab_len": vocab_len,
+        "games": table["games"],
+    }
+
+
+def pack_vocab(pack):
+    """Vocab lưu trong pack (list từ theo id)"""
+    start = pack["vocab_offset"]
+    return bytes(pack["data"][start:start + pack["vocab_len"]]).decode("utf-8").split("\n")[:pack["vocab_count"]]
+
+
+def pack_game_ranks(pack, slug):
+    """Mảng rank uint32 theo vocab id của 1 game (view trên memmap, không copy)"""
+    entry = pack["games"][slug]
+    return np.frombuffer(pack["data"], dtype="<u4", count=entry["count"], offset=entry["offset"])
+
+
+def pack_rank(pack, slug, word_id):
+    """Rank của 1 vocab id trong 1 game (đọc 4 byte), 0 nếu không có"""
+    entry = pack["games"][slug]
+    if word_id >= entry["count"]:
+        return 0
+    (rank,) = struct.unpack_from("<I", pack["data"], entry["offset"] + 4 * word_id)
+    return rank
+
+
+# =========================== GHI ===========================
+
+def write_pack(path, vocab, games):
+    """
+    Ghi pack mới (file tạm + rename).
+
+    Args:
+        vocab: vocab chung (list từ theo id)
+        games: iterable (slug, {"id", "keyword", "hints"}, ranks) - ranks là mảng uint32 theo
+            vocab id (bytes-like hoặc numpy), độ dài <= len(vocab)
+
+    Returns:
+        int: kích thước file (bytes)
+    """
+    vocab_bytes = "".join(f"{word}\n" for word in vocab).encode("utf-8")
+    tmp_path = f"{path}.tmp"
+    table = {}
+
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * _PACK_HEADER.size)
+        f.write(vocab_bytes + b"\0" * _pad4(len(vocab_bytes)))
+
+        for slug, meta, ranks in games:
+            ranks = np.asarray(ranks, dtype="<u4")
+            if len(ranks) > len(vocab):
+                raise ValueError(f"Game {slug} có {len(ranks):,} rank, vocab chỉ có {len(vocab):,} từ")
+            table[slug] = {**meta, "offset": f.tell(), "count": len(ranks)}
+            f.write(ranks.tobytes())
+
+        table_offset = f.tell()
+        table_bytes = json.dumps(
+            {"version": PACK_VERSION, "games": table}, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        f.write(table_bytes)
+        size = f.tell()
+        if size >= 2 ** 32:
+            raise ValueError("Game pack vượt quá 4 GB")
+
+        f.seek(0)
+        f.write(_PACK_HEADER.pack(
+            PACK_MAGIC, PACK_VERSION, 0, len(vocab), len(vocab_bytes), table_offset, len(table_bytes)
+        ))
+
+    os.replace(tmp_path, path)
+    return size
+
+
+def game_ranks(game_path, vocab_path):
+    """
+    Mảng rank theo vocab id của 1 game trong lib/contexto: từ <slug>.bin nếu có (cùng vocab chung,
+    không cần giải mã JSON), ngược lại từ <slug>.json (thêm từ mới vào vocab chung nếu cần).
+
+    Returns:
+        tuple: (keyword, hints, ranks)
+    """
+    bin_path = os.path.splitext(game_path)[0] + ".bin"
+    if os.path.exists(bin_path):
+        with open(bin_path, "rb") as f:
+            data = f.read()
+        header = parse_game_header(data)
+        return header["keyword"], header["hints"], decode_game_ranks(data, header)
+
+    with open(game_path, "r", encoding="utf-8") as f:
+        game = json.load(f)
+    vocab, word_ids = update_shared_vocab(vocab_path, game["rank_map"].keys())
+    return game["keyword"], game.get("hints", []), rank_array(game["rank_map"], word_ids, len(vocab))
+
+
+def append_game(path, slug, game_id, game_path, vocab_path):
+    """
+    Thêm (hoặc thay nếu slug đã có) 1 game vào pack, tạo pack nếu chưa có.
+    Các game cũ được chép nguyên byte từ pack hiện tại.
+
+    Returns:
+        int: kích thước pack (bytes)
+    """
+    keyword, hints, ranks = game_ranks(game_path, vocab_path)
+    vocab = load_shared_vocab(vocab_path)
+
+    pack = open_pack(path) if os.path.exists(path) else {"games": {}}
+    games = [
+        (old_slug, {key: entry[key] for key in ("id", "keyword", "hints")}, pack_game_ranks(pack, old_slug))
+        for old_slug, entry in pack["games"].items() if old_slug != slug
+    ]
+    games.append((slug, {"id": game_id, "keyword": keyword, "hints": list(hints)}, ranks))
+    return write_pack(path, vocab, games)
+
+
+def build_pack(path, contexto_dir, game_order):
+    """
+    Dựng lại pack từ các game trong thư mục.
+
+    Args:
+        game_order: list (slug, game_id) theo thứ tự ghi (thứ tự rankLoader.json để vocab id ổn định)
+
+    Returns:
+        int: kích thước file (bytes)
+    """
+    vocab_path = os.path.join(contexto_dir, SHARED_VOCAB_FILE)
+    games = []
+    for slug, game_id in game_order:
+        keyword, hints, ranks = game_ranks(os.path.join(contexto_dir, f"{slug}.json"), vocab_path)
+        games.append((slug, {"id": game_id, "keyword": keyword, "hints": list(hints)}, ranks))
+    return write_pack(path, load_shared_vocab(vocab_path), games)
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+Lớp gọi Gemini dùng chung cho pipeline
+
+- 1 genai.Client cho cả process (thread-safe), tạo lần đầu khi cần; google.genai (import mất
+  ~0.5s) cũng chỉ import lúc đó, nên import llm_client (vd để đọc cache/metrics) rất nhẹ
+- Token bucket giới hạn số request/phút cho mọi thread
+- Retry với exponential backoff + jitter, ưu tiên thời gian chờ server trả về
+  (header Retry-After hoặc google.rpc.RetryInfo trong body lỗi 429)
+- Metrics mỗi lần gọi: stage, latency, số token, mã lỗi
+- Thread pool dùng chung để chạy song song các bước LLM độc lập (submit)
+- Cache response trên đĩa theo hash (model, prompt, schema): chạy lại 1 ngày lỗi không tốn quota,
+  chế độ offline chỉ đọc cache (chạy thử / benchmark không cần mạng)
+
+Cấu hình qua biến môi trường:
+    LLM_RATE_LIMIT_RPM      số request tối đa mỗi phút (mặc định 10)
+    LLM_RATE_LIMIT_BURST    số request được gửi dồn liền nhau (mặc định 2)
+    LLM_MAX_CONCURRENCY     số thread của pool (mặc định 4)
+    LLM_MAX_ATTEMPTS        số lần thử mặc định mỗi call (mặc định 4)
+    GEMINI_BASE_URL         endpoint thay thế, vd server giả lập: python fake_gemini_server.py
+    LLM_CACHE               0 để tắt cache response (mặc định bật)
+    LLM_CACHE_DIR           thư mục cache (mặc định scripts/llm_cache)
+    LLM_CACHE_TTL_DAYS      tuổi tối đa của 1 entry, 0 = không hết hạn (mặc định 30)
+    LLM_CACHE_MAX_MB        dung lượng tối đa, xoá entry ít dùng nhất khi vượt (mặc định 100)
+    LLM_OFFLINE             1 để chỉ dùng cache, không gọi API (thiếu cache -> LLMCacheMiss)
+"""
+
+import contextvars
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import run_report
+from game_format import atomic_write_bytes
+
+# =========================== CONFIG ===========================
+
+LLM_RATE_LIMIT_RPM = float(os.environ.get('LLM_RATE_LIMIT_RPM', '10'))
+LLM_RATE_LIMIT_BURST = int(os.environ.get('LLM_RATE_LIMIT_BURST', '2'))
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '4'))
+LLM_MAX_ATTEMPTS = int(os.environ.get('LLM_MAX_ATTEMPTS', '4'))
+GEMINI_BASE_URL = os.environ.get('GEMINI_BASE_URL', '')
+
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE', '1') != '0'
+LLM_CACHE_DIR = Path(os.environ.get('LLM_CACHE_DIR', Path(__file__).parent / "llm_cache"))
+LLM_CACHE_TTL_DAYS = float(os.environ.get('LLM_CACHE_TTL_DAYS', '30'))
+LLM_CACHE_MAX_MB = float(os.environ.get('LLM_CACHE_MAX_MB', '100'))
+LLM_OFFLINE = os.environ.get('LLM_OFFLINE', '0') == '1'
+
+# Backoff: chờ ngẫu nhiên trong [0, min(cap, base * 2^attempt)] (full jitter)
+LLM_BACKOFF_BASE = 2.0
+LLM_BACKOFF_CAP = 60.0
+
+# Lỗi phía client (trừ 429) gửi lại cũng không khác -> không retry
+NON_RETRYABLE_STATUS = {400, 401, 403, 404}
+
+# =========================== CLIENT ===========================
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+_EXECUTOR = None
+
+def get_client():
+    """genai.Client dùng chung (trỏ tới GEMINI_BASE_URL nếu có)"""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            with run_report.span("import", module="google.genai"):
+                from google import genai
+            api_key = os.environ.get('GOOGLE_API_KEY', '')
+            http_options = None
+            if GEMINI_BASE_URL:
+                # Server giả lập không kiểm tra key, nhưng SDK bắt buộc phải có
+                http_options = {"base_url": GEMINI_BASE_URL}
+                api_key = api_key or "fake"
+            _CLIENT = genai.Client(api_key=api_key, http_options=http_options)
+        return _CLIENT
+
+def submit(fn, *args, **kwargs):
+    """Chạy fn trong thread pool dùng chung (giữ context hiện tại, vd target của run_report), trả về Future"""
+    global _EXECUTOR
+    with _CLIENT_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+    return _EXECUTOR.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+# =========================== RATE LIMIT ===========================
+
+_BUCKET = {"tokens": float(LLM_RATE_LIMIT_BURST), "updated": time.monotonic()}
+_BUCKET_LOCK = threading.Lock()
+
+def acquire_rate_limit(rpm=None, burst=None):
+    """
+    Chờ tới khi token bucket còn chỗ cho 1 request.
+
+    Returns:
+        float: số giây đã chờ
+    """
+    rpm = rpm or LLM_RATE_LIMIT_RPM
+    burst = burst or LLM_RATE_LIMIT_BURST
+    if rpm <= 0:
+        return 0.0
+
+    rate = rpm / 60.0
+    waited = 0.0
+    while True:
+        with _BUCKET_LOCK:
+            now = time.monotonic()
+            _BUCKET["tokens"] = min(burst, _BUCKET["tokens"] + (now - _BUCKET["updated"]) * rate)
+            _BUCKET["updated"] = now
+            if _BUCKET["tokens"] >= 1:
+                _BUCKET["tokens"] -= 1
+                return waited
+            delay = (1 - _BUCKET["tokens"]) / rate
+        time.sleep(delay)
+        waited += delay
+
+# =========================== RETRY ===========================
+
+def _error_status(error):
+    # APIError chỉ có thể xuất hiện sau get_client(), lúc đó google.genai đã import xong
+    from google.genai import errors as genai_errors
+    return getattr(error, "code", None) if isinstance(error, genai_errors.APIError) else None
+
+def retry_after_seconds(error):
+    """Thời gian chờ server yêu cầu (Retry-After header hoặc RetryInfo.retryDelay), None nếu không có"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers and headers.get("retry-after"):
+        try:
+            return float(headers.get("retry-after"))
+        except ValueError:
+            pass
+
+    details = getattr(error, "details", None)
+    for detail in (details or {}).get("error", {}).get("details", []) if isinstance(details, dict) else []:
+        if str(detail.get("@type", "")).endswith("RetryInfo"):
+            match = re.fullmatch(r"([\d.]+)s", str(detail.get("retryDelay", "")))
+            if match:
+                return float(match.group(1))
+    return None
+
+def backoff_delay(attempt, retry_after=None):
+    """Thời gian chờ trước lần thử attempt + 1 (attempt tính từ 0)"""
+    delay = random.uniform(0, min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        # Không gửi lại sớm hơn server yêu cầu, jitter nhỏ để các thread không dồn cùng lúc
+        delay = retry_after + random.uniform(0, LLM_BACKOFF_BASE)
+    return delay
+
+# =========================== CACHE ===========================
+
+class LLMCacheMiss(Exception):
+    """Offline mode nhưng không có response trong cache"""
+
+_CACHE_LOCK = threading.Lock()
+_CACHE_STATE = {"evicted": False}
+
+def cache_key(model, prompt, schema):
+    """Hash nội dung request: đổi model, prompt hay schema đều ra key khác"""
+    payload = json.dumps([model, prompt, schema], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _cache_path(key):
+    return LLM_CACHE_DIR / key[:2] / f"{key}.json"
+
+def _cache_expired(created, ttl_days=None):
+    ttl_days = LLM_CACHE_TTL_DAYS if ttl_days is None else ttl_days
+    return ttl_days > 0 and time.time() - created > ttl_days * 86400
+
+def cache_get(key):
+    """Text response đã cache, None nếu chưa có / hết hạn / hỏng"""
+    path = _cache_path(key)
+    try:
+        entry = json.loads(path.read_bytes())
+    except (FileNotFoundError, ValueError):
+        return None
+    if _cache_expired(entry.get("created", 0)):
+        return None
+    # mtime = lần dùng gần nhất, evict_llm_cache xoá entry cũ nhất trước
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry.get("text")
+
+def cache_put(key, model, stage, text):
+    entry = {"model": model, "stage": stage, "created": time.time(), "text": text}
+    path = _cache_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_bytes(path, json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+    # Dọn cache 1 lần mỗi process, ở lần ghi đầu tiên (quét cả thư mục)
+    if not _CACHE_STATE["evicted"]:
+        _CACHE_STATE["evicted"] = True
+        evict_llm_cache()
+
+def evict_llm_cache(max_mb=None, ttl_days=None):
+    """
+    Xoá entry hết hạn, sau đó xoá entry lâu không dùng nhất tới khi dung lượng <= max_mb.
+
+    Returns:
+        int: số entry đã xoá
+    """
+    max_bytes = (LLM_CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    with _CACHE_LOCK:
+        entries = []
+        removed = 0
+        for path in LLM_CACHE_DIR.glob("*/*.json"):
+            try:
+                stat = path.stat()
+                # Tuổi entry tính theo field created (mtime bị cache_get làm mới)
+                if _cache_expired(json.loads(path.read_bytes()).get("created", 0), ttl_days):
+                    path.unlink()
+                    removed += 1
+                    continue
+            except (OSError, ValueError):
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+# =========================== METRICS ===========================
+
+class LLMCallMetric(NamedTuple):
+    stage: str
+    attempt: int
+    ok: bool
+    latency: float              # giây, chỉ tính thời gian request (không tính chờ rate limit)
+    rate_limit_wait: float
+    status: Optional[int]       # HTTP status khi lỗi API
+    prompt_tokens: int
+    output_tokens: int
+    cached: bool = False        # trả từ cache, không gửi request
+
+_METRICS = []
+_METRICS_LOCK = threading.Lock()
+
+def _record_metric(metric):
+    with _METRICS_LOCK:
+        _METRICS.append(metric)
+    # Mỗi lần thử cũng là 1 span "llm" trong run report (gắn theo target của context hiện tại)
+    run_report.record("llm", metric.latency, **metric._asdict())
+
+def llm_metrics():
+    """Bản sao danh sách metrics của mọi call trong process"""
+    with _METRICS_LOCK:
+        return list(_METRICS)
+
+def reset_llm_metrics():
+    with _METRICS_LOCK:
+        _METRICS.clear()
+
+def llm_metrics_summary(metrics=None):
+    """Gom metrics theo stage: số call, lỗi, latency, thời gian chờ, token"""
+    summary = {}
+    for metric in llm_metrics() if metrics is None else metrics:
+        stage = summary.setdefault(metric.stage, {
+            "calls": 0, "errors": 0, "latency_total": 0.0, "latency_max": 0.0,
+            "rate_limit_wait": 0.0, "prompt_tokens": 0, "output_tokens": 0, "cache_hits": 0,
+        })
+        if metric.cached:
+            stage["cache_hits"] += 1
+            continue
+        stage["calls"] += 1
+        stage["errors"] += not metric.ok
+        stage["latency_total"] += metric.latency
+        stage["latency_max"] = max(stage["latency_max"], metric.latency)
+        stage["rate_limit_wait"] += metric.rate_limit_wait
+        stage["prompt_tokens"] += metric.prompt_tokens
+        stage["output_tokens"] += metric.output_tokens
+    return summary
+
+def print_llm_metrics():
+    summary = llm_metrics_summary()
+    if not summary:
+        return
+    print("\n📈 LLM metrics:")
+    for stage, stats in summary.items():
+        print(f"   {stage:12s} {stats['calls']} call ({stats['errors']} lỗi), "
+              f"latency {stats['latency_total']:.1f}s (max {stats['latency_max']:.1f}s), "
+              f"chờ rate limit {stats['rate_limit_wait']:.1f}s, "
+              f"token {stats['prompt_tokens']:,} in / {stats['output_tokens']:,} out, "
+              f"{stats['cache_hits']} cache hit")
+
+# =========================== GENERATE ===========================
+
+def generate_json(model, prompt, response_model, stage="llm", max_attempts=None, refresh=False):
+    """
+    Gọi generate_content với JSON schema của response_model (pydantic) và validate kết quả.
+    Lỗi mạng/5xx/429/JSON sai schema được retry với backoff; lỗi 4xx khác raise ngay.
+    Response hợp lệ được cache; refresh=True bỏ qua cache khi đọc (vẫn ghi kết quả mới),
+    vd khi caller muốn hỏi lại vì kết quả trước bị cắt cụt.
+
+    Returns:
+        response_model: kết quả đã validate
+    """
+    max_attempts = max_attempts or LLM_MAX_ATTEMPTS
+    schema = response_model.model_json_schema()
+    key = cache_key(model, prompt, schema) if LLM_CACHE_ENABLED or LLM_OFFLINE else None
+
+    if key and (LLM_OFFLINE or not refresh):
+        text = cache_get(key)
+        if text is not None:
+            try:
+                result = response_model.model_validate_json(text)
+            except ValueError:
+                result = None
+            if result is not None:
+                _record_metric(LLMCallMetric(stage, 0, True, 0.0, 0.0, None, 0, 0, cached=True))
+                return result
+    if LLM_OFFLINE:
+        raise LLMCacheMiss(f"[{stage}] Offline mode: không có response trong cache ({key[:12]})")
+
+    client = get_client()
+
+    for attempt in range(max_attempts):
+        waited = acquire_rate_limit()
+        start = time.perf_counter()
+        usage = None
+        try:
+            response = client.models.generate_content(
+                model=model,
+                contents=prompt,
+                config={
+                    "response_mime_type": "application/json",
+                    "response_json_schema": schema,
+                },
+            )
+            usage = response.usage_metadata
+            result = response_model.model_validate_json(response.text)
+        except Exception as e:
+            status = _error_status(e)
+            _record_metric(LLMCallMetric(
+                stage, attempt, False, time.perf_counter() - start, waited, status,
+                getattr(usage, "prompt_token_count", None) or 0, getattr(usage, "candidates_token_count", None) or 0,
+            ))
+            if status in NON_RETRYABLE_STATUS or attempt == max_attempts - 1:
+                raise
+            delay = backoff_delay(attempt, retry_after_seconds(e))
+            print(f"   ⚠️ [{stage}] Lỗi (lần {attempt + 1}/{max_attempts}): {e}")
+            print(f"   ⏳ Đợi {delay:.1f}s trước khi thử lại...")
+            time.sleep(delay)
+            continue
+
+        _record_metric(LLMCallMetric(
+            stage, attempt, True, time.perf_counter() - start, waited, None,
+            getattr(usage, "prompt_token_count", None) or 0, getattr(usage, "candidates_token_count", None) or 0,
+        ))
+        if key:
+            cache_put(key, model, stage, response.text)
+        return result
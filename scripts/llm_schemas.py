@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Schema (pydantic) các response JSON của Gemini trong ranking_pipeline
+
+Tách riêng để chỉ import pydantic khi thật sự gọi LLM (các hàm LLM trong ranking_pipeline
+import module này bên trong hàm).
+"""
+
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class BrainstormResponse(BaseModel):
+    words: List[str] = Field(description="List of brainstormed words")
+
+class WordScore(BaseModel):
+    w: str = Field(description="The candidate word")
+    s: int = Field(description="Relevance score (0-100)")
+
+class RankingResponse(BaseModel):
+    items: List[WordScore] = Field(description="List of ranked words with scores")
+
+class DailyTargetResponse(BaseModel):
+    targets: List[str] = Field(description="Candidate Vietnamese target words for today's game, best first (no underscores, just spaces)")
+
+class HintSelection(BaseModel):
+    word: str = Field(description="The selected hint word")
+    rank: int = Field(description="The rank of the selected word")
+
+class HintResponse(BaseModel):
+    hints: List[HintSelection] = Field(description="List of selected hints for each range")
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+Phần lõi nhẹ của ranking_pipeline: chuẩn hoá tiếng Việt, vocab, lọc từ rác, RRF fusion, đọc/ghi file.
+
+Chỉ dùng thư viện chuẩn + numpy, không import sentence_transformers (torch) / google.genai / pydantic,
+nên các tool chỉ cần vài hàm tiện ích import rất nhanh:
+
+    from pipeline_core import remove_vietnamese_accents, is_valid_candidate, get_existing_keywords
+
+ranking_pipeline.py import lại toàn bộ các tên ở đây (ranking_pipeline.is_valid_candidate vẫn dùng được),
+phần nặng (embedding model, Gemini) chỉ load khi thật sự chạy tới.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+import run_report
+from game_format import HEAD_SUFFIX, RANK_ORDER_SUFFIX, SHARED_VOCAB_FILE, TAIL_SUFFIX
+from game_pack import PACK_FILE, append_game
+from rank_loader import add_game, get_keywords, is_game_file
+from vietnamese_fold import TONE_PLACEMENT
+
+# =========================== CẤU HÌNH ===========================
+
+INPUT_FOLDER = "pre_rerank"
+OUTPUT_FOLDER = "output"
+K_RRF = 60
+
+# Đường dẫn đến thư mục contexto trong project
+CONTEXTO_DIR = Path(__file__).parent.parent / "lib" / "contexto"
+
+# Định dạng game có thể công bố vào lib/contexto -> hậu tố file, theo thứ tự sao chép
+# (tail trước head: server thấy head thì tail đã có)
+PUBLISHED_SUFFIXES = {
+    "json": (".json",),
+    "bin": (".bin",),
+    "words": (RANK_ORDER_SUFFIX,),
+    "tiers": (TAIL_SUFFIX, HEAD_SUFFIX),
+}
+
+# =========================== CHUẨN HOÁ + VOCAB ===========================
+
+def remove_vietnamese_accents(text):
+    text = text.replace("đ", "d").replace("Đ", "D")
+    normalized = unicodedata.normalize('NFD', text)
+    return "".join([c for c in normalized if unicodedata.category(c) != 'Mn'])
+
+def target_slug(target_word):
+    """bác sĩ -> bac_si (tên file game, tên thư mục checkpoint của batch mode)"""
+    return remove_vietnamese_accents(target_word.replace(" ", "_"))
+
+def normalize_vietnamese_diacritics(text):
+    """
+    Chuẩn hóa dấu tiếng Việt từ kiểu mới sang kiểu cũ.
+    LLM thường dùng kiểu mới (khóa, hóa), nhưng từ điển dùng kiểu cũ (khoá, hoá).
+    
+    Quy tắc: Dấu đặt trên nguyên âm đầu của nhị trùng âm (oa, oe, uy)
+    Lưu ý: KHÔNG áp dụng cho "ui" vì túi, bụi đã đúng
+
+    Bảng thay thế: "tone_placement" trong lib/vietnameseFold.json (dùng chung với server).
+    So khớp từ người chơi đoán dùng fold_vietnamese (thêm chữ thường, "_", i/y cuối âm tiết).
+    """
+    result = text
+    for old, new in TONE_PLACEMENT:
+        result = result.replace(old, new)
+    return result
+
+def load_vocab():
+    # Tìm file clean_dict.pkl ở nhiều vị trí
+    possible_paths = [
+        "clean_dict.pkl",                    # Chạy từ scripts/
+        "../clean_dict.pkl",                 # Chạy từ thư mục con
+        Path(__file__).parent / "clean_dict.pkl",  # Cùng thư mục với script
+    ]
+    
+    with run_report.span("vocab_load") as span_attrs:
+        for path in possible_paths:
+            try:
+                with open(path, "rb") as f:
+                    vocab = pickle.load(f)
+                    print(f"✅ Loaded vocab from: {path}")
+                    span_attrs["words"] = len(vocab)
+                    return vocab
+            except FileNotFoundError:
+                continue
+    
+    print("⚠️  Không tìm thấy clean_dict.pkl ở bất kỳ vị trí nào, dùng vocab demo")
+    return ["bác_sĩ", "y_tá", "bệnh_viện"] * 10000
+
+def vocab_fingerprint(vocab):
+    """Hash nội dung + thứ tự vocab, dùng để kiểm tra cache theo vocab còn hợp lệ"""
+    return hashlib.sha1("\n".join(vocab).encode("utf-8")).hexdigest()
+
+def get_existing_keywords():
+    """
+    Danh sách từ khóa đã có, đọc từ index lib/contexto/rankIndex.json (không quét thư mục,
+    không parse file game). Chưa có index -> chỉ đọc phần đầu mỗi file game tới hết "keyword".
+    """
+    if not CONTEXTO_DIR.exists():
+        print(f"⚠️  Thư mục {CONTEXTO_DIR} không tồn tại")
+        return []
+
+    return get_keywords(CONTEXTO_DIR)
+
+# =========================== LỌC TỪ RÁC ===========================
+
+# Danh sách từ rác (Token đơn) bị bóc khỏi đầu từ ghép
+NOISE_TOKENS = {
+    # Lượng từ
+    "các", "những", "một", "mọi", "mỗi", "từng", "mấy", "vài", "bọn", "nhóm",
+    # Loại từ
+    "cái", "con", "chiếc", "người", "nhà", "ông", "bà", "cô", "chú", "anh", "chị", "thằng", "tên", "gã", "viên", "ngài",
+    # Danh từ trừu tượng hóa (Thủ phạm của 'lực lượng', 'ngành', 'hệ thống')
+    "việc", "sự", "cục", "hội", "ngành", "giới", "ban", "sở", "bộ",
+    "lực", "lượng", "hệ", "thống", "trình", "độ", "công", "tác", "chuyên", "môn"
+}
+
+# Từ rác bị bóc khỏi cuối từ ghép
+NOISE_SUFFIXES = {"này", "kia", "đó", "nọ", "ấy", "gì", "đâu", "ư", "nhỉ", "nhé", "hả", "của"}
+
+def peel_noise_tokens(word):
+    """Bóc hết các lớp từ rác ở đầu (NOISE_TOKENS) rồi ở cuối (NOISE_SUFFIXES), trả về lõi"""
+    tokens = word.split('_')
+    start, end = 0, len(tokens)
+
+    # Bóc từ đầu (Prefix)
+    while start < end and tokens[start] in NOISE_TOKENS:
+        start += 1
+
+    # Bóc từ cuối (Suffix)
+    while end > start and tokens[end - 1] in NOISE_SUFFIXES:
+        end -= 1
+
+    return "_".join(tokens[start:end])
+
+def is_valid_candidate(candidate_word, target_word):
+    """
+    Kiểm tra từ hợp lệ (Phiên bản Bóc Vỏ Hành - Peeling Loop).
+    Logic: Bóc hết các lớp từ rác ở đầu/cuối đi.
+    Nếu lõi còn lại == target -> LOẠI.
+    """
+
+    # 1. Loại chính nó
+    if candidate_word == target_word:
+        return False
+
+    # 2. Nếu từ không chứa target thì giữ lại
+    if target_word not in candidate_word:
+        return True
+
+    # 3. Kiểm tra lõi còn lại sau khi bóc vỏ
+    remaining_word = peel_noise_tokens(candidate_word)
+
+    # Nếu sau khi bóc hết vỏ mà lõi chính là Target -> RÁC (LOẠI)
+    if remaining_word == target_word:
+        return False
+
+    # Nếu bóc hết sạch sành sanh (rỗng) -> RÁC (LOẠI)
+    if not remaining_word:
+        return False
+
+    return True
+
+def build_noise_filter_index(vocab):
+    """
+    Bóc vỏ toàn bộ vocab 1 lần: lõi -> các vocab id có lõi đó.
+    Chỉ lưu các từ có vỏ (lõi khác chính nó), lõi rỗng lưu ở key "".
+    Kèm "exact": từ -> các vocab id của chính từ đó (từ có thể lặp lại trong vocab).
+    """
+    peeled = {}
+    exact = {}
+    for idx, word in enumerate(vocab):
+        exact.setdefault(word, []).append(idx)
+        core = peel_noise_tokens(word)
+        if core != word:
+            peeled.setdefault(core, []).append(idx)
+
+    return {
+        "fingerprint": vocab_fingerprint(vocab),
+        "peeled": {core: np.array(ids, dtype=np.int64) for core, ids in peeled.items()},
+        "exact": exact,
+    }
+
+def invalid_candidate_ids(noise_index, vocab, target_word):
+    """
+    Các vocab id bị is_valid_candidate loại với target này, chỉ tốn O(số từ khớp):
+    chính target, các từ có lõi == target, các từ lõi rỗng có chứa target.
+    """
+    peeled = noise_index["peeled"]
+    no_ids = np.empty(0, dtype=np.int64)
+    invalid = set(peeled.get(target_word, no_ids).tolist())
+    invalid.update(idx for idx in peeled.get("", no_ids).tolist() if target_word in vocab[idx])
+    # Chính target (có thể lặp lại trong vocab)
+    invalid.update(noise_index["exact"].get(target_word, ()))
+
+    return np.array(sorted(invalid), dtype=np.int64)
+
+# =========================== FUSION ===========================
+
+def fuse_rank_arrays(rank_arrays, weights, k_rrf=K_RRF):
+    """
+    Reciprocal Rank Fusion trên các rank array cùng căn theo vocab id.
+
+    score[i] = sum_m weight_m / (k_rrf + rank_m[i]), cộng theo đúng thứ tự model
+    để giống hệt từng bit với cách tính từng từ bằng Python.
+    """
+    scores = np.zeros(len(rank_arrays[0]), dtype=np.float64)
+    for ranks, weight in zip(rank_arrays, weights):
+        scores += weight * (1 / (k_rrf + ranks.astype(np.float64)))
+    return scores
+
+def unique_vocab_ids(vocab):
+    """Vocab id đại diện cho mỗi từ (từ lặp lại lấy lần xuất hiện cuối, như dict(zip(vocab, ...)))"""
+    word_ids = {word: idx for idx, word in enumerate(vocab)}
+    if len(word_ids) == len(vocab):
+        return np.arange(len(vocab))
+    return np.sort(np.fromiter(word_ids.values(), dtype=np.int64, count=len(word_ids)))
+
+def merge_llm_ranking(target_word, sorted_items, combined_candidates, llm_results):
+    """
+    Ghép rank cuối: target ở rank 1, tiếp theo các từ LLM chấm (điểm giảm dần),
+    sau cùng là phần còn lại theo thứ tự embedding.
+
+    Returns:
+        dict: {từ: rank}
+    """
+    final_rank_map = {}
+    current_rank = 1
+
+    # Luôn giữ Target ở Rank 1
+    final_rank_map[target_word] = current_rank
+    current_rank += 1
+
+    # A. Xử lý phần đầu (LLM)
+    processed_words_set = set()
+    # Chỉ chấp nhận từ do LLM trả về nếu nằm trong danh sách ứng viên
+    combined_set = set(combined_candidates)
+
+    if llm_results:
+        sorted_llm = sorted(llm_results, key=lambda x: x.s, reverse=True)
+
+        for item in sorted_llm:
+            if item.w == target_word:
+                continue
+            # Bỏ qua từ không nằm trong danh sách ứng viên để tránh LLM bịa thêm
+            if item.w not in combined_set:
+                continue
+            # Bỏ qua từ đã được xử lý (tránh duplicate)
+            if item.w in processed_words_set or item.w in final_rank_map:
+                continue
+            final_rank_map[item.w] = current_rank
+            processed_words_set.add(item.w)
+            current_rank += 1
+    else:
+        print("   ⚠️ LLM Re-rank thất bại. Sẽ dùng thứ tự gốc.")
+
+    # B. Xử lý phần đuôi (Embedding + Fallback)
+    for w, old_rank in sorted_items:
+        if w == target_word:
+            continue
+        # Bỏ qua từ đã được xử lý (tránh duplicate)
+        if w in final_rank_map or w in processed_words_set:
+            continue
+        final_rank_map[w] = current_rank
+        current_rank += 1
+
+    return final_rank_map
+
+# =========================== FILE I/O ===========================
+
+def save_rrf_ranking(target_word, rrf_ranking):
+    """
+    Lưu kết quả RRF (trước re-rank) vào INPUT_FOLDER.
+
+    Returns:
+        tuple: (đường dẫn file, rank_map)
+    """
+    target_word_underscore = target_word.replace(" ", "_")
+
+    # Tạo rank_map
+    rank_map = {}
+    rank_map[target_word] = 1
+
+    for rank, word in enumerate(rrf_ranking, start=2):
+        rank_map[word.replace("_", " ")] = rank
+
+    # Lưu file JSON
+    output_data = {
+        "keyword": target_word,
+        "rank_map": rank_map
+    }
+
+    os.makedirs(INPUT_FOLDER, exist_ok=True)
+    intermediate_file = f"{INPUT_FOLDER}/{remove_vietnamese_accents(target_word_underscore)}.json"
+    with run_report.span("write", file=intermediate_file) as span_attrs:
+        with open(intermediate_file, "w", encoding="utf-8") as f:
+            json.dump(output_data, f, ensure_ascii=False, separators=(',', ':'))
+        span_attrs["bytes"] = os.path.getsize(intermediate_file)
+
+    return intermediate_file, rank_map
+
+def save_to_contexto_and_update_loader(output_file, target_word, outputs=("json",)):
+    """
+    Công bố game vào lib/contexto và thêm game vào rankLoader.json
+
+    Args:
+        output_file: file JSON của game trong OUTPUT_FOLDER (các định dạng khác nằm cạnh, cùng tên)
+        outputs: định dạng công bố (GAME_OUTPUTS của ranking_pipeline.py, xem PUBLISHED_SUFFIXES).
+            Không có .bin -> luôn công bố JSON (game phải có 1 file server đọc được đầy đủ).
+            File của game ở định dạng không công bố lần này bị xoá (không để sidecar cũ lệch game mới).
+    """
+    print("\n📦 Đang lưu vào lib/contexto...")
+    
+    # Tạo slug từ target_word (bác sĩ -> bac_si)
+    slug = target_slug(target_word)
+    source_base = os.path.splitext(output_file)[0]
+    
+    published = set(outputs)
+    if "bin" not in published or not os.path.exists(source_base + ".bin"):
+        published.add("json")
+
+    # Sao chép theo thứ tự của PUBLISHED_SUFFIXES (tail trước head)
+    import shutil
+    try:
+        for fmt, suffixes in PUBLISHED_SUFFIXES.items():
+            for suffix in suffixes:
+                source = source_base + suffix
+                dest = CONTEXTO_DIR / f"{slug}{suffix}"
+                if fmt in published and os.path.exists(source):
+                    with run_report.span("write", file=str(dest), bytes=os.path.getsize(source)):
+                        shutil.copy2(source, dest)
+                    print(f"   ✅ Đã lưu: {dest}")
+                elif fmt not in published and dest.exists():
+                    dest.unlink()
+                    print(f"   🗑️  Đã xoá bản cũ: {dest}")
+    except Exception as e:
+        print(f"   ❌ Lỗi khi sao chép file: {e}")
+        return False
+    
+    # Cập nhật rankLoader.json + rankIndex.json
+    print("\n🔄 Đang cập nhật rankLoader.json...")
+    try:
+        with run_report.span("rank_loader_update"):
+            game_id, is_new = add_game(slug, target_word, CONTEXTO_DIR)
+        print(f"   ✅ {'Thêm' if is_new else 'Cập nhật'}: #{game_id} - {slug}")
+    except Exception as e:
+        print(f"   ❌ Lỗi khi cập nhật rankLoader.json: {e}")
+        return False
+
+    # Đã dựng games.pack (build_game_pack.py) -> thêm game vào pack. Lỗi ở đây không làm hỏng game:
+    # server không thấy slug trong pack thì đọc file riêng của game
+    pack_path = CONTEXTO_DIR / PACK_FILE
+    if pack_path.exists():
+        try:
+            with run_report.span("pack_append", file=str(pack_path)) as span_attrs:
+                span_attrs["bytes"] = append_game(
+                    pack_path, slug, game_id, CONTEXTO_DIR / f"{slug}.json", CONTEXTO_DIR / SHARED_VOCAB_FILE
+                )
+            print(f"   ✅ Đã thêm vào {PACK_FILE} ({span_attrs['bytes'] / 1024 / 1024:.1f} MB)")
+        except Exception as e:
+            print(f"   ⚠️  Không thêm được vào {PACK_FILE}: {e}")
+    return True
+
+def load_batch_targets(targets=None, from_dir=None):
+    """
+    Gom danh sách target cho batch mode: từ tham số dòng lệnh và/hoặc
+    field "keyword" của các file JSON trong 1 thư mục (vd: pre_rerank/).
+    Bỏ trùng, giữ thứ tự.
+    """
+    collected = [normalize_vietnamese_diacritics(t.lower().strip()) for t in targets or []]
+
+    if from_dir:
+        for json_file in sorted(f for f in Path(from_dir).glob("*.json") if is_game_file(f)):
+            try:
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    keyword = json.load(f).get("keyword", "")
+            except Exception as e:
+                print(f"   ⚠️  Bỏ qua {json_file.name}: {e}")
+                continue
+            if keyword:
+                collected.append(keyword)
+
+    return list(dict.fromkeys(t.replace("_", " ") for t in collected if t))
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Quản lý rankLoader.json + index phụ của các game Contexto (dùng trong process, không cần subprocess)
+
+    lib/contexto/rankLoader.json   # {id: {slug, createdAt}} - API public, giữ nguyên format cũ
+    lib/contexto/rankIndex.json    # {"version", "games": {slug: {id, createdAt, keyword, size, sha1}}}
+
+Thêm 1 game chỉ đọc/ghi 2 file nhỏ này (không glob thư mục, không stat các game khác),
+cả 2 đều được ghi atomic. Nếu chưa có rankIndex.json, index được dựng lại 1 lần từ rankLoader.json.
+
+File chính của 1 game (size / sha1 / keyword trong index) là <slug>.json nếu có (game cũ), ngược lại
+<slug>.bin (game mới chỉ công bố .bin, xem game_format.py).
+"""
+
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from game_format import HEAD_SUFFIX, TAIL_SUFFIX, atomic_write_bytes, parse_game_header
+from vietnamese_fold import FOLD_INDEX_FILE
+
+CONTEXTO_DIR = Path(__file__).parent.parent / "lib" / "contexto"
+
+RANK_LOADER_FILE = "rankLoader.json"
+RANK_INDEX_FILE = "rankIndex.json"
+RANK_INDEX_VERSION = 1
+
+# Các file .json trong lib/contexto không phải game
+NON_GAME_FILES = {RANK_LOADER_FILE, RANK_INDEX_FILE, FOLD_INDEX_FILE}
+
+# Vietnam timezone (UTC+7)
+VIETNAM_TZ = timezone(timedelta(hours=7))
+
+
+def is_game_file(path):
+    """File game .json đầy đủ (không phải rankLoader / index / sidecar, không phải phần head/tail)"""
+    name = Path(path).name
+    return name.endswith(".json") and name not in NON_GAME_FILES and not name.endswith((HEAD_SUFFIX, TAIL_SUFFIX))
+
+
+def game_files(contexto_dir=CONTEXTO_DIR):
+    """
+    File chính của tất cả game trong thư mục, mỗi slug 1 file theo cùng quy tắc với game_file
+    (.json nếu có, ngược lại .bin). Chỉ dùng khi dựng lại toàn bộ.
+    """
+    contexto_dir = Path(contexto_dir)
+    files = {f.stem: f for f in contexto_dir.glob("*.bin")}
+    files.update((f.stem, f) for f in contexto_dir.glob("*.json") if is_game_file(f))
+    return sorted(files.values())
+
+
+def game_file(slug, contexto_dir=CONTEXTO_DIR):
+    """File chính của game: <slug>.json nếu có, ngược lại <slug>.bin, None nếu không có cả 2"""
+    for suffix in (".json", ".bin"):
+        path = Path(contexto_dir) / f"{slug}{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def game_created_at(timestamp=None):
+    """
+    Ngày hiển thị của game (YYYY-MM-DD, giờ Việt Nam).
+    Pipeline chạy lúc 23:30 ngày hôm trước nên cộng thêm 1 ngày.
+    """
+    created = datetime.fromtimestamp(timestamp, tz=VIETNAM_TZ) if timestamp else datetime.now(VIETNAM_TZ)
+    return (created + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+# Game do pipeline ghi luôn có "keyword" là key đầu tiên
+_KEYWORD_PREFIX = re.compile(rb'\s*\{\s*"keyword"\s*:\s*')
+
+
+def read_game_keyword(game_file, chunk_size=4096):
+    """
+    Đọc field "keyword" của 1 game mà không parse cả file (~1.7 MB): chỉ đọc tới hết giá trị keyword.
+    File có key khác đứng trước (vd: sửa bằng tay) -> fallback json.load cả file.
+    """
+    decoder = json.JSONDecoder()
+    with open(game_file, "rb") as f:
+        head = b""
+        while True:
+            chunk = f.read(chunk_size)
+            head += chunk
+            match = _KEYWORD_PREFIX.match(head)
+            if match:
+                # Chunk có thể cắt giữa 1 ký tự UTF-8 -> bỏ phần lẻ, chưa đủ chuỗi thì đọc tiếp
+                try:
+                    keyword, _ = decoder.raw_decode(head[match.end():].decode("utf-8", errors="ignore"))
+                    return keyword if isinstance(keyword, str) else ""
+                except json.JSONDecodeError:
+                    pass
+            elif len(head) >= 64:
+                break
+            if not chunk:
+                break
+
+    try:
+        with open(game_file, "r", encoding="utf-8") as f:
+            return json.load(f).get("keyword", "")
+    except ValueError:
+        return ""
+
+
+def _write_json(path, data):
+    atomic_write_bytes(path, json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+# =========================== ĐỌC ===========================
+
+def load_rank_loader(contexto_dir=CONTEXTO_DIR):
+    """rankLoader.json -> {id (str): {"slug", "createdAt"}}"""
+    try:
+        with open(Path(contexto_dir) / RANK_LOADER_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def load_rank_index(contexto_dir=CONTEXTO_DIR):
+    """
+    rankIndex.json -> {slug: {"id", "createdAt", "keyword", "size", "sha1"}}.
+    Dựng lại từ rankLoader.json nếu chưa có hoặc không đọc được.
+    """
+    try:
+        with open(Path(contexto_dir) / RANK_INDEX_FILE, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") == RANK_INDEX_VERSION:
+            return index["games"]
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return rebuild_rank_index(contexto_dir)
+
+
+def get_keywords(contexto_dir=CONTEXTO_DIR):
+    """
+    Keyword của tất cả game theo thứ tự id, lấy từ rankIndex.json.
+    Chưa có index -> đọc keyword từ đầu từng file game trong rankLoader.json
+    (index sẽ được tạo ở lần add_game tiếp theo).
+    """
+    contexto_dir = Path(contexto_dir)
+    if (contexto_dir / RANK_INDEX_FILE).exists():
+        games = sorted(load_rank_index(contexto_dir).values(), key=lambda entry: entry["id"])
+        return [entry["keyword"] for entry in games]
+
+    keywords = []
+    for _, entry in sorted(load_rank_loader(contexto_dir).items(), key=lambda item: int(item[0])):
+        path = game_file(entry["slug"], contexto_dir)
+        if path is not None:
+            keywords.append(game_keyword(path) or entry["slug"].replace("_", " "))
+    return keywords
+
+
+def game_keyword(path):
+    """Keyword của file chính của game (.json: đầu file, .bin: header)"""
+    if Path(path).suffix == ".bin":
+        with open(path, "rb") as f:
+            try:
+                return parse_game_header(f.read())["keyword"]
+            except (ValueError, UnicodeDecodeError):
+                return ""
+    return read_game_keyword(path)
+
+
+# =========================== GHI ===========================
+
+def game_entry(path, game_id, created_at, keyword=None):
+    """Entry trong index của 1 game (keyword + size + hash của file chính)"""
+    data = Path(path).read_bytes()
+    if keyword is None:
+        keyword = game_keyword(path)
+    return {
+        "id": game_id,
+        "createdAt": created_at,
+        # Không đọc được keyword -> dùng slug (bac_si -> bac si)
+        "keyword": keyword or Path(path).stem.replace("_", " "),
+        "size": len(data),
+        "sha1": hashlib.sha1(data).hexdigest(),
+    }
+
+
+def save_rank_index(games, contexto_dir=CONTEXTO_DIR):
+    """Ghi rankLoader.json + rankIndex.json từ index {slug: entry}"""
+    contexto_dir = Path(contexto_dir)
+    ordered = sorted(games.items(), key=lambda item: item[1]["id"])
+    rank_loader = {str(entry["id"]): {"slug": slug, "createdAt": entry["createdAt"]} for slug, entry in ordered}
+
+    _write_json(contexto_dir / RANK_INDEX_FILE, {"version": RANK_INDEX_VERSION, "games": dict(ordered)})
+    _write_json(contexto_dir / RANK_LOADER_FILE, rank_loader)
+
+
+def rebuild_rank_index(contexto_dir=CONTEXTO_DIR):
+    """
+    Dựng index từ rankLoader.json (đọc từng game được liệt kê).
+    Game không còn file vẫn giữ entry (size / sha1 = None) để id public không bị mất
+    khi rankLoader.json được ghi lại.
+    """
+    contexto_dir = Path(contexto_dir)
+    games = {}
+    missing = []
+    for game_id, entry in sorted(load_rank_loader(contexto_dir).items(), key=lambda item: int(item[0])):
+        slug = entry["slug"]
+        path = game_file(slug, contexto_dir)
+        if path is not None:
+            games[slug] = game_entry(path, int(game_id), entry["createdAt"])
+        else:
+            missing.append(slug)
+            games[slug] = {
+                "id": int(game_id),
+                "createdAt": entry["createdAt"],
+                "keyword": slug.replace("_", " "),
+                "size": None,
+                "sha1": None,
+            }
+
+    if missing:
+        print(f"⚠️  {len(missing)} game trong {RANK_LOADER_FILE} không có file .json / .bin "
+              f"(giữ nguyên id): {', '.join(missing)}")
+
+    if games:
+        _write_json(contexto_dir / RANK_INDEX_FILE, {"version": RANK_INDEX_VERSION, "games": games})
+    return games
+
+
+def add_game(slug, keyword=None, contexto_dir=CONTEXTO_DIR, created_at=None):
+    """
+    Thêm (hoặc cập nhật size/hash nếu slug đã có) 1 game vào rankLoader.json + index.
+
+    Returns:
+        tuple: (id, True nếu là game mới)
+    """
+    contexto_dir = Path(contexto_dir)
+    games = load_rank_index(contexto_dir)
+
+    existing = games.get(slug)
+    if existing:
+        game_id, is_new = existing["id"], False
+        created_at = existing["createdAt"]
+    else:
+        game_id, is_new = max((entry["id"] for entry in games.values()), default=0) + 1, True
+        created_at = created_at or game_created_at()
+
+    path = game_file(slug, contexto_dir)
+    if path is None:
+        raise FileNotFoundError(f"Không có {slug}.json / {slug}.bin trong {contexto_dir}")
+    games[slug] = game_entry(path, game_id, created_at, keyword)
+    save_rank_index(games, contexto_dir)
+    return game_id, is_new
@@ -7,18 +7,31 @@ Adapted for GitHub Actions - Runs daily at 12:00
 import pickle
 import numpy as np
 import json
-import faiss
 import os
 import sys
-import unicodedata
 import time
-import subprocess
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
-from google import genai
-from pydantic import BaseModel, Field
-from typing import List
+import llm_client
+import checkpoint
+import run_report
+from typing import NamedTuple
+from concurrent.futures import Future, ThreadPoolExecutor
 import glob
+import contextvars
+from game_format import (
+    CODECS, HEAD_RANKS, SHARED_VOCAB_FILE, atomic_write_bytes, rank_order_path, tier_paths, write_game_binary,
+    write_game_tiers, write_rank_order,
+)
+from pipeline_core import (
+    CONTEXTO_DIR, INPUT_FOLDER, K_RRF, NOISE_SUFFIXES, NOISE_TOKENS, OUTPUT_FOLDER,
+    build_noise_filter_index, fuse_rank_arrays, get_existing_keywords, invalid_candidate_ids,
+    is_valid_candidate, load_batch_targets, load_vocab, merge_llm_ranking, normalize_vietnamese_diacritics,
+    peel_noise_tokens, remove_vietnamese_accents, save_rrf_ranking, save_to_contexto_and_update_loader,
+    target_slug, unique_vocab_ids, vocab_fingerprint,
+)
+
+# sentence_transformers (torch), google.genai (qua llm_client) và pydantic (llm_schemas)
+# được import bên trong hàm cần chúng: import module này / chạy subcommand nhẹ không tốn vài giây load.
 
 # Force unbuffered output for GitHub Actions
 sys.stdout.reconfigure(line_buffering=True)
@@ -32,16 +45,53 @@ EMBEDDING_MODELS = {
     "vovanphuc":   {"path": "VoVanPhuc/sup-SimCSE-VietNamese-phobert-base", "weight": 1.0}
 }
 
+# INPUT_FOLDER, OUTPUT_FOLDER, K_RRF, CONTEXTO_DIR: xem pipeline_core.py
 CACHE_DIR = "model_cache"
-INPUT_FOLDER = "pre_rerank"
-OUTPUT_FOLDER = "output"
 TOP_K_RERANK = 1000
 
-# Đường dẫn đến thư mục contexto trong project
-CONTEXTO_DIR = Path(__file__).parent.parent / "lib" / "contexto"
+# Re-rank theo chunk: RERANK_CHUNK_SIZE > 0 -> chia ứng viên thành các chunk (mỗi chunk <= RERANK_CHUNK_SIZE từ)
+# chấm điểm song song; RERANK_ANCHORS từ mốc có mặt trong mọi chunk để quy điểm các chunk về cùng thang.
+# 0 (mặc định): gửi toàn bộ danh sách trong 1 prompt.
+RERANK_CHUNK_SIZE = int(os.environ.get('RERANK_CHUNK_SIZE', '0'))
+RERANK_ANCHORS = 24
+RERANK_MIN_COVERAGE = 0.8   # Chunk trả về ít hơn tỉ lệ này số từ (bị cắt cụt) -> chấm lại chunk đó
+
+# Định dạng lưu embeddings vocab trong model_cache:
+#   float32 (mặc định) | float16 | int8 (kèm scale float32 cho mỗi dòng)
+# Các file đều được mở bằng mmap, tính score theo từng khối EMBEDDING_CHUNK_ROWS dòng.
+EMBEDDING_STORAGE = os.environ.get('EMBEDDING_STORAGE', 'float32')
+EMBEDDING_STORAGES = ("float32", "float16", "int8")
+EMBEDDING_CHUNK_ROWS = 65536
+# Cache cũ chưa có manifest: encode lại mẫu dòng (ngẫu nhiên + cuối vocab) và so cosine với cache
+LEGACY_CHECK_SAMPLE = 256
+LEGACY_CHECK_TAIL = 64
+LEGACY_CHECK_MIN_COSINE = 0.99
+
+# Chạy song song các embedding model (mỗi model 1 worker process).
+# RANKING_WORKERS <= 1: chạy tuần tự trong process chính.
+# RANKING_THREADS_PER_WORKER: số thread torch/BLAS tối đa mỗi worker (tránh tranh core).
+RANKING_WORKERS = int(os.environ.get('RANKING_WORKERS', '1'))
+RANKING_THREADS_PER_WORKER = int(os.environ.get('RANKING_THREADS_PER_WORKER', '0')) or None
+
+# Định dạng game công bố vào lib/contexto (phân cách bằng dấu phẩy). File JSON (rank_map) luôn được ghi
+# vào OUTPUT_FOLDER; lib/contexto chỉ nhận các định dạng liệt kê ở đây (không có bin -> JSON):
+#   bin: rank array theo vocab id + vocab chung (xem game_format.py) - mặc định, ~0.35 MB/game
+#   json: <slug>.json như các game cũ (~1.8 MB/game)
+#   words: <slug>.words.txt, danh sách từ theo rank (chỉ cần cho game JSON, .bin tự dựng trong vài ms)
+#   tiers: <slug>.head.json (GAME_HEAD_RANKS rank đầu + hints) + <slug>.tail.json, server đọc thay JSON
+#          khi game không có .bin (dùng kèm json, không kèm bin)
+GAME_OUTPUTS = [fmt.strip() for fmt in os.environ.get('GAME_OUTPUTS', 'bin').split(',') if fmt.strip()]
+GAME_HEAD_RANKS = int(os.environ.get('GAME_HEAD_RANKS', str(HEAD_RANKS)))
+GAME_BINARY_CODEC = os.environ.get('GAME_BINARY_CODEC', 'uint32')  # uint32 | varint | perm (bản lưu trữ, nhỏ nhất)
+SHARED_VOCAB_PATH = CONTEXTO_DIR / SHARED_VOCAB_FILE
+
+# Chống trùng target theo ngữ nghĩa (dùng cache embeddings vocab, không cần load model):
+# ứng viên có cosine (trung bình có trọng số giữa các model) >= ngưỡng với 1 keyword cũ bị loại.
+TARGET_DEDUP_THRESHOLD = float(os.environ.get('TARGET_DEDUP_THRESHOLD', '0.85'))
+TARGET_CANDIDATES = 5       # Số ứng viên Gemini đề xuất mỗi lần gọi
+TARGET_PROMPT_RECENT = 30   # Chỉ gửi N keyword gần nhất trong prompt (prompt không dài thêm theo số game)
 
 # API Configuration
-GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY', '')
 MODEL_NAME = "gemini-2.5-flash"
 
 # Hint ranges cho progressive hint system (dựa theo logic trong contexto API)
@@ -62,7 +112,7 @@ HINT_RANGES = [
     (2, 8)
 ]
 
-# Tìm model_cache ở nhiều vị trí có thể
+# Tìm model_cache ở nhiều vị trí có thể (log ra stderr: stdout của subcommand như keywords dùng được cho pipe)
 def get_cache_dir():
     possible_paths = [
         Path("model_cache"),                          # Chạy từ root
@@ -72,13 +122,13 @@ def get_cache_dir():
     
     for path in possible_paths:
         if path.exists():
-            print(f"✅ Sử dụng model_cache tại: {path}")
+            print(f"✅ Sử dụng model_cache tại: {path}", file=sys.stderr)
             return str(path)
     
     # Nếu không tìm thấy, tạo mới ở thư mục cha
     cache_path = Path(__file__).parent.parent / "model_cache"
     cache_path.mkdir(exist_ok=True)
-    print(f"📁 Tạo model_cache mới tại: {cache_path}")
+    print(f"📁 Tạo model_cache mới tại: {cache_path}", file=sys.stderr)
     return str(cache_path)
 
 CACHE_DIR = get_cache_dir()
@@ -88,128 +138,44 @@ os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
 # =========================== SCHEMA DEFINITIONS ===========================
 
-class BrainstormResponse(BaseModel):
-    words: List[str] = Field(description="List of brainstormed words")
-
-class WordScore(BaseModel):
-    w: str = Field(description="The candidate word")
-    s: int = Field(description="Relevance score (0-100)")
-
-class RankingResponse(BaseModel):
-    items: List[WordScore] = Field(description="List of ranked words with scores")
-
-class DailyTargetResponse(BaseModel):
-    target: str = Field(description="Vietnamese target word for today's game (no underscores, just spaces)")
-
-class HintSelection(BaseModel):
-    word: str = Field(description="The selected hint word")
-    rank: int = Field(description="The rank of the selected word")
-
-class HintResponse(BaseModel):
-    hints: List[HintSelection] = Field(description="List of selected hints for each range")
-
-# =========================== UTILS ===========================
-
-def remove_vietnamese_accents(text):
-    text = text.replace("đ", "d").replace("Đ", "D")
-    normalized = unicodedata.normalize('NFD', text)
-    return "".join([c for c in normalized if unicodedata.category(c) != 'Mn'])
-
-def normalize_vietnamese_diacritics(text):
-    """
-    Chuẩn hóa dấu tiếng Việt từ kiểu mới sang kiểu cũ.
-    LLM thường dùng kiểu mới (khóa, hóa), nhưng từ điển dùng kiểu cũ (khoá, hoá).
-    
-    Quy tắc: Dấu đặt trên nguyên âm đầu của nhị trùng âm (oa, oe, uy)
-    Lưu ý: KHÔNG áp dụng cho "ui" vì túi, bụi đã đúng
-    """
-    replacements = [
-        # óa -> oá (hóa -> hoá, khóa -> khoá)
-        ('óa', 'oá'), ('òa', 'oà'), ('ỏa', 'oả'), ('õa', 'oã'), ('ọa', 'oạ'),
-        # úy -> uý (thúy -> thuý)
-        ('úy', 'uý'), ('ùy', 'uỳ'), ('ủy', 'uỷ'), ('ũy', 'uỹ'), ('ụy', 'uỵ'),
-        # oe combinations
-        ('óe', 'oé'), ('òe', 'oè'), ('ỏe', 'oẻ'), ('õe', 'oẽ'), ('ọe', 'oẹ'),
-    ]
-    
-    result = text
-    for old, new in replacements:
-        result = result.replace(old, new)
-    return result
-
-def load_vocab():
-    # Tìm file clean_dict.pkl ở nhiều vị trí
-    possible_paths = [
-        "clean_dict.pkl",                    # Chạy từ scripts/
-        "../clean_dict.pkl",                 # Chạy từ thư mục con
-        Path(__file__).parent / "clean_dict.pkl",  # Cùng thư mục với script
-    ]
-    
-    for path in possible_paths:
-        try:
-            with open(path, "rb") as f:
-                vocab = pickle.load(f)
-                print(f"✅ Loaded vocab from: {path}")
-                return vocab
-        except FileNotFoundError:
-            continue
-    
-    print("⚠️  Không tìm thấy clean_dict.pkl ở bất kỳ vị trí nào, dùng vocab demo")
-    return ["bác_sĩ", "y_tá", "bệnh_viện"] * 10000
-
-def get_existing_keywords():
-    """
-    Đọc tất cả file .json trong thư mục contexto và lấy danh sách từ khóa đã có
-    """
-    existing_keywords = []
-    
-    if not CONTEXTO_DIR.exists():
-        print(f"⚠️  Thư mục {CONTEXTO_DIR} không tồn tại")
-        return existing_keywords
-    
-    # Lấy tất cả file .json (trừ rankLoader.json và create_rank_loader.py)
-    json_files = list(CONTEXTO_DIR.glob("*.json"))
-    json_files = [f for f in json_files if f.name not in ["rankLoader.json"]]
-    
-    for json_file in json_files:
-        # Lấy tên file (ví dụ: bac_si.json -> bác sĩ)
-        slug = json_file.stem  # bac_si
-        # Chuyển từ bac_si -> bác sĩ (đọc từ file để lấy keyword chính xác)
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                keyword = data.get('keyword', '')
-                if keyword:
-                    existing_keywords.append(keyword)
-        except:
-            # Nếu không đọc được file, dùng slug
-            keyword = slug.replace('_', ' ')
-            existing_keywords.append(keyword)
-    
-    return existing_keywords
+class CalibratedScore(NamedTuple):
+    """Điểm sau khi gộp các chunk (cùng field với llm_schemas.WordScore, s là số thực)"""
+    w: str
+    s: float
 
 # =========================== LLM FUNCTIONS ===========================
 
-def generate_daily_target():
+def generate_daily_target(dedup_index=None):
     """
     Dùng Gemini để tạo một từ khóa mới cho ngày hôm nay
-    Kiểm tra và tránh các từ đã tồn tại
+    Kiểm tra và tránh các từ đã tồn tại: trùng chính xác hoặc quá gần nghĩa
+    (xem find_near_duplicate_target) bị loại ngay tại local, không cần gọi lại API
     """
+    from llm_schemas import DailyTargetResponse
+
     print("🎲 Đang tạo từ khóa mới cho hôm nay...")
     
     # Lấy danh sách từ khóa đã có
     existing_keywords = get_existing_keywords()
+    existing_set = set(existing_keywords)
     print(f"   📋 Đã có {len(existing_keywords)} từ khóa: {', '.join(existing_keywords[:10])}{'...' if len(existing_keywords) > 10 else ''}")
-    
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-    
-    # Tạo danh sách từ đã có để gửi cho Gemini
-    existing_list = ', '.join(existing_keywords) if existing_keywords else 'chưa có từ nào'
-    
-    prompt = f"""
+
+    if dedup_index is None:
+        dedup_index = build_target_dedup_index(existing_keywords)
+
+    rejected = []
+    max_retries = llm_client.LLM_MAX_ATTEMPTS
+    max_rounds = 3
+    for round_idx in range(max_rounds):
+        # Chỉ gửi các từ gần nhất (để tránh lặp chủ đề) + các ứng viên vừa bị loại,
+        # việc kiểm tra trùng với toàn bộ game cũ làm ở local
+        recent = existing_keywords[-TARGET_PROMPT_RECENT:] + rejected
+        existing_list = ', '.join(recent) if recent else 'chưa có từ nào'
+
+        prompt = f"""
 Bạn là chuyên gia thiết kế game Contexto tiếng Việt.
 
-Hãy đề xuất MỘT từ khóa tiếng Việt 2 âm tiết phù hợp cho game Contexto hôm nay.
+Hãy đề xuất {TARGET_CANDIDATES} từ khóa tiếng Việt 2 âm tiết phù hợp cho game Contexto hôm nay, từ tốt nhất trước.
 
 Tiêu chí:
 
@@ -218,44 +184,42 @@ Phạm vi rộng: Có thể là đồ vật, địa điểm, nghề nghiệp, đ
 Độ khó trung bình đến khó: Tránh những từ quá hiển nhiên hoặc quá cụ thể. Mục tiêu là tạo ra "aha moment" cho người chơi.
 Có nhiều từ liên quan để người chơi brainstorm, cả trực tiếp và gián tiếp.
 Tránh từ quá chuyên ngành, từ cổ, từ địa phương hiếm gặp.
-Tránh các từ cùng chủ đề quá rõ ràng với các từ đã tồn tại bên dưới.
-QUAN TRỌNG: KHÔNG được trả về các từ đã tồn tại sau đây:
+Tránh các từ cùng chủ đề quá rõ ràng với các từ gần đây bên dưới.
+QUAN TRỌNG: KHÔNG được trả về các từ sau đây:
 {existing_list}
 
 Ví dụ từ tốt: "bác sĩ", "xe máy", "trường học", "cà phê", "nỗi buồn", "lái xe", "màu đỏ", "cái bẫy", "ốp la", "cái chảo", "màn hình", "chạy bộ"
 
-CHỈ TRẢ VỀ MỘT TỪ DUY NHẤT, không giải thích.
-    """
-    
-    max_retries = 2
-    for attempt in range(max_retries):
+CHỈ TRẢ VỀ DANH SÁCH TỪ, không giải thích.
+        """
+
         try:
-            response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents=prompt,
-                config={
-                    "response_mime_type": "application/json",
-                    "response_json_schema": DailyTargetResponse.model_json_schema(),
-                },
-            )
-            result = DailyTargetResponse.model_validate_json(response.text)
-            target = normalize_vietnamese_diacritics(result.target.lower().strip())
-            
+            result = llm_client.generate_json(MODEL_NAME, prompt, DailyTargetResponse, "target", max_retries)
+        except Exception as e:
+            raise Exception(f"Không thể tạo target sau {max_retries} lần thử: {e}")
+
+        for candidate in result.targets:
+            target = normalize_vietnamese_diacritics(candidate.lower().strip())
+            if not target or target in rejected:
+                continue
+
             # Kiểm tra nếu từ đã tồn tại
-            if target in existing_keywords:
-                print(f"   ⚠️  Từ '{target}' đã tồn tại, thử lại...")
+            if target in existing_set:
+                print(f"   ⚠️  Từ '{target}' đã tồn tại, bỏ qua")
+                rejected.append(target)
+                continue
+
+            duplicate = find_near_duplicate_target(dedup_index, target)
+            if duplicate:
+                keyword, similarity = duplicate
+                print(f"   ⚠️  Từ '{target}' quá gần '{keyword}' (cosine {similarity:.3f}), bỏ qua")
+                rejected.append(target)
                 continue
-            
+
             print(f"   ✅ Từ khóa hôm nay: '{target}'")
             return target
-        except Exception as e:
-            print(f"   ⚠️ Lỗi khi tạo target (lần {attempt + 1}): {e}")
-            if attempt == max_retries - 1:
-                raise Exception(f"Không thể tạo target sau {max_retries} lần thử: {e}")
-            # Longer backoff for rate limits: 15s, 30s
-            delay = 15 * (attempt + 1)
-            print(f"   ⏳ Đợi {delay}s trước khi thử lại...")
-            time.sleep(delay)
+
+        print(f"   🔁 Không có ứng viên hợp lệ (lượt {round_idx + 1}/{max_rounds}), thử lại...")
     
     raise Exception("Không thể tạo target")
 
@@ -264,10 +228,10 @@ def llm_brainstorm(target):
     Dùng LLM để nghĩ ra các từ quan trọng (Signature Words)
     mà Embedding có thể đã bỏ sót.
     """
+    from llm_schemas import BrainstormResponse
+
     print(f"[LLM] Đang Brainstorming cho '{target}'...")
     
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-    
     prompt = f"""
 Bạn là game designer cho Contexto tiếng Việt. Hãy liệt kê 50-100 từ QUAN TRỌNG NHẤT mà người chơi sẽ nghĩ đến khi chơi game với từ khóa: "{target}".
 
@@ -297,34 +261,22 @@ Ví dụ minh họa:
 Từ khóa: "{target}"
     """
 
-    max_retries = 2
-    for attempt in range(max_retries):
-        try:
-            response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents=prompt,
-                config={
-                    "response_mime_type": "application/json",
-                    "response_json_schema": BrainstormResponse.model_json_schema(),
-                },
-            )
-            result = BrainstormResponse.model_validate_json(response.text)
-            return [normalize_vietnamese_diacritics(w.lower().strip()) for w in result.words]
-        except Exception as e:
-            print(f"   ⚠️ Lỗi Brainstorm (lần {attempt + 1}): {e}")
-            if attempt == max_retries - 1:
-                raise Exception(f"Không thể brainstorm sau {max_retries} lần thử: {e}")
-            # Longer backoff for rate limits: 15s, 30s
-            delay = 15 * (attempt + 1)
-            print(f"   ⏳ Đợi {delay}s trước khi thử lại...")
-            time.sleep(delay)
-
-def get_llm_scores(target, words, max_retries=2):
-    """Chấm điểm toàn bộ danh sách từ trong 1 lần để đảm bảo context toàn cục"""
+    max_retries = llm_client.LLM_MAX_ATTEMPTS
+    try:
+        result = llm_client.generate_json(MODEL_NAME, prompt, BrainstormResponse, "brainstorm", max_retries)
+    except Exception as e:
+        raise Exception(f"Không thể brainstorm sau {max_retries} lần thử: {e}")
+    return [normalize_vietnamese_diacritics(w.lower().strip()) for w in result.words]
+
+def get_llm_scores(target, words, max_retries=None, refresh=False):
+    """
+    Chấm điểm toàn bộ danh sách từ trong 1 lần để đảm bảo context toàn cục
+    refresh=True: bỏ qua response đã cache (chấm lại khi lần trước bị cắt cụt)
+    """
+    from llm_schemas import RankingResponse
+
     print(f"   🤖 [LLM] Đang chấm điểm Gameplay cho: '{target}'...")
     
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-
     prompt = f"""
    Bạn là Game Designer cho trò chơi Contexto tiếng Việt.
 
@@ -354,40 +306,121 @@ def get_llm_scores(target, words, max_retries=2):
     {json.dumps(words, ensure_ascii=False)}
     """
 
-    for attempt in range(max_retries):
+    max_retries = max_retries or llm_client.LLM_MAX_ATTEMPTS
+    try:
+        result = llm_client.generate_json(MODEL_NAME, prompt, RankingResponse, "scores", max_retries, refresh)
+    except Exception as e:
+        raise Exception(f"Không thể chấm điểm sau {max_retries} lần thử: {e}")
+
+    print(f"   ✅ Chấm điểm thành công {len(result.items)}/{len(words)} từ")
+    # Chuẩn hóa dấu tiếng Việt cho các từ trong kết quả
+    for item in result.items:
+        item.w = normalize_vietnamese_diacritics(item.w)
+    return result.items
+
+def split_rerank_chunks(words, chunk_size, n_anchors=RERANK_ANCHORS):
+    """
+    Chia danh sách ứng viên (theo thứ tự embedding) thành các chunk chồng lên nhau.
+
+    Anchor: n_anchors từ cách đều nhau trên toàn danh sách (từ đầu tới cuối thang điểm), có mặt
+    trong mọi chunk. Các từ còn lại chia xen kẽ (từ thứ i -> chunk i % n) để chunk nào cũng trải
+    đủ các mức liên quan, giúp việc quy đổi điểm theo anchor chính xác hơn.
+
+    Returns:
+        tuple: (anchors, [chunk words...])
+    """
+    n_anchors = min(n_anchors, max(chunk_size // 4, 1), len(words))
+    anchor_ids = set(np.linspace(0, len(words) - 1, n_anchors).round().astype(int).tolist())
+    anchors = [words[i] for i in sorted(anchor_ids)]
+    others = [word for i, word in enumerate(words) if i not in anchor_ids]
+
+    n_chunks = max(1, -(-len(others) // max(chunk_size - len(anchors), 1)))
+    return anchors, [anchors + others[c::n_chunks] for c in range(n_chunks)]
+
+def calibrate_chunk_scores(chunk_scores, anchors):
+    """
+    Quy điểm các chunk về cùng 1 thang rồi gộp lại.
+
+    Thang chung: điểm trung bình của mỗi anchor qua các chunk. Mỗi chunk được ánh xạ tuyến tính
+    s' = a * s + b (least squares trên các anchor của chunk đó); quá ít anchor hoặc hệ số
+    không hợp lệ -> chỉ dịch điểm (a = 1).
+
+    Args:
+        chunk_scores: list dict {word: score} của từng chunk (chunk lỗi = dict rỗng)
+        anchors: danh sách anchor
+
+    Returns:
+        list[CalibratedScore]: điểm đã quy đổi, anchor lấy trung bình qua các chunk
+    """
+    reference = {}
+    for anchor in anchors:
+        values = [scores[anchor] for scores in chunk_scores if anchor in scores]
+        if values:
+            reference[anchor] = float(np.mean(values))
+
+    merged = {}
+    for scores in chunk_scores:
+        pairs = [(scores[anchor], reference[anchor]) for anchor in anchors if anchor in scores]
+        slope, intercept = 1.0, 0.0
+        if len(pairs) >= 3 and np.std([raw for raw, _ in pairs]) > 1e-6:
+            slope, intercept = np.polyfit(*zip(*pairs), 1)
+        if slope <= 0 and pairs:
+            slope, intercept = 1.0, float(np.mean([ref - raw for raw, ref in pairs]))
+        for word, score in scores.items():
+            merged.setdefault(word, []).append(slope * score + intercept)
+
+    return [CalibratedScore(word, float(np.mean(values))) for word, values in merged.items()]
+
+def score_rerank_chunk(target, words, attempts=2):
+    """
+    Chấm 1 chunk, chấm lại (chỉ chunk này) nếu kết quả bị cắt cụt.
+    Lỗi API / JSON sai đã được retry bên trong get_llm_scores.
+    Mọi lần đều dưới RERANK_MIN_COVERAGE -> lấy lần phủ được nhiều từ nhất.
+    """
+    word_set = set(words)
+    best = {}
+    for attempt in range(attempts):
+        items = get_llm_scores(target, words, refresh=attempt > 0)
+        scores = {item.w: item.s for item in items if item.w in word_set}
+        best = max(best, scores, key=len)
+        if len(scores) >= RERANK_MIN_COVERAGE * len(words):
+            break
+        print(f"   ⚠️ Chunk chỉ có {len(scores)}/{len(words)} từ (lần {attempt + 1}/{attempts})")
+    return best
+
+def get_llm_scores_chunked(target, words, chunk_size=None, n_anchors=RERANK_ANCHORS):
+    """
+    Chấm điểm theo chunk song song (xem split_rerank_chunks / calibrate_chunk_scores).
+    Chunk lỗi hẳn không làm hỏng cả bước: các từ của nó rơi xuống phần đuôi theo thứ tự embedding.
+
+    Returns:
+        list[CalibratedScore]: cùng cách dùng với kết quả get_llm_scores (item.w, item.s)
+    """
+    chunk_size = chunk_size or RERANK_CHUNK_SIZE
+    anchors, chunks = split_rerank_chunks(words, chunk_size, n_anchors)
+    print(f"   🧩 Chia {len(words)} từ thành {len(chunks)} chunk ({len(anchors)} anchor mỗi chunk)")
+
+    futures = [llm_client.submit(score_rerank_chunk, target, chunk) for chunk in chunks]
+    chunk_scores = []
+    for idx, future in enumerate(futures):
         try:
-            response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents=prompt,
-                config={
-                    "response_mime_type": "application/json",
-                    "response_json_schema": RankingResponse.model_json_schema(),
-                },
-            )
-            result = RankingResponse.model_validate_json(response.text)
-            print(f"   ✅ Chấm điểm thành công {len(result.items)}/{len(words)} từ")
-            # Chuẩn hóa dấu tiếng Việt cho các từ trong kết quả
-            for item in result.items:
-                item.w = normalize_vietnamese_diacritics(item.w)
-            return result.items
+            chunk_scores.append(future.result())
         except Exception as e:
-            print(f"   ⚠️ Lỗi API (Lần {attempt+1}/{max_retries}): {e}")
-            if attempt == max_retries - 1:
-                raise Exception(f"Không thể chấm điểm sau {max_retries} lần thử: {e}")
-            # Longer backoff for rate limits: 15s, 30s
-            delay = 15 * (attempt + 1)
-            print(f"   ⏳ Đợi {delay}s trước khi thử lại...")
-            time.sleep(delay)
-    raise Exception("Không thể chấm điểm")
+            print(f"   ⚠️ Chunk {idx + 1}/{len(chunks)} lỗi, dùng thứ tự embedding cho {len(chunks[idx])} từ: {e}")
+            chunk_scores.append({})
+
+    if not any(chunk_scores):
+        raise Exception("Tất cả chunk đều lỗi")
+    return calibrate_chunk_scores(chunk_scores, anchors)
 
-def generate_hints_with_llm(target, rank_map, max_retries=2):
+def generate_hints_with_llm(target, rank_map, max_retries=None):
     """
     Tạo hints cho game bằng LLM, chọn nhiều từ đại diện cho từng khoảng rank.
     
     Args:
         target (str): Từ khóa target của game
         rank_map (dict): Dictionary mapping từ -> rank
-        max_retries (int): Số lần thử lại tối đa khi gọi API
+        max_retries (int): Số lần thử tối đa khi gọi API (mặc định LLM_MAX_ATTEMPTS)
     
     Returns:
         list: Array các rank numbers cho hints (ví dụ: [7, 12, 16, 20, 38, ...])
@@ -397,6 +430,8 @@ def generate_hints_with_llm(target, rank_map, max_retries=2):
     Các khoảng hint được định nghĩa trong HINT_RANGES constant.
     LLM sẽ cố gắng chọn ít nhất 1 từ cho mỗi khoảng.
     """
+    from llm_schemas import HintResponse
+
     print(f"   💡 [LLM] Đang tạo hints cho '{target}'...")
     
     # Chỉ xử lý top 2000 từ
@@ -420,8 +455,6 @@ def generate_hints_with_llm(target, rank_map, max_retries=2):
         print("   ⚠️ Không có ứng viên cho hints")
         return []
     
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-    
     # Tạo prompt cho LLM
     prompt = f"""
 Bạn là chuyên gia thiết kế game Contexto tiếng Việt.
@@ -453,171 +486,705 @@ Yêu cầu:
 - Ưu tiên chất lượng hơn số lượng - chỉ chọn các từ thực sự có ích
 """
     
-    for attempt in range(max_retries):
-        try:
-            response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents=prompt,
-                config={
-                    "response_mime_type": "application/json",
-                    "response_json_schema": HintResponse.model_json_schema(),
-                },
-            )
-            result = HintResponse.model_validate_json(response.text)
-            
-            # Chuyển đổi thành array các rank numbers (như đã lưu trong game files)
-            hint_ranks = [item.rank for item in result.hints]
-            hint_words = [item.word for item in result.hints]
-            
-            print(f"   ✅ Đã tạo {len(hint_ranks)} hints: {hint_ranks}")
-            print(f"   💡 Hint words: {hint_words}")
-            return hint_ranks
-            
-        except Exception as e:
-            print(f"   ⚠️ Lỗi khi tạo hints (Lần {attempt+1}): {e}")
-            if attempt == max_retries - 1:
-                raise Exception(f"Không thể tạo hints sau {max_retries} lần thử: {e}")
-            # Longer backoff for rate limits: 15s, 30s
-            delay = 15 * (attempt + 1)
-            print(f"   ⏳ Đợi {delay}s trước khi thử lại...")
-            time.sleep(delay)
-    
-    raise Exception("Không thể tạo hints")
+    max_retries = max_retries or llm_client.LLM_MAX_ATTEMPTS
+    try:
+        result = llm_client.generate_json(MODEL_NAME, prompt, HintResponse, "hints", max_retries)
+    except Exception as e:
+        raise Exception(f"Không thể tạo hints sau {max_retries} lần thử: {e}")
+
+    # Chuyển đổi thành array các rank numbers (như đã lưu trong game files)
+    hint_ranks = [item.rank for item in result.hints]
+    hint_words = [item.word for item in result.hints]
+
+    print(f"   ✅ Đã tạo {len(hint_ranks)} hints: {hint_ranks}")
+    print(f"   💡 Hint words: {hint_words}")
+    return hint_ranks
 
 # =========================== EMBEDDING RANKING ===========================
 
-def run_model_ranking(model_name, model_instance, dictionary, query, k):
-    """Tính ranking cho 1 model"""
-    emb_cache = os.path.join(CACHE_DIR, f"{model_name}_vocab_embeddings.npy")
+class QuantizedEmbeddings(NamedTuple):
+    """Embeddings int8 + scale mỗi dòng: embedding[i] ≈ data[i] * scales[i]"""
+    data: np.ndarray
+    scales: np.ndarray
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+# Registry theo model - dùng chung giữa các lần gọi run_model_ranking
+# (mỗi model chỉ load embeddings 1 lần cho cả process)
+_VOCAB_EMBEDDINGS_REGISTRY = {}
+
+def embedding_cache_paths(model_name, storage="float32"):
+    """Đường dẫn file cache embeddings theo định dạng: (data, scales hoặc None)"""
+    if storage == "float32":
+        return os.path.join(CACHE_DIR, f"{model_name}_vocab_embeddings.npy"), None
+    if storage == "float16":
+        return os.path.join(CACHE_DIR, f"{model_name}_vocab_embeddings.f16.npy"), None
+    if storage == "int8":
+        return (
+            os.path.join(CACHE_DIR, f"{model_name}_vocab_embeddings.int8.npy"),
+            os.path.join(CACHE_DIR, f"{model_name}_vocab_scales.npy"),
+        )
+    raise ValueError(f"EMBEDDING_STORAGE không hợp lệ: {storage} (chọn 1 trong {EMBEDDING_STORAGES})")
+
+def quantize_embeddings(corpus_embeddings, storage):
+    """Chuyển embeddings float32 sang định dạng lưu trữ (float16 / int8 + scale mỗi dòng)"""
+    if storage == "float32":
+        return np.asarray(corpus_embeddings, dtype=np.float32)
+    if storage == "float16":
+        return np.asarray(corpus_embeddings, dtype=np.float16)
+    if storage == "int8":
+        data = np.empty(corpus_embeddings.shape, dtype=np.int8)
+        scales = np.empty(corpus_embeddings.shape[0], dtype=np.float32)
+        for start in range(0, corpus_embeddings.shape[0], EMBEDDING_CHUNK_ROWS):
+            block = np.asarray(corpus_embeddings[start:start + EMBEDDING_CHUNK_ROWS], dtype=np.float32)
+            block_scales = np.abs(block).max(axis=1) / 127
+            block_scales[block_scales == 0] = 1
+            data[start:start + len(block)] = np.clip(np.rint(block / block_scales[:, None]), -127, 127)
+            scales[start:start + len(block)] = block_scales
+        return QuantizedEmbeddings(data, scales)
+    raise ValueError(f"EMBEDDING_STORAGE không hợp lệ: {storage} (chọn 1 trong {EMBEDDING_STORAGES})")
+
+def dequantize_embeddings(corpus_embeddings, start=0, stop=None):
+    """Trả về các dòng [start:stop] của embeddings dưới dạng float32"""
+    if isinstance(corpus_embeddings, QuantizedEmbeddings):
+        block = corpus_embeddings.data[start:stop].astype(np.float32)
+        return block * corpus_embeddings.scales[start:stop, None]
+    return np.asarray(corpus_embeddings[start:stop], dtype=np.float32)
+
+def _atomic_np_save(path, array):
+    """np.save qua file tạm + rename để không bao giờ để lại file .npy ghi dở"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+def save_embeddings(model_name, corpus_embeddings, storage):
+    """Lưu embeddings (đã ở định dạng storage) vào model_cache"""
+    data_path, scales_path = embedding_cache_paths(model_name, storage)
+    if isinstance(corpus_embeddings, QuantizedEmbeddings):
+        _atomic_np_save(data_path, corpus_embeddings.data)
+        _atomic_np_save(scales_path, corpus_embeddings.scales)
+    else:
+        _atomic_np_save(data_path, corpus_embeddings)
+
+def open_embeddings(model_name, storage):
+    """Mở cache embeddings bằng mmap (None nếu chưa có file)"""
+    data_path, scales_path = embedding_cache_paths(model_name, storage)
+    if not os.path.exists(data_path) or (scales_path and not os.path.exists(scales_path)):
+        return None
+
+    # mmap: không copy cả ma trận vào RAM, OS chỉ đọc các page cần dùng
+    data = np.load(data_path, mmap_mode="r")
+    if scales_path:
+        return QuantizedEmbeddings(data, np.load(scales_path, mmap_mode="r"))
+    return data
+
+def embedding_manifest_paths(model_name, storage):
+    """Đường dẫn manifest của cache embeddings: (manifest .json, danh sách từ theo dòng .pkl)"""
+    data_path, _ = embedding_cache_paths(model_name, storage)
+    prefix = data_path[:-len(".npy")]
+    return f"{prefix}.manifest.json", f"{prefix}.words.pkl"
+
+def read_embedding_manifest(model_name, storage):
+    """Đọc manifest (None nếu chưa có hoặc lỗi). Danh sách từ chỉ đọc khi cần (read_manifest_words)"""
+    manifest_path, _ = embedding_manifest_paths(model_name, storage)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def read_manifest_words(model_name, storage):
+    """Danh sách từ ứng với từng dòng của cache embeddings"""
+    _, words_path = embedding_manifest_paths(model_name, storage)
+    with open(words_path, "rb") as f:
+        return pickle.load(f)
+
+def write_embedding_manifest(model_name, storage, dictionary):
+    """Ghi manifest: cache embeddings hiện tại khớp với dictionary (theo đúng thứ tự dòng)"""
+    manifest_path, words_path = embedding_manifest_paths(model_name, storage)
+    with open(f"{words_path}.tmp", "wb") as f:
+        pickle.dump(list(dictionary), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{words_path}.tmp", words_path)
+
+    manifest = {
+        "model": EMBEDDING_MODELS[model_name]["path"],
+        "storage": storage,
+        "count": len(dictionary),
+        "vocab_fingerprint": vocab_fingerprint(dictionary),
+    }
+    with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+def remove_embedding_manifest(model_name, storage):
+    """Xoá manifest trước khi ghi đè cache (crash giữa chừng sẽ không để lại manifest sai)"""
+    manifest_path, _ = embedding_manifest_paths(model_name, storage)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+def encode_words(model_instance, words):
+    """Encode danh sách từ thành embeddings float32 đã normalize"""
+    return model_instance.encode(
+        words,
+        batch_size=128,
+        show_progress_bar=len(words) > 10000,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    )
 
-    if os.path.exists(emb_cache):
-        corpus_embeddings = np.load(emb_cache)
+def assemble_embeddings(old_embeddings, rows, new_embeddings):
+    """
+    Ghép ma trận mới theo thứ tự vocab: dòng rows[i] >= 0 lấy từ cache cũ,
+    các dòng rows[i] < 0 lấy lần lượt từ new_embeddings (cùng định dạng storage).
+    """
+    known = rows >= 0
+    if isinstance(old_embeddings, QuantizedEmbeddings):
+        data = np.empty((len(rows), old_embeddings.shape[1]), dtype=old_embeddings.data.dtype)
+        scales = np.empty(len(rows), dtype=old_embeddings.scales.dtype)
+        data[known] = old_embeddings.data[rows[known]]
+        scales[known] = old_embeddings.scales[rows[known]]
+        data[~known] = new_embeddings.data
+        scales[~known] = new_embeddings.scales
+        return QuantizedEmbeddings(data, scales)
+
+    assembled = np.empty((len(rows), old_embeddings.shape[1]), dtype=old_embeddings.dtype)
+    assembled[known] = old_embeddings[rows[known]]
+    assembled[~known] = new_embeddings
+    return assembled
+
+def legacy_cache_matches(model_instance, dictionary, corpus_embeddings):
+    """
+    Kiểm tra cache chưa có manifest còn khớp dictionary: encode lại LEGACY_CHECK_SAMPLE dòng
+    ngẫu nhiên + LEGACY_CHECK_TAIL dòng cuối, cosine với cache phải >= LEGACY_CHECK_MIN_COSINE.
+    Không có model để encode -> không kiểm tra được -> False.
+    """
+    if model_instance is None:
+        return False
+
+    n = len(dictionary)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(n, size=min(LEGACY_CHECK_SAMPLE, n), replace=False)
+    rows = np.union1d(sample, np.arange(max(0, n - LEGACY_CHECK_TAIL), n))
+
+    expected = encode_words(model_instance, [dictionary[row] for row in rows.tolist()])
+    if isinstance(corpus_embeddings, QuantizedEmbeddings):
+        cached = corpus_embeddings.data[rows].astype(np.float32) * corpus_embeddings.scales[rows, None]
+    else:
+        cached = np.asarray(corpus_embeddings[rows], dtype=np.float32)
+    norms = np.linalg.norm(cached, axis=1) * np.linalg.norm(expected, axis=1)
+    cosines = np.einsum("ij,ij->i", cached, expected) / np.maximum(norms, 1e-12)
+    return bool(np.all(cosines >= LEGACY_CHECK_MIN_COSINE))
+
+def sync_vocab_embeddings(model_name, model_instance, dictionary, corpus_embeddings, storage):
+    """
+    Căn cache embeddings theo vocab hiện tại dựa vào manifest (từ -> dòng):
+    chỉ encode các từ mới, bỏ các từ đã xoá, ghép lại ma trận theo thứ tự vocab.
+
+    Returns:
+        embeddings khớp dictionary, hoặc None nếu cache không dùng lại được
+        (khác model, hoặc cache cũ không có manifest mà lệch số dòng / mẫu encode lại không khớp)
+    """
+    manifest = read_embedding_manifest(model_name, storage)
+    model_path = EMBEDDING_MODELS[model_name]["path"]
+
+    if manifest is None:
+        # Cache cũ chưa có manifest: chỉ dùng lại nếu cùng số dòng với vocab hiện tại
+        # và mẫu dòng encode lại khớp cache (cùng số dòng vẫn có thể đã sửa từ)
+        if corpus_embeddings.shape[0] != len(dictionary):
+            print(f"      ⚠️  Cache {model_name} không có manifest và lệch vocab "
+                  f"({corpus_embeddings.shape[0]:,} != {len(dictionary):,}), encode lại...")
+            return None
+        if not legacy_cache_matches(model_instance, dictionary, corpus_embeddings):
+            print(f"      ⚠️  Cache {model_name} không có manifest và không khớp vocab hiện tại, encode lại...")
+            return None
+        write_embedding_manifest(model_name, storage, dictionary)
+        return corpus_embeddings
+
+    if manifest.get("model") != model_path or manifest.get("count") != corpus_embeddings.shape[0]:
+        print(f"      ⚠️  Manifest {model_name} không khớp cache, encode lại...")
+        return None
+
+    if manifest.get("vocab_fingerprint") == vocab_fingerprint(dictionary):
+        return corpus_embeddings
+
+    # Vocab đã đổi: map từng từ sang dòng trong cache cũ
+    row_of = {}
+    for row, word in enumerate(read_manifest_words(model_name, storage)):
+        row_of.setdefault(word, row)
+    rows = np.fromiter((row_of.get(word, -1) for word in dictionary), dtype=np.int64, count=len(dictionary))
+
+    new_words = [dictionary[i] for i in np.flatnonzero(rows < 0).tolist()]
+    removed_count = len(row_of) - len(np.unique(rows[rows >= 0]))
+    print(f"      ♻️  Cập nhật embeddings {model_name}: +{len(new_words):,} từ mới, -{removed_count:,} từ đã xoá")
+
+    if new_words:
+        new_embeddings = quantize_embeddings(encode_words(model_instance, new_words), storage)
     else:
-        print(f"      Encoding vocab với {model_name}...")
-        corpus_embeddings = model_instance.encode(
-            dictionary,
-            batch_size=128,
-            show_progress_bar=True,
+        new_embeddings = quantize_embeddings(np.empty((0, corpus_embeddings.shape[1]), dtype=np.float32), storage)
+
+    assembled = assemble_embeddings(corpus_embeddings, rows, new_embeddings)
+    del corpus_embeddings
+
+    remove_embedding_manifest(model_name, storage)
+    save_embeddings(model_name, assembled, storage)
+    write_embedding_manifest(model_name, storage, dictionary)
+    return open_embeddings(model_name, storage)
+
+def load_vocab_embeddings(model_name, model_instance, dictionary, storage=None):
+    """
+    Load embeddings của vocab từ cache theo EMBEDDING_STORAGE, luôn khớp với vocab hiện tại.
+    - Có cache: căn theo manifest, chỉ encode từ mới (sync_vocab_embeddings)
+    - Chưa có file định dạng này nhưng có cache float32 -> quantize 1 lần rồi lưu lại
+    - Không có cache nào -> encode toàn bộ vocab
+    """
+    storage = storage or EMBEDDING_STORAGE
+
+    corpus_embeddings = open_embeddings(model_name, storage)
+
+    if corpus_embeddings is None and storage != "float32":
+        float_embeddings = open_embeddings(model_name, "float32")
+        if float_embeddings is not None:
+            print(f"      Quantize embeddings {model_name} -> {storage}...")
+            save_embeddings(model_name, quantize_embeddings(float_embeddings, storage), storage)
+            # Manifest của bản quantize giống hệt bản float32
+            if read_embedding_manifest(model_name, "float32") is not None:
+                write_embedding_manifest(model_name, storage, read_manifest_words(model_name, "float32"))
+            corpus_embeddings = open_embeddings(model_name, storage)
+
+    if corpus_embeddings is not None:
+        corpus_embeddings = sync_vocab_embeddings(model_name, model_instance, dictionary, corpus_embeddings, storage)
+        if corpus_embeddings is not None:
+            return corpus_embeddings
+
+    print(f"      Encoding vocab với {model_name}...")
+    remove_embedding_manifest(model_name, storage)
+    save_embeddings(model_name, quantize_embeddings(encode_words(model_instance, dictionary), storage), storage)
+    write_embedding_manifest(model_name, storage, dictionary)
+    return open_embeddings(model_name, storage)
+
+def get_vocab_embeddings(model_name, model_instance, dictionary):
+    """Lấy ma trận embeddings vocab của 1 model từ registry (load 1 lần)"""
+    corpus_embeddings = _VOCAB_EMBEDDINGS_REGISTRY.get(model_name)
+    if corpus_embeddings is None:
+        with run_report.span("embedding_cache_load", model=model_name, storage=EMBEDDING_STORAGE):
+            corpus_embeddings = load_vocab_embeddings(model_name, model_instance, dictionary)
+        _VOCAB_EMBEDDINGS_REGISTRY[model_name] = corpus_embeddings
+    return corpus_embeddings
+
+def compute_scores(corpus_embeddings, query_embeddings):
+    """
+    Cosine score (Q, N) giữa các query và toàn bộ vocab.
+    float32: 1 phép nhân ma trận; float16/int8: nhân theo từng khối dòng đã
+    dequantize để không phải giữ cả ma trận float32 trong RAM.
+    """
+    queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, corpus_embeddings.shape[1])
+
+    if not isinstance(corpus_embeddings, QuantizedEmbeddings) and corpus_embeddings.dtype == np.float32:
+        return queries @ corpus_embeddings.T
+
+    n = corpus_embeddings.shape[0]
+    scores = np.empty((len(queries), n), dtype=np.float32)
+    for start in range(0, n, EMBEDDING_CHUNK_ROWS):
+        stop = min(start + EMBEDDING_CHUNK_ROWS, n)
+        scores[:, start:stop] = queries @ dequantize_embeddings(corpus_embeddings, start, stop).T
+    return scores
+
+def compute_rank_matrix(corpus_embeddings, query_embeddings):
+    """
+    Xếp hạng toàn bộ vocab cho nhiều query: 1 phép nhân ma trận-ma trận (BLAS) + argsort.
+
+    Args:
+        corpus_embeddings (np.ndarray | QuantizedEmbeddings): (N, d) embeddings vocab đã normalize
+        query_embeddings (np.ndarray): (Q, d) embeddings query đã normalize
+
+    Returns:
+        np.ndarray: int32 (Q, N), ranks[q, vocab_id] = rank (bắt đầu từ 1)
+    """
+    scores = compute_scores(corpus_embeddings, query_embeddings)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    ranks = np.empty(order.shape, dtype=np.int32)
+    positions = np.broadcast_to(np.arange(1, order.shape[1] + 1, dtype=np.int32), order.shape)
+    np.put_along_axis(ranks, order, positions, axis=1)
+    return ranks
+
+def compute_rank_array(corpus_embeddings, query_embedding):
+    """
+    Xếp hạng toàn bộ vocab cho 1 query.
+
+    Returns:
+        np.ndarray: int32 (N,), ranks[vocab_id] = rank (bắt đầu từ 1)
+    """
+    return compute_rank_matrix(corpus_embeddings, query_embedding)[0]
+
+def run_model_ranking_batch(model_name, model_instance, dictionary, queries):
+    """
+    Tính ranking toàn bộ vocab cho nhiều query với 1 model
+    (encode tất cả query trong 1 lần gọi encode).
+
+    Returns:
+        np.ndarray: int32 (Q, N) rank matrix theo vocab id (xem compute_rank_matrix)
+    """
+    corpus_embeddings = get_vocab_embeddings(model_name, model_instance, dictionary)
+
+    # Encode queries
+    queries = list(queries)
+    with run_report.span("query_encode", model=model_name, queries=len(queries)):
+        query_embeddings = model_instance.encode(
+            queries,
             convert_to_numpy=True,
             normalize_embeddings=True
         )
-        np.save(emb_cache, corpus_embeddings)
 
-    # Encode query
-    query_embedding = model_instance.encode(
-        [query],
-        convert_to_numpy=True,
-        normalize_embeddings=True
-    )
+    with run_report.span("rank", model=model_name, queries=len(queries)):
+        return compute_rank_matrix(corpus_embeddings, query_embeddings)
 
-    # FAISS search
-    d = corpus_embeddings.shape[1]
-    index = faiss.IndexFlatIP(d)
-    index.add(corpus_embeddings)
+def run_model_ranking(model_name, model_instance, dictionary, query):
+    """
+    Tính ranking toàn bộ vocab cho 1 model.
 
-    D, I = index.search(query_embedding, min(k, len(dictionary)))
+    Returns:
+        np.ndarray: int32 rank array theo vocab id (xem compute_rank_array)
+    """
+    return run_model_ranking_batch(model_name, model_instance, dictionary, [query])[0]
 
-    # Return rank map
-    return {dictionary[idx]: rank + 1 for rank, idx in enumerate(I[0])}
+# =========================== TARGET DEDUP ===========================
+
+def open_cached_vocab_embeddings(model_name, storage=None):
+    """
+    Mở cache embeddings vocab của 1 model (mmap) kèm map từ -> dòng theo manifest,
+    không cần load model. Tra theo manifest nên đúng cả khi clean_dict.pkl đã đổi.
 
-def is_valid_candidate(candidate_word, target_word):
+    Returns:
+        tuple: (embeddings, {word: row}) - (None, None) nếu chưa có cache / manifest
     """
-    Kiểm tra từ hợp lệ (Phiên bản Bóc Vỏ Hành - Peeling Loop).
-    Logic: Bóc hết các lớp từ rác ở đầu/cuối đi.
-    Nếu lõi còn lại == target -> LOẠI.
+    storage = storage or EMBEDDING_STORAGE
+    corpus_embeddings = open_embeddings(model_name, storage)
+    if corpus_embeddings is None or read_embedding_manifest(model_name, storage) is None:
+        return None, None
+    rows = {word: idx for idx, word in enumerate(read_manifest_words(model_name, storage))}
+    return corpus_embeddings, rows
+
+def cached_word_embeddings(corpus_embeddings, rows, words):
     """
+    Embedding đã normalize của các từ có trong cache.
 
-    # 1. Loại chính nó
-    if candidate_word == target_word:
-        return False
+    Returns:
+        tuple: (danh sách từ tìm thấy, ma trận float32 (len, dim) hoặc None)
+    """
+    found = [word for word in dict.fromkeys(words) if word in rows]
+    if not found:
+        return [], None
 
-    # 2. Danh sách từ rác (Token đơn)
-    NOISE_TOKENS = {
-        # Lượng từ
-        "các", "những", "một", "mọi", "mỗi", "từng", "mấy", "vài", "bọn", "nhóm",
-        # Loại từ
-        "cái", "con", "chiếc", "người", "nhà", "ông", "bà", "cô", "chú", "anh", "chị", "thằng", "tên", "gã", "viên", "ngài",
-        # Danh từ trừu tượng hóa (Thủ phạm của 'lực lượng', 'ngành', 'hệ thống')
-        "việc", "sự", "cục", "hội", "ngành", "giới", "ban", "sở", "bộ",
-        "lực", "lượng", "hệ", "thống", "trình", "độ", "công", "tác", "chuyên", "môn"
-    }
+    ids = np.array([rows[word] for word in found])
+    if isinstance(corpus_embeddings, QuantizedEmbeddings):
+        vectors = corpus_embeddings.data[ids].astype(np.float32) * corpus_embeddings.scales[ids, None]
+    else:
+        vectors = np.asarray(corpus_embeddings[ids], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return found, vectors / np.maximum(norms, 1e-12)
 
-    NOISE_SUFFIXES = {"này", "kia", "đó", "nọ", "ấy", "gì", "đâu", "ư", "nhỉ", "nhé", "hả", "của"}
+def build_target_dedup_index(keywords, storage=None):
+    """
+    Ma trận embeddings (mỗi model) của các keyword đã có, giữ trong RAM để so ứng viên mới.
 
-    # 3. Tách từ để xử lý
-    tokens = candidate_word.split('_')
+    Returns:
+        dict: model_name -> {"keywords", "matrix", "embeddings", "rows"}
+    """
+    vocab_words = [keyword.replace(" ", "_") for keyword in keywords]
+    index = {}
+    for model_name in EMBEDDING_MODELS:
+        corpus_embeddings, rows = open_cached_vocab_embeddings(model_name, storage)
+        if corpus_embeddings is None:
+            continue
+        found, matrix = cached_word_embeddings(corpus_embeddings, rows, vocab_words)
+        if found:
+            index[model_name] = {
+                "keywords": [word.replace("_", " ") for word in found],
+                "matrix": matrix,
+                "embeddings": corpus_embeddings,
+                "rows": rows,
+            }
+
+    if index:
+        print(f"   🧭 Dedup index: {max(len(entry['keywords']) for entry in index.values())} keyword, {len(index)} model")
+    else:
+        print("   ⚠️  Chưa có cache embeddings, chỉ kiểm tra trùng chính xác")
+    return index
 
-    # Nếu từ không chứa target thì giữ lại
-    if target_word not in candidate_word:
-        return True
+def find_near_duplicate_target(dedup_index, candidate, threshold=TARGET_DEDUP_THRESHOLD):
+    """
+    So ứng viên với các keyword cũ: cosine trung bình có trọng số (theo EMBEDDING_MODELS)
+    giữa các model có cả 2 từ trong cache. Ứng viên không có trong cache -> không kiểm tra được.
 
-    # --- VÒNG LẶP BÓC TÁCH (PEELING LOOP) ---
+    Returns:
+        tuple | None: (keyword gần nhất, cosine) nếu >= threshold
+    """
+    weighted_sums = {}
+    weight_totals = {}
+    for model_name, entry in dedup_index.items():
+        _, vectors = cached_word_embeddings(entry["embeddings"], entry["rows"], [candidate.replace(" ", "_")])
+        if vectors is None:
+            continue
+        weight = EMBEDDING_MODELS[model_name]["weight"]
+        for keyword, similarity in zip(entry["keywords"], entry["matrix"] @ vectors[0]):
+            weighted_sums[keyword] = weighted_sums.get(keyword, 0.0) + weight * float(similarity)
+            weight_totals[keyword] = weight_totals.get(keyword, 0.0) + weight
+
+    if not weighted_sums:
+        return None
+    scores = {keyword: weighted_sums[keyword] / weight_totals[keyword] for keyword in weighted_sums}
+    best = max(scores, key=scores.get)
+    return (best, scores[best]) if scores[best] >= threshold else None
+
+# Noise-filter index (xem pipeline_core.build_noise_filter_index) cache trong CACHE_DIR
+NOISE_INDEX_FILE = "vocab_noise_index.pkl"
+
+_NOISE_INDEX_REGISTRY = {}
+
+def get_noise_filter_index(vocab):
+    """Lấy noise-filter index của vocab (registry -> cache trong CACHE_DIR -> build mới)"""
+    fingerprint = vocab_fingerprint(vocab)
+    noise_index = _NOISE_INDEX_REGISTRY.get(fingerprint)
+    if noise_index is not None:
+        return noise_index
+
+    index_path = os.path.join(CACHE_DIR, NOISE_INDEX_FILE)
+    if os.path.exists(index_path):
+        # File hỏng (vd. run bị ngắt giữa chừng ở bản cũ) hoặc thiếu key -> coi như miss, build lại
+        try:
+            with open(index_path, "rb") as f:
+                noise_index = pickle.load(f)
+        except Exception as e:
+            print(f"      ⚠️ Không đọc được {NOISE_INDEX_FILE} ({type(e).__name__}), tạo lại...")
+            noise_index = None
+        if (not isinstance(noise_index, dict) or noise_index.get("fingerprint") != fingerprint
+                or "exact" not in noise_index):
+            noise_index = None
+
+    if noise_index is None:
+        print("      Đang tạo noise-filter index cho vocab...")
+        noise_index = build_noise_filter_index(vocab)
+        atomic_write_bytes(index_path, pickle.dumps(noise_index, protocol=pickle.HIGHEST_PROTOCOL))
+
+    _NOISE_INDEX_REGISTRY[fingerprint] = noise_index
+    return noise_index
+
+# Biến môi trường giới hạn thread của các thư viện BLAS/OpenMP
+THREAD_LIMIT_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+# Models đã load trong worker process (mỗi worker load model của nó 1 lần)
+_WORKER_MODELS = {}
+_WORKER_THREAD_LIMITS = None
+
+def _init_ranking_worker(threads_per_worker):
+    """Initializer của worker process: giới hạn thread torch/BLAS"""
+    global _WORKER_THREAD_LIMITS
+    if not threads_per_worker:
+        return
 
-    # Bóc từ đầu (Prefix)
-    while len(tokens) > 0 and tokens[0] in NOISE_TOKENS:
-        tokens.pop(0)
+    import torch
+    torch.set_num_threads(threads_per_worker)
 
-    # Bóc từ cuối (Suffix)
-    while len(tokens) > 0 and tokens[-1] in NOISE_SUFFIXES:
-        tokens.pop(-1)
+    # threadpoolctl (đi kèm scikit-learn của sentence-transformers) giới hạn BLAS đã load sẵn
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    _WORKER_THREAD_LIMITS = threadpool_limits(limits=threads_per_worker)
+
+def _rank_model_worker(model_name, dictionary, queries):
+    """Task của worker process: ranking toàn bộ vocab với 1 model"""
+    model_instance = _WORKER_MODELS.get(model_name)
+    if model_instance is None:
+        model_instance = load_sentence_transformer(model_name)
+        _WORKER_MODELS[model_name] = model_instance
+    return model_name, run_model_ranking_batch(model_name, model_instance, dictionary, queries)
+
+def compute_model_rank_matrices(queries, vocab, loaded_models=None, workers=RANKING_WORKERS,
+                                threads_per_worker=RANKING_THREADS_PER_WORKER, model_names=None):
+    """
+    Ranking toàn bộ vocab với tất cả EMBEDDING_MODELS (hoặc chỉ các model trong model_names).
 
-    # 4. Kiểm tra lõi còn lại
-    remaining_word = "_".join(tokens)
+    workers <= 1: chạy tuần tự với loaded_models trong process hiện tại.
+    workers > 1: fan-out mỗi model sang 1 worker process (tự load model,
+    embeddings vocab đọc qua mmap nên các process dùng chung page cache),
+    mỗi worker tối đa threads_per_worker thread torch/BLAS.
 
-    # Nếu sau khi bóc hết vỏ mà lõi chính là Target -> RÁC (LOẠI)
-    if remaining_word == target_word:
-        return False
+    Returns:
+        list: rank matrix (Q, N) của từng model, theo thứ tự EMBEDDING_MODELS (model_names)
+    """
+    queries = list(queries)
+    model_names = list(model_names or EMBEDDING_MODELS)
 
-    # Nếu bóc hết sạch sành sanh (rỗng) -> RÁC (LOẠI)
-    if not remaining_word:
-        return False
+    if workers <= 1:
+        return [
+            run_model_ranking_batch(name, loaded_models[name], vocab, queries)
+            for name in model_names
+        ]
 
-    return True
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
 
-def generate_rrf_ranking(target, vocab, loaded_models):
-    """Tạo RRF ranking cho 1 target"""
-    print(f"   ⚡ [Embedding] Tính toán RRF cho '{target}'...")
+    workers = min(workers, len(model_names))
+    print(f"      🔀 Chạy {len(model_names)} models trên {workers} workers"
+          f"{f' ({threads_per_worker} threads/worker)' if threads_per_worker else ''}...")
 
-    K_SEARCH = len(vocab)
-    rankings_map = {}
+    # Worker (spawn) đọc biến môi trường khi import numpy/torch -> đặt trước khi tạo process
+    saved_env = {var: os.environ.get(var) for var in THREAD_LIMIT_ENV_VARS}
+    if threads_per_worker:
+        for var in THREAD_LIMIT_ENV_VARS:
+            os.environ[var] = str(threads_per_worker)
 
-    # Chạy tất cả models
-    for name in EMBEDDING_MODELS:
-        r = run_model_ranking(name, loaded_models[name], vocab, target, k=K_SEARCH)
-        rankings_map[name] = r
+    # Span trong worker process không về được process chính -> đo cả pool (RSS worker xem children_peak_rss_mb)
+    try:
+        with run_report.span("rank_workers", models=model_names, queries=len(queries), workers=workers), \
+                ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_ranking_worker,
+                    initargs=(threads_per_worker,),
+                ) as executor:
+            futures = [
+                executor.submit(_rank_model_worker, name, vocab, queries)
+                for name in model_names
+            ]
+            rank_matrices = dict(future.result() for future in futures)
+    finally:
+        for var, value in saved_env.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
 
-    # Tính RRF score
-    all_candidates = set()
-    for model_rankings in rankings_map.values():
-        all_candidates.update(model_rankings.keys())
+    return [rank_matrices[name] for name in model_names]
 
-    print(f"      Tổng {len(all_candidates):,} từ từ các models")
+def fuse_target_ranking(target, vocab, rank_arrays, weights):
+    """
+    Lọc từ rác và fuse các rank array của 1 target.
 
-    final_list = []
-    filtered_count = 0
-    K_RRF = 60
+    Returns:
+        list: các từ hợp lệ sắp theo RRF score giảm dần
+              (score bằng nhau giữ thứ tự vocab id)
+    """
+    return [vocab[idx] for idx in fuse_target_ranking_ids(target, vocab, rank_arrays, weights).tolist()]
 
-    for word in all_candidates:
-        if not is_valid_candidate(word, target):
-            filtered_count += 1
-            continue
+def fuse_target_ranking_ids(target, vocab, rank_arrays, weights):
+    """Như fuse_target_ranking nhưng trả về vocab id (int32) - dạng lưu trong checkpoint "fused" """
+    with run_report.span("fuse", query=target):
+        return _fuse_target_ranking_ids(target, vocab, rank_arrays, weights)
+
+def _fuse_target_ranking_ids(target, vocab, rank_arrays, weights):
+    candidate_ids = unique_vocab_ids(vocab)
+    print(f"      Tổng {len(candidate_ids):,} từ từ các models")
+
+    # Lọc bằng noise-filter index (tính sẵn cho vocab) thay vì gọi is_valid_candidate từng từ
+    noise_index = get_noise_filter_index(vocab)
+    valid_mask = ~np.isin(candidate_ids, invalid_candidate_ids(noise_index, vocab, target))
+    filtered_count = int(len(candidate_ids) - valid_mask.sum())
+    candidate_ids = candidate_ids[valid_mask]
+
+    # Tính RRF score và sắp xếp bằng 1 lần argsort
+    scores = fuse_rank_arrays([ranks[candidate_ids] for ranks in rank_arrays], weights)
+    order = np.argsort(-scores, kind="stable")
+    sorted_ids = candidate_ids[order].astype(np.int32)
 
-        # Tính RRF
-        rrf_score = 0
-        for model_name, config in EMBEDDING_MODELS.items():
-            rank = rankings_map[model_name].get(word, 100000)
-            rrf_score += config["weight"] * (1 / (K_RRF + rank))
+    print(f"      → {len(sorted_ids):,} từ hợp lệ (filtered {filtered_count:,})")
+    return sorted_ids
 
-        final_list.append({"word": word, "rrf_score": rrf_score})
+def rank_stage(model_name):
+    """Tên checkpoint rank array của 1 embedding model"""
+    return f"ranks.{model_name}"
 
-    sorted_words = sorted(final_list, key=lambda x: x["rrf_score"], reverse=True)
+def missing_rank_models(run_path):
+    """Các model chưa có checkpoint rank array (run_path=None -> tất cả)"""
+    return [name for name in EMBEDDING_MODELS if run_path is None or not checkpoint.has(run_path, rank_stage(name))]
 
-    print(f"      → {len(sorted_words):,} từ hợp lệ (filtered {filtered_count:,})")
-    return sorted_words
+def generate_rrf_rankings(targets, vocab, loaded_models, workers=RANKING_WORKERS,
+                          threads_per_worker=RANKING_THREADS_PER_WORKER, run_paths=None):
+    """
+    Tạo RRF ranking cho nhiều target cùng lúc: mỗi model encode tất cả target
+    trong 1 lần và xếp hạng bằng 1 phép nhân ma trận-ma trận
+    (các model chạy song song nếu workers > 1, xem compute_model_rank_matrices).
+
+    run_paths: thư mục checkpoint của từng target (cùng thứ tự targets). Target đã có
+    checkpoint "fused" không phải tính lại; target chưa có được lưu rank array + fused.
+
+    Yields:
+        tuple: (target, sorted_words) theo thứ tự targets, ngay khi fuse xong từng target
+    """
+    targets = list(targets)
+    run_paths = run_paths or [None] * len(targets)
+    pending = [q for q, run_path in enumerate(run_paths) if run_path is None or not checkpoint.has(run_path, "fused")]
+    print(f"   ⚡ [Embedding] Tính toán ranking cho {len(pending)}/{len(targets)} target...")
+
+    # Chạy tất cả models -> rank matrix (Q, N) theo vocab id
+    rank_matrices = []
+    if pending:
+        rank_matrices = compute_model_rank_matrices(
+            [targets[q] for q in pending], vocab, loaded_models, workers, threads_per_worker
+        )
+    rows = {q: row for row, q in enumerate(pending)}
+    weights = [config["weight"] for config in EMBEDDING_MODELS.values()]
+
+    for q, target in enumerate(targets):
+        run_path = run_paths[q]
+        if q in rows:
+            print(f"   ⚡ [Embedding] Tính toán RRF cho '{target}'...")
+            rank_arrays = [ranks[rows[q]] for ranks in rank_matrices]
+            if run_path is not None:
+                for name, ranks in zip(EMBEDDING_MODELS, rank_arrays):
+                    checkpoint.save(run_path, rank_stage(name), ranks)
+            fused_ids = checkpoint.run_stage(
+                run_path, "fused", lambda: fuse_target_ranking_ids(target, vocab, rank_arrays, weights)
+            )
+        else:
+            print(f"   ⏭️  [{run_path.name}] Dùng checkpoint: fused")
+            fused_ids = checkpoint.load(run_path, "fused")
+        yield target, [vocab[idx] for idx in fused_ids.tolist()]
+
+def generate_rrf_ranking(target, vocab, loaded_models, workers=RANKING_WORKERS,
+                         threads_per_worker=RANKING_THREADS_PER_WORKER, run_path=None):
+    """
+    Tạo RRF ranking cho 1 target.
+    Với run_path: model nào đã có checkpoint rank array thì không chạy lại.
+
+    Returns:
+        list: các từ hợp lệ sắp theo RRF score giảm dần (xem fuse_target_ranking)
+    """
+    print(f"   ⚡ [Embedding] Tính toán RRF cho '{target}'...")
+
+    # Chạy các model còn thiếu -> rank array theo vocab id
+    missing = missing_rank_models(run_path)
+    computed = {}
+    if missing:
+        rank_matrices = compute_model_rank_matrices([target], vocab, loaded_models, workers, threads_per_worker, missing)
+        computed = {name: ranks[0] for name, ranks in zip(missing, rank_matrices)}
+    rank_arrays = [
+        checkpoint.run_stage(run_path, rank_stage(name), lambda name=name: computed[name])
+        for name in EMBEDDING_MODELS
+    ]
+    weights = [config["weight"] for config in EMBEDDING_MODELS.values()]
+
+    fused_ids = checkpoint.run_stage(
+        run_path, "fused", lambda: fuse_target_ranking_ids(target, vocab, rank_arrays, weights)
+    )
+    return [vocab[idx] for idx in fused_ids.tolist()]
 
 # =========================== FILE PROCESSING ===========================
 
-def process_file(file_path):
+def process_file(file_path, rescue_words=None, run_path=None):
+    """
+    Re-rank 1 file RRF bằng LLM (brainstorm + chấm điểm + hints) và ghi kết quả vào OUTPUT_FOLDER.
+
+    Args:
+        rescue_words: kết quả llm_brainstorm đã có, hoặc Future của nó (brainstorm chạy trước,
+            song song với embedding ranking). None -> gọi llm_brainstorm tại đây.
+        run_path: thư mục checkpoint (xem checkpoint.py): các stage brainstorm, scores,
+            final, hints đã xong thì đọc lại thay vì gọi LLM.
+    """
     filename = os.path.basename(file_path)
     print(f"\n🔄 Đang xử lý: {filename}")
 
@@ -637,59 +1204,39 @@ def process_file(file_path):
     embedding_candidates = [item[0] for item in sorted_items[:TOP_K_RERANK]]
 
     # 3. BRAINSTORMING (Cứu hộ từ vựng)
-    rescue_words = llm_brainstorm(target_word)
+    def brainstorm():
+        if rescue_words is None:
+            return llm_brainstorm(target_word)
+        if isinstance(rescue_words, Future):
+            return rescue_words.result()
+        return rescue_words
+
+    rescue_words = checkpoint.run_stage(run_path, "brainstorm", brainstorm)
     print(f"   Các từ được thêm: {rescue_words}")
 
-    # Gộp danh sách
-    combined_candidates = list(set(embedding_candidates + rescue_words))
-
-    # 4. GỌI GEMINI RE-RANK (toàn bộ danh sách để giữ context)
-    print(f"   🤖 Gửi {len(combined_candidates)} từ cho Gemini...")
-    llm_results = get_llm_scores(target_word, combined_candidates)
+    # Gộp danh sách (giữ thứ tự embedding, từ brainstorm ở cuối)
+    combined_candidates = list(dict.fromkeys(embedding_candidates + rescue_words))
 
-    # 5. Hợp nhất kết quả (Merge)
-    final_rank_map = {}
-    current_rank = 1
-
-    # Luôn giữ Target ở Rank 1
-    final_rank_map[target_word] = current_rank
-    current_rank += 1
-
-    # A. Xử lý phần đầu (LLM)
-    processed_words_set = set()
-    # Chỉ chấp nhận từ do LLM trả về nếu nằm trong danh sách ứng viên
-    combined_set = set(combined_candidates)
-
-    if llm_results:
-        sorted_llm = sorted(llm_results, key=lambda x: x.s, reverse=True)
+    # 4. GỌI GEMINI RE-RANK (toàn bộ danh sách để giữ context, hoặc theo chunk song song)
+    def score():
+        print(f"   🤖 Gửi {len(combined_candidates)} từ cho Gemini...")
+        if RERANK_CHUNK_SIZE and len(combined_candidates) > RERANK_CHUNK_SIZE:
+            items = get_llm_scores_chunked(target_word, combined_candidates)
+        else:
+            items = get_llm_scores(target_word, combined_candidates)
+        return [[item.w, item.s] for item in items]
 
-        for item in sorted_llm:
-            if item.w == target_word:
-                continue
-            # Bỏ qua từ không nằm trong danh sách ứng viên để tránh LLM bịa thêm
-            if item.w not in combined_set:
-                continue
-            # Bỏ qua từ đã được xử lý (tránh duplicate)
-            if item.w in processed_words_set or item.w in final_rank_map:
-                continue
-            final_rank_map[item.w] = current_rank
-            processed_words_set.add(item.w)
-            current_rank += 1
-    else:
-        print("   ⚠️ LLM Re-rank thất bại. Sẽ dùng thứ tự gốc.")
+    llm_results = [CalibratedScore(w, s) for w, s in checkpoint.run_stage(run_path, "scores", score)]
 
-    # B. Xử lý phần đuôi (Embedding + Fallback)
-    for w, old_rank in sorted_items:
-        if w == target_word:
-            continue
-        # Bỏ qua từ đã được xử lý (tránh duplicate)
-        if w in final_rank_map or w in processed_words_set:
-            continue
-        final_rank_map[w] = current_rank
-        current_rank += 1
+    # 5. Hợp nhất kết quả (Merge), checkpoint lưu danh sách từ theo thứ tự rank
+    final_words = checkpoint.run_stage(
+        run_path, "final",
+        lambda: list(merge_llm_ranking(target_word, sorted_items, combined_candidates, llm_results)),
+    )
+    final_rank_map = {word: rank for rank, word in enumerate(final_words, start=1)}
 
     # 6. Tạo hints với LLM
-    hints = generate_hints_with_llm(target_word, final_rank_map)
+    hints = checkpoint.run_stage(run_path, "hints", lambda: generate_hints_with_llm(target_word, final_rank_map))
     
     # 7. Xuất file kết quả
     output_path = os.path.join(OUTPUT_FOLDER, filename)
@@ -702,8 +1249,35 @@ def process_file(file_path):
     if hints:
         output_data["hints"] = hints
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(output_data, f, ensure_ascii=False, separators=(',', ':'))
+    with run_report.span("write", file=output_path) as span_attrs:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(output_data, f, ensure_ascii=False, separators=(',', ':'))
+        span_attrs["bytes"] = os.path.getsize(output_path)
+
+    # Bản nhị phân: rank array theo vocab id của vocab chung trong lib/contexto
+    if "bin" in GAME_OUTPUTS:
+        binary_path = os.path.splitext(output_path)[0] + ".bin"
+        with run_report.span("write", file=binary_path) as span_attrs:
+            binary_size = write_game_binary(
+                binary_path, target_word, final_rank_map, hints, SHARED_VOCAB_PATH, CODECS[GAME_BINARY_CODEC]
+            )
+            span_attrs["bytes"] = binary_size
+        print(f"   ✅ Đã lưu: {binary_path} ({binary_size / 1024:.1f} KB)")
+
+    # Mảng ngược rank -> từ (rank liên tục 1..N theo final_words)
+    if "words" in GAME_OUTPUTS:
+        order_path = rank_order_path(output_path)
+        with run_report.span("write", file=order_path) as span_attrs:
+            span_attrs["bytes"] = write_rank_order(order_path, final_rank_map)
+        print(f"   ✅ Đã lưu: {order_path} ({span_attrs['bytes'] / 1024:.1f} KB)")
+
+    # Bản chia tầng: server cold start chỉ đọc head, tail khi từ đoán không có trong head
+    if "tiers" in GAME_OUTPUTS:
+        head_path, tail_path = tier_paths(output_path)
+        with run_report.span("write", file=head_path) as span_attrs:
+            head_size, tail_size = write_game_tiers(output_path, target_word, final_rank_map, hints, GAME_HEAD_RANKS)
+            span_attrs["bytes"] = head_size + tail_size
+        print(f"   ✅ Đã lưu: {head_path} ({head_size / 1024:.1f} KB) + {os.path.basename(tail_path)} ({tail_size / 1024:.1f} KB)")
 
     if hints:
         print(f"   ✅ Đã lưu: {output_path} (Tổng: {len(final_rank_map)} từ, {len(hints)} hints)")
@@ -713,101 +1287,170 @@ def process_file(file_path):
     
     return output_path
 
-def save_to_contexto_and_update_loader(output_file, target_word):
-    """
-    Sao chép file output vào lib/contexto và chạy create_rank_loader.py
-    """
-    print("\n📦 Đang lưu vào lib/contexto...")
-    
-    # Tạo slug từ target_word (bác sĩ -> bac_si)
-    slug = remove_vietnamese_accents(target_word.replace(" ", "_"))
-    
-    # Đường dẫn đích
-    dest_file = CONTEXTO_DIR / f"{slug}.json"
-    
-    # Sao chép file
-    import shutil
-    try:
-        shutil.copy2(output_file, dest_file)
-        print(f"   ✅ Đã lưu: {dest_file}")
-    except Exception as e:
-        print(f"   ❌ Lỗi khi sao chép file: {e}")
-        return False
-    
-    # Chạy create_rank_loader.py
-    print("\n🔄 Đang cập nhật rankLoader.json...")
-    create_rank_loader_script = CONTEXTO_DIR / "create_rank_loader.py"
-    
-    if not create_rank_loader_script.exists():
-        print(f"   ⚠️  Không tìm thấy {create_rank_loader_script}")
-        return False
-    
-    try:
-        result = subprocess.run(
-            ["python3", str(create_rank_loader_script)],
-            cwd=str(CONTEXTO_DIR),
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        print(result.stdout)
-        print("   ✅ Đã cập nhật rankLoader.json")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"   ❌ Lỗi khi chạy create_rank_loader.py: {e}")
-        print(f"   Output: {e.stdout}")
-        print(f"   Error: {e.stderr}")
-        return False
+def load_sentence_transformer(model_name):
+    """SentenceTransformer của 1 model; sentence_transformers (kéo theo torch) chỉ import ở lần gọi đầu"""
+    with run_report.span("import", module="sentence_transformers"):
+        from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODELS[model_name]["path"])
+
+def load_embedding_models(model_names=None):
+    """Load các SentenceTransformer models trong EMBEDDING_MODELS (mặc định tất cả)"""
+    print("📦 Pre-loading embedding models...")
+    loaded_models = {}
+    for name in model_names or EMBEDDING_MODELS:
+        print(f"   - Loading {name}...")
+        with run_report.span("model_load", model=name):
+            loaded_models[name] = load_sentence_transformer(name)
+    print("✅ All models loaded\n")
+    return loaded_models
 
 # =========================== MAIN ===========================
 
-def main():
+def run_config(workers, threads_per_worker):
+    """Cấu hình ảnh hưởng tới hiệu năng, ghi kèm run report để so sánh giữa các lần chạy"""
+    return {
+        "workers": workers,
+        "threads_per_worker": threads_per_worker,
+        "embedding_storage": EMBEDDING_STORAGE,
+        "rerank_chunk_size": RERANK_CHUNK_SIZE,
+        "game_outputs": GAME_OUTPUTS,
+        "game_binary_codec": GAME_BINARY_CODEC,
+        "game_head_ranks": GAME_HEAD_RANKS,
+        "llm_model": MODEL_NAME,
+    }
+
+def run_batch(targets, rerank=True, workers=RANKING_WORKERS, threads_per_worker=RANKING_THREADS_PER_WORKER,
+              resume=False):
+    """
+    Batch mode: tạo ranking cho nhiều target trong 1 process.
+    Models và embeddings vocab chỉ load 1 lần, query của mọi target được encode
+    cùng nhau, kết quả từng target được ghi ra ngay khi xong.
+    Mỗi target có thư mục checkpoint riêng (checkpoints/<slug>); resume=True bỏ qua các stage đã xong.
+    """
     print("="*70)
-    print("🚀 CONTEXTO DAILY RANKING PIPELINE")
+    print(f"🚀 CONTEXTO BATCH RANKING PIPELINE ({len(targets)} targets)")
     print("="*70)
-    
-    # Generate daily target
-    target_word = generate_daily_target()
-    target_word_underscore = target_word.replace(" ", "_")
-    
+
+    # Span chung (load model, ranking cả batch) không thuộc target nào, được tính vào report của mọi target
+    run_report.set_target(None)
+
     # Load vocab
     vocab = load_vocab()
     print(f"📥 Loaded {len(vocab):,} words from vocab\n")
 
-    # Pre-load models
-    print("📦 Pre-loading embedding models...")
-    loaded_models = {}
-    for name, config in EMBEDDING_MODELS.items():
-        print(f"   - Loading {name}...")
-        loaded_models[name] = SentenceTransformer(config["path"])
-    print("✅ All models loaded\n")
+    run_paths = [checkpoint.open_run(target_slug(target_word), resume) for target_word in targets]
+    fingerprint = vocab_fingerprint(vocab)
+    for run_path in run_paths:
+        checkpoint.check_vocab(run_path, fingerprint)
+
+    # Chạy song song: mỗi worker tự load model của nó (không cần model nếu mọi target đã có ranking)
+    need_models = not all(checkpoint.has(run_path, "fused") for run_path in run_paths)
+    loaded_models = load_embedding_models() if workers <= 1 and need_models else None
+
+    start_time = time.time()
+    queries = [target_word.replace(" ", "_") for target_word in targets]
+    outputs = {}
+    failed = []
+
+    # Brainstorm chỉ cần target -> gửi ngay từ đầu, chạy song song với embedding ranking
+    # (số request thực tế vẫn bị giới hạn bởi rate limiter của llm_client)
+    brainstorms = {}
+    for target_word, run_path in zip(targets, run_paths):
+        if rerank and not checkpoint.has(run_path, "brainstorm"):
+            with run_report.target_scope(target_word):
+                brainstorms[target_word] = llm_client.submit(llm_brainstorm, target_word)
+
+    # Re-rank target i (chờ LLM) chạy trong thread pool trong khi target i+1 đang ranking
+    rerank_executor = ThreadPoolExecutor(max_workers=llm_client.LLM_MAX_CONCURRENCY, thread_name_prefix="rerank")
+    reranks = {}
+
+    rankings = generate_rrf_rankings(queries, vocab, loaded_models, workers, threads_per_worker, run_paths)
+    for run_path, (query, rrf_ranking) in zip(run_paths, rankings):
+        target_word = query.replace("_", " ")
+        intermediate_file, rank_map = save_rrf_ranking(target_word, rrf_ranking)
+        print(f"   ✅ Saved RRF: {intermediate_file} ({len(rank_map)} words)")
+
+        if not rerank:
+            outputs[target_word] = intermediate_file
+            continue
+
+        with run_report.target_scope(target_word):
+            reranks[target_word] = rerank_executor.submit(
+                contextvars.copy_context().run, process_file, intermediate_file, brainstorms.get(target_word), run_path
+            )
+
+    # Lỗi LLM của 1 target không làm hỏng cả batch
+    errors = {}
+    for target_word, future in reranks.items():
+        try:
+            outputs[target_word] = future.result()
+        except Exception as e:
+            print(f"   ❌ Error ({target_word}): {e}\n")
+            failed.append(target_word)
+            errors[target_word] = str(e)
+    rerank_executor.shutdown()
+
+    elapsed = time.time() - start_time
+    llm_client.print_llm_metrics()
+    for target_word in targets:
+        run_report.write_report(
+            target_word, target_slug(target_word), "failed" if target_word in errors else "ok",
+            errors.get(target_word), mode="batch", config=run_config(workers, threads_per_worker),
+        )
+    print(f"\n⏱️  Batch completed in {elapsed:.1f}s: {len(outputs)} ok, {len(failed)} lỗi")
+    if failed:
+        raise Exception(f"Batch lỗi ở {len(failed)} target: {', '.join(failed)}")
+    return outputs
 
+def main(workers=RANKING_WORKERS, threads_per_worker=RANKING_THREADS_PER_WORKER, resume=False):
+    """
+    Pipeline hằng ngày, chia thành các stage có checkpoint trong checkpoints/daily
+    (target -> ranks.<model> -> fused -> brainstorm -> scores -> final -> hints -> published).
+    resume=True: chạy tiếp từ stage bị lỗi ở lần chạy trước.
+    """
     print("="*70)
-    print(f"TARGET: '{target_word.upper()}'")
+    print("🚀 CONTEXTO DAILY RANKING PIPELINE")
     print("="*70)
 
-    start_time = time.time()
+    run_path = checkpoint.open_run("daily", resume)
+
+    # Generate daily target
+    target_word = checkpoint.run_stage(run_path, "target", generate_daily_target)
+    target_word_underscore = target_word.replace(" ", "_")
+    # Span từ đây (kể cả task LLM chạy nền) được tính vào run report của target này
+    run_report.set_target(target_word)
+
+    if checkpoint.has(run_path, "published"):
+        print(f"\n🎉 '{target_word}' đã được lưu vào lib/contexto ở lần chạy trước, không còn stage nào.")
+        return
 
+    status, error = "failed", None
     try:
-        # Tạo RRF ranking
-        rrf_ranking = generate_rrf_ranking(target_word_underscore, vocab, loaded_models)
+        # Brainstorm chạy nền trong lúc load model + embedding ranking
+        brainstorm_future = None
+        if not checkpoint.has(run_path, "brainstorm"):
+            brainstorm_future = llm_client.submit(llm_brainstorm, target_word)
 
-        # Tạo rank_map
-        rank_map = {}
-        rank_map[target_word] = 1
+        # Load vocab
+        vocab = load_vocab()
+        print(f"📥 Loaded {len(vocab):,} words from vocab\n")
+        checkpoint.check_vocab(run_path, vocab_fingerprint(vocab))
 
-        for rank, item in enumerate(rrf_ranking, start=2):
-            rank_map[item['word'].replace("_", " ")] = rank
+        # Pre-load models còn thiếu rank array (chạy song song: mỗi worker tự load model của nó)
+        missing_models = missing_rank_models(run_path) if not checkpoint.has(run_path, "fused") else []
+        loaded_models = load_embedding_models(missing_models) if workers <= 1 and missing_models else None
 
-        # Lưu file JSON
-        output_data = {
-            "keyword": target_word,
-            "rank_map": rank_map
-        }
+        print("="*70)
+        print(f"TARGET: '{target_word.upper()}'")
+        print("="*70)
 
-        intermediate_file = f"{INPUT_FOLDER}/{remove_vietnamese_accents(target_word_underscore)}.json"
-        with open(intermediate_file, "w", encoding="utf-8") as f:
-            json.dump(output_data, f, ensure_ascii=False, separators=(',', ':'))
+        start_time = time.time()
+
+        # Tạo RRF ranking
+        rrf_ranking = generate_rrf_ranking(
+            target_word_underscore, vocab, loaded_models, workers, threads_per_worker, run_path
+        )
+        intermediate_file, rank_map = save_rrf_ranking(target_word, rrf_ranking)
 
         elapsed = time.time() - start_time
         file_size = os.path.getsize(intermediate_file) / 1024
@@ -818,25 +1461,134 @@ def main():
 
         # Re-rank phase
         print("\n🎯 Starting LLM Re-rank phase...")
-        final_output = process_file(intermediate_file)
+        final_output = process_file(intermediate_file, brainstorm_future, run_path)
 
         # Lưu vào lib/contexto và cập nhật rankLoader
         if final_output:
-            success = save_to_contexto_and_update_loader(final_output, target_word)
+            success = save_to_contexto_and_update_loader(final_output, target_word, GAME_OUTPUTS)
             if success:
+                checkpoint.save(run_path, "published", {"slug": target_slug(target_word)})
                 print("\n🎉 HOÀN TẤT! File đã được lưu vào lib/contexto và rankLoader đã được cập nhật.")
             else:
                 print("\n⚠️  HOÀN TẤT nhưng có lỗi khi cập nhật contexto/rankLoader.")
         else:
             print("\n🎉 HOÀN TẤT!")
+        status = "ok"
 
     except Exception as e:
+        error = str(e)
         print(f"   ❌ Error: {e}\n")
         raise
+    finally:
+        llm_client.print_llm_metrics()
+        run_report.write_report(
+            target_word, target_slug(target_word), status, error,
+            mode="daily", resumed=resume, config=run_config(workers, threads_per_worker),
+        )
+
+# =========================== CLI ===========================
+#
+# Mỗi subcommand chỉ import thứ nó cần: daily/batch load model + Gemini khi chạy tới,
+# keywords/check-word chỉ dùng pipeline_core, dedup chỉ mở cache embeddings (numpy).
+# Đo thời gian import: python check_import_time.py
+
+COMMANDS = ("daily", "batch", "keywords", "check-word", "dedup")
+
+def command_daily(args):
+    main(workers=args.workers, threads_per_worker=args.threads_per_worker, resume=args.resume)
+
+def command_batch(args):
+    batch_targets = load_batch_targets(args.targets, args.from_dir)
+    if not batch_targets:
+        print("❌ Không có target nào để chạy")
+        sys.exit(1)
+    run_batch(batch_targets, rerank=not args.no_rerank, workers=args.workers,
+              threads_per_worker=args.threads_per_worker, resume=args.resume)
+
+def command_keywords(args):
+    keywords = get_existing_keywords()
+    for keyword in keywords[-args.last:] if args.last else keywords:
+        print(keyword)
+    print(f"📋 {len(keywords)} từ khóa", file=sys.stderr)
+
+def command_check_word(args):
+    target = args.target.replace(" ", "_")
+    for word in args.words:
+        word = word.replace(" ", "_")
+        valid = is_valid_candidate(word, target)
+        print(f"   {'✅' if valid else '❌'} {word}  (lõi: '{peel_noise_tokens(word)}')")
+
+def command_dedup(args):
+    keywords = get_existing_keywords()
+    existing = set(keywords)
+    dedup_index = build_target_dedup_index(keywords)
+    for candidate in args.candidates:
+        candidate = normalize_vietnamese_diacritics(candidate.lower().strip())
+        duplicate = find_near_duplicate_target(dedup_index, candidate, args.threshold)
+        if candidate in existing:
+            print(f"   ❌ {candidate}: đã có")
+        elif duplicate:
+            print(f"   ❌ {candidate}: quá gần '{duplicate[0]}' (cosine {duplicate[1]:.3f})")
+        else:
+            print(f"   ✅ {candidate}")
+
+def parse_args(argv=None):
+    import argparse
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Cách gọi cũ không có subcommand: --targets/--from-dir -> batch, còn lại -> daily
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        legacy_batch = any(arg.split("=")[0] in ("--targets", "--from-dir") for arg in argv)
+        argv.insert(0, "batch" if legacy_batch else "daily")
+
+    run_options = argparse.ArgumentParser(add_help=False)
+    run_options.add_argument("--workers", type=int, default=RANKING_WORKERS,
+                             help="Số worker process chạy song song các embedding model (mặc định: RANKING_WORKERS)")
+    run_options.add_argument("--threads-per-worker", type=int, default=RANKING_THREADS_PER_WORKER,
+                             help="Số thread torch/BLAS tối đa mỗi worker (mặc định: RANKING_THREADS_PER_WORKER)")
+    run_options.add_argument("--offline", action="store_true",
+                             help="Chỉ dùng response Gemini đã cache (llm_client), không gọi API")
+    run_options.add_argument("--resume", action="store_true",
+                             help="Chạy tiếp từ checkpoint của lần chạy trước, bỏ qua các stage đã xong")
+
+    parser = argparse.ArgumentParser(description="Contexto ranking pipeline")
+    commands = parser.add_subparsers(dest="command", metavar="{" + ",".join(COMMANDS) + "}")
+
+    daily = commands.add_parser("daily", parents=[run_options],
+                                help="Pipeline hằng ngày: tạo target mới, ranking, re-rank, publish (mặc định)")
+    daily.set_defaults(handler=command_daily)
+
+    batch = commands.add_parser("batch", parents=[run_options], help="Tạo (lại) game cho nhiều target")
+    batch.add_argument("--targets", nargs="+", default=None,
+                       help="Danh sách target (vd: --targets 'bác sĩ' 'xe máy')")
+    batch.add_argument("--from-dir", default=None,
+                       help="Lấy target từ field keyword của các file JSON (vd: pre_rerank)")
+    batch.add_argument("--no-rerank", action="store_true",
+                       help="Chỉ tạo embedding ranking, bỏ qua LLM re-rank")
+    batch.set_defaults(handler=command_batch)
+
+    keywords = commands.add_parser("keywords", help="In các từ khóa đã có (rankIndex.json)")
+    keywords.add_argument("--last", type=int, default=0, help="Chỉ in N từ khóa gần nhất")
+    keywords.set_defaults(handler=command_keywords)
+
+    check_word = commands.add_parser("check-word", help="Kiểm tra từ có bị lọc rác với 1 target không")
+    check_word.add_argument("target")
+    check_word.add_argument("words", nargs="+")
+    check_word.set_defaults(handler=command_check_word)
+
+    dedup = commands.add_parser("dedup", help="Kiểm tra ứng viên target có trùng / quá gần keyword cũ không")
+    dedup.add_argument("candidates", nargs="+")
+    dedup.add_argument("--threshold", type=float, default=TARGET_DEDUP_THRESHOLD,
+                       help="Ngưỡng cosine (mặc định: TARGET_DEDUP_THRESHOLD)")
+    dedup.set_defaults(handler=command_dedup)
+
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
     # Force unbuffered output (alternative method)
     import functools
     print = functools.partial(print, flush=True)
     
-    main()
+    args = parse_args()
+    if getattr(args, "offline", False):
+        llm_client.LLM_OFFLINE = True
+    args.handler(args)
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Đo thời gian từng bước của pipeline (span) + tài nguyên, ghi báo cáo JSON cho mỗi game
+
+    with span("model_load", model="bkcare"):
+        ...
+
+    write_report("bác sĩ", "bac_si")  ->  scripts/run_reports/bac_si-20250101-233000.json
+
+Đo sẵn ở chỗ khác (vd: LLM call trong llm_client) thì ghi bằng record(name, duration, ...).
+
+Mỗi span ghi: tên, thời điểm bắt đầu (giây từ lúc process chạy), thời lượng, thread, số byte
+đọc/ghi trong span (đếm theo cả process) và các thuộc tính tuỳ ý. Span tự gắn target hiện tại
+(target_scope) - ContextVar, nên đi theo cả các task gửi qua llm_client.submit.
+
+Báo cáo gồm: các span của game (và các span dùng chung như load model), tổng hợp theo tên span,
+các LLM call, peak RSS, byte đọc/ghi của cả process, CPU time.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from game_format import atomic_write_bytes
+
+RUN_REPORT_DIR = Path(os.environ.get('RUN_REPORT_DIR', Path(__file__).parent / "run_reports"))
+RUN_REPORT_VERSION = 1
+
+_PROCESS_START = time.perf_counter()
+_STARTED_AT = datetime.now().astimezone()
+_SPANS = []
+_SPANS_LOCK = threading.Lock()
+_TARGET = ContextVar("run_report_target", default=None)
+
+
+# =========================== TÀI NGUYÊN ===========================
+
+def io_counters():
+    """
+    Byte đọc/ghi của process từ /proc/self/io (Linux), {} nếu không có.
+    read_bytes/write_bytes: qua syscall read/write (kể cả page cache, không tính mmap);
+    disk_*: thực sự đọc/ghi xuống storage.
+    """
+    try:
+        with open("/proc/self/io", "r") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return {}
+    return {
+        "read_bytes": int(fields["rchar"]),
+        "write_bytes": int(fields["wchar"]),
+        "disk_read_bytes": int(fields["read_bytes"]),
+        "disk_write_bytes": int(fields["write_bytes"]),
+    }
+
+
+def _maxrss_mb(who):
+    # ru_maxrss: KB trên Linux, byte trên macOS
+    maxrss = resource.getrusage(who).ru_maxrss
+    return maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def resource_usage():
+    """Peak RSS (MB) của process + các worker process con, CPU time, byte đọc/ghi"""
+    usage = dict(io_counters())
+    if resource is not None:
+        self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        usage.update({
+            "peak_rss_mb": round(_maxrss_mb(resource.RUSAGE_SELF), 1),
+            "children_peak_rss_mb": round(_maxrss_mb(resource.RUSAGE_CHILDREN), 1),
+            "cpu_user": round(self_usage.ru_utime, 3),
+            "cpu_system": round(self_usage.ru_stime, 3),
+        })
+    return usage
+
+
+# =========================== SPAN ===========================
+
+@contextmanager
+def target_scope(target):
+    """Các span trong khối này (kể cả trong task submit từ đây) thuộc về target"""
+    token = _TARGET.set(target)
+    try:
+        yield
+    finally:
+        _TARGET.reset(token)
+
+
+def set_target(target):
+    """Gắn target cho context hiện tại, không reset (luồng chính của run chỉ có 1 target)"""
+    _TARGET.set(target)
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Đo 1 bước. Yield dict attrs để thêm thuộc tính khi đã có kết quả (vd: số byte ghi, số token).
+    Span vẫn được ghi khi khối bên trong raise (kèm "error").
+    """
+    io_before = io_counters()
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        io_after = io_counters()
+        record(name, time.perf_counter() - start, start, **{
+            key: io_after[key] - io_before[key] for key in ("read_bytes", "write_bytes") if key in io_after
+        }, **attrs)
+
+
+def record(name, duration, start=None, **attrs):
+    """Ghi 1 span đã đo sẵn (vd: metrics của 1 LLM call), start mặc định = now - duration"""
+    start = time.perf_counter() - duration if start is None else start
+    with _SPANS_LOCK:
+        _SPANS.append({
+            "name": name,
+            "start": round(start - _PROCESS_START, 4),
+            "duration": round(duration, 4),
+            "thread": threading.current_thread().name,
+            "target": _TARGET.get(),
+            **attrs,
+        })
+
+
+def spans(target=None):
+    """Span của target + span dùng chung (không gắn target); target=None -> tất cả"""
+    with _SPANS_LOCK:
+        return [s for s in _SPANS if target is None or s["target"] in (None, target)]
+
+
+def reset_spans():
+    with _SPANS_LOCK:
+        _SPANS.clear()
+
+
+def summarize_spans(records):
+    """Gom span theo tên: số lần, tổng/max thời gian, byte đọc/ghi"""
+    summary = {}
+    for record in records:
+        stage = summary.setdefault(record["name"], {
+            "count": 0, "total": 0.0, "max": 0.0, "read_bytes": 0, "write_bytes": 0,
+        })
+        stage["count"] += 1
+        stage["total"] = round(stage["total"] + record["duration"], 4)
+        stage["max"] = max(stage["max"], record["duration"])
+        stage["read_bytes"] += record.get("read_bytes", 0)
+        stage["write_bytes"] += record.get("write_bytes", 0)
+    return summary
+
+
+# =========================== BÁO CÁO ===========================
+
+def build_report(target, status="ok", error=None, **extra):
+    """Báo cáo của 1 game (dict JSON được)"""
+    records = spans(target)
+    return {
+        "version": RUN_REPORT_VERSION,
+        "target": target,
+        "status": status,
+        "error": error,
+        "started_at": _STARTED_AT.isoformat(timespec="seconds"),
+        "duration": round(time.perf_counter() - _PROCESS_START, 3),
+        "stages": summarize_spans(records),
+        "llm_calls": [record for record in records if record["name"] == "llm"],
+        "resources": resource_usage(),
+        **extra,
+        "spans": records,
+    }
+
+
+def write_report(target, slug, status="ok", error=None, **extra):
+    """
+    Ghi báo cáo vào RUN_REPORT_DIR/<slug>-<thời gian bắt đầu>.json
+
+    Returns:
+        Path: file báo cáo
+    """
+    report = build_report(target, status, error, **extra)
+    RUN_REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    path = RUN_REPORT_DIR / f"{slug}-{_STARTED_AT.strftime('%Y%m%d-%H%M%S')}.json"
+    atomic_write_bytes(path, json.dumps(report, ensure_ascii=False, indent=1).encode("utf-8"))
+
+    resources = report["resources"]
+    top = sorted(report["stages"].items(), key=lambda item: -item[1]["total"])[:6]
+    print(f"\n📊 Run report: {path}")
+    print("   " + ", ".join(f"{name} {stats['total']:.1f}s" for name, stats in top))
+    if "peak_rss_mb" in resources:
+        print(f"   Peak RSS {resources['peak_rss_mb']:.0f} MB (workers {resources['children_peak_rss_mb']:.0f} MB), "
+              f"đọc {resources.get('read_bytes', 0) / 1e6:.1f} MB, ghi {resources.get('write_bytes', 0) / 1e6:.1f} MB")
+    return path
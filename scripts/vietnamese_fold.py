@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Chuẩn hoá từ tiếng Việt về 1 khoá so khớp (fold), theo bảng dùng chung lib/vietnameseFold.json
+
+    fold_vietnamese("Khóa  Học") == fold_vietnamese("khoá_học") == "khoá học"
+    fold_vietnamese("lí do") == fold_vietnamese("lý do") == "lý do"
+
+Các bước (lib/vietnamese.ts làm y hệt theo cùng bảng, kiểm tra bằng check_vietnamese_fold.py):
+    1. NFC + chữ thường
+    2. Các ký tự trong "separators" (khoảng trắng, "_") -> 1 dấu cách, bỏ ở 2 đầu
+    3. "tone_placement": dấu thanh kiểu mới -> kiểu cũ (óa -> oá, óe -> oé, úy -> uý)
+    4. "syllable_final": i có dấu ở cuối âm tiết -> y (lí -> lý, kĩ -> kỹ)
+
+Sidecar lib/contexto/vocab.fold.json được ghi cùng vocab.txt (game_format.update_fold_index):
+khoá fold của các từ trong vocab chung có khoá khác chính nó. Server dựng Map khoá -> vocab id
+từ file này mà không phải fold lại cả vocab, mỗi lượt đoán chỉ fold từ đoán + 1 lần tra Map.
+
+    {"version": 1, "table": "<sha1 của lib/vietnameseFold.json>", "count": <số từ vocab đã xử lý>,
+     "folded": {"<vocab id>": "<khoá>", ...}}
+
+"table" khác bảng hiện tại -> sidecar cũ, tính lại toàn bộ; "count" < số từ vocab -> chỉ fold phần thêm.
+"""
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from pathlib import Path
+
+FOLD_TABLE_PATH = Path(__file__).parent.parent / "lib" / "vietnameseFold.json"
+FOLD_INDEX_FILE = "vocab.fold.json"
+FOLD_INDEX_VERSION = 1
+
+
+def _load_fold_table():
+    with open(FOLD_TABLE_PATH, "rb") as f:
+        content = f.read()
+    table = json.loads(content.decode("utf-8"))
+    table["sha1"] = hashlib.sha1(content).hexdigest()
+    return table
+
+
+FOLD_TABLE = _load_fold_table()
+TONE_PLACEMENT = [tuple(pair) for pair in FOLD_TABLE["tone_placement"]]
+
+_SEPARATORS_RE = re.compile("[" + "".join(re.escape(c) for c in FOLD_TABLE["separators"]) + "]+")
+_SYLLABLE_FINAL = dict(FOLD_TABLE["syllable_final"])
+_SYLLABLE_FINAL_RE = re.compile("[" + "".join(_SYLLABLE_FINAL) + "](?= |$)")
+
+
+def fold_vietnamese(text):
+    """Khoá so khớp của 1 từ / cụm từ (xem các bước ở đầu file)"""
+    result = _SEPARATORS_RE.sub(" ", unicodedata.normalize("NFC", text).lower()).strip(" ")
+    for old, new in TONE_PLACEMENT:
+        result = result.replace(old, new)
+    return _SYLLABLE_FINAL_RE.sub(lambda match: _SYLLABLE_FINAL[match.group()], result)
+
+
+# =========================== SIDECAR ===========================
+
+def fold_index_path(vocab_path):
+    return os.path.join(os.path.dirname(vocab_path), FOLD_INDEX_FILE)
+
+
+def read_fold_index(vocab_path):
+    """Sidecar của vocab chung, None nếu chưa có / không đọc được / tạo bằng bảng khác"""
+    try:
+        with open(fold_index_path(vocab_path), "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if index.get("version") != FOLD_INDEX_VERSION or index.get("table") != FOLD_TABLE["sha1"]:
+        return None
+    return index
+
+
+def build_fold_index(vocab, previous=None):
+    """
+    Sidecar cho vocab; previous (sidecar cũ cùng bảng, vocab chỉ thêm vào cuối) -> chỉ fold từ mới.
+
+    Returns:
+        dict: sidecar (xem đầu file)
+    """
+    start = 0
+    folded = {}
+    if previous is not None and previous["count"] <= len(vocab):
+        start = previous["count"]
+        folded = dict(previous["folded"])
+
+    for idx in range(start, len(vocab)):
+        key = fold_vietnamese(vocab[idx])
+        if key != vocab[idx]:
+            folded[str(idx)] = key
+
+    return {"version": FOLD_INDEX_VERSION, "table": FOLD_TABLE["sha1"], "count": len(vocab), "folded": folded}
+